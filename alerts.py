@@ -0,0 +1,403 @@
+"""Budget alert evaluation and delivery off the request path.
+
+Writes enqueue an ``(user_id, month)`` job; evaluation and SMTP delivery run
+on a background worker with retry and exponential backoff. Two backends are
+available, selected with ``ALERT_BACKEND``:
+
+* ``thread`` (default): an in-process queue drained by worker threads.
+* ``db``: jobs are rows in ``alert_jobs`` processed by a separate worker
+  process (``python alerts.py worker``), which leases them with
+  ``SELECT ... FOR UPDATE SKIP LOCKED`` so several workers can run at once.
+
+No database connection is held while emails are sent: claims are committed
+first and results are recorded afterwards on a fresh connection.
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from flask import Flask
+
+import queries
+from db import connection, month_bounds
+from email_helper import build_budget_alert, init_mail, send_messages
+
+logger = logging.getLogger(__name__)
+
+ALERT_BACKEND = os.getenv("ALERT_BACKEND", "thread")
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "2"))
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+ALERT_RETRY_BASE_DELAY = float(os.getenv("ALERT_RETRY_BASE_DELAY", "5"))
+ALERT_RETRY_MAX_DELAY = float(os.getenv("ALERT_RETRY_MAX_DELAY", "600"))
+# Seconds a db worker owns its claimed jobs; must outlast one batch's emails.
+ALERT_JOB_LEASE = float(os.getenv("ALERT_JOB_LEASE", "300"))
+# Used when the user has no email_settings row.
+ALERT_THRESHOLD_PERCENT = 90.0
+
+
+class AlertDeliveryError(Exception):
+    """Raised when one or more alert emails could not be sent."""
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts."""
+
+    delay = min(ALERT_RETRY_MAX_DELAY, ALERT_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def evaluate_budget_alerts(user_id: int, month: str | None = None) -> None:
+    """Email alerts for budgets that have newly crossed the user's threshold.
+
+    The threshold and opt-out come from ``email_settings`` (90% and enabled
+    when the user has no row). Each ``(user, category, month)`` is alerted
+    once per crossing: the crossing is claimed in ``budget_alert_state``
+    before sending, and the claim is dropped again when usage falls back
+    under the threshold (e.g. after a deletion or a raised limit) so a later
+    crossing alerts again. All emails for one evaluation share a single SMTP
+    connection.
+
+    Must run inside a Flask app context (Flask-Mail needs it). Raises on
+    database errors and AlertDeliveryError if any email failed, so the caller
+    can retry; only the failed alerts are re-sent.
+    """
+
+    current_month = month or datetime.now().strftime("%Y-%m")
+    month_start, _ = month_bounds(current_month)
+    month_year = month_start.strftime("%Y-%m")
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            rows = queries.budget_alert_candidates(
+                user_id, month_start, ALERT_THRESHOLD_PERCENT, cur=cur
+            )
+
+            crossed = {}
+            rearm = []
+            for category_id, category, limit_amount, spent, email, enabled, threshold, alerted in rows:
+                limit_amount = float(limit_amount or 0)
+                spent = float(spent or 0)
+                used_percent = round((spent / limit_amount) * 100, 2) if limit_amount > 0 else 0.0
+                if used_percent < float(threshold):
+                    if alerted:
+                        rearm.append(category_id)
+                elif not alerted and enabled and email:
+                    crossed[category_id] = (category or "Unknown", limit_amount, spent, used_percent, email)
+
+            if rearm:
+                queries.clear_alert_state(user_id, month_year, rearm, cur=cur)
+            if not crossed:
+                return
+            # Claim before sending so concurrent evaluations never double-send.
+            claimed = queries.claim_alerts(
+                user_id,
+                month_year,
+                list(crossed),
+                [alert[3] for alert in crossed.values()],
+                cur=cur,
+            )
+
+    if not claimed:
+        return
+    messages = [
+        build_budget_alert(
+            recipient_email=crossed[category_id][4],
+            category_name=crossed[category_id][0],
+            limit_amount=crossed[category_id][1],
+            spent=crossed[category_id][2],
+            used_percent=crossed[category_id][3],
+            month=month_year,
+        )
+        for category_id in claimed
+    ]
+    results = send_messages(messages)
+    failed = [category_id for category_id, sent in zip(claimed, results) if not sent]
+
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            if failed:
+                queries.clear_alert_state(user_id, month_year, failed, cur=cur)
+            if len(failed) < len(claimed):
+                queries.mark_alert_sent(user_id, cur=cur)
+    if failed:
+        raise AlertDeliveryError(f"{len(failed)} budget alert email(s) failed for user {user_id}")
+
+
+@dataclass(order=True)
+class AlertJob:
+    """A pending budget alert evaluation."""
+
+    run_at: float
+    user_id: int = field(compare=False)
+    month: str = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class AlertDispatcher:
+    """In-process job queue drained by a small pool of worker threads.
+
+    Pending jobs are de-duplicated per ``(user_id, month)``: ten writes in a
+    row cause one evaluation, not ten. Failed jobs are rescheduled with
+    exponential backoff up to ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[int, str], None],
+        workers: int = ALERT_WORKERS,
+        max_attempts: int = ALERT_MAX_ATTEMPTS,
+    ) -> None:
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._max_attempts = max_attempts
+        self._heap: list[AlertJob] = []
+        self._queued: set[tuple[int, str]] = set()
+        self._active = 0
+        self._threads: list[threading.Thread] = []
+        self._pid: int | None = None
+        self._stopping = False
+        self._cond = threading.Condition()
+
+    def enqueue(self, user_id: int, month: str) -> None:
+        """Queue an evaluation unless one for the same user and month is pending."""
+
+        with self._cond:
+            self._ensure_started()
+            key = (user_id, month)
+            if key in self._queued:
+                return
+            self._queued.add(key)
+            heapq.heappush(self._heap, AlertJob(time.monotonic(), user_id, month))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Number of queued or running jobs."""
+
+        with self._cond:
+            return len(self._heap) + self._active
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork; (re)start them in whichever process enqueues.
+        if self._pid == os.getpid() and not self._stopping:
+            return
+        if self._pid != os.getpid():
+            self._heap, self._queued, self._active = [], set(), 0
+        self._stopping = False
+        self._pid = os.getpid()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"alert-worker-{i}", daemon=True)
+            for i in range(self._workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _next_job(self) -> AlertJob | None:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0].run_at <= now:
+                    job = heapq.heappop(self._heap)
+                    self._queued.discard((job.user_id, job.month))
+                    self._active += 1
+                    return job
+                if self._stopping:
+                    return None
+                timeout = self._heap[0].run_at - now if self._heap else None
+                self._cond.wait(timeout)
+
+    def _run(self) -> None:
+        while (job := self._next_job()) is not None:
+            try:
+                self._handler(job.user_id, job.month)
+            except Exception:
+                self._retry(job)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _retry(self, job: AlertJob) -> None:
+        job.attempts += 1
+        if job.attempts >= self._max_attempts:
+            logger.exception(
+                "Budget alert for user %s (%s) failed after %s attempts",
+                job.user_id, job.month, job.attempts,
+            )
+            return
+        logger.warning(
+            "Budget alert for user %s (%s) failed, retrying", job.user_id, job.month, exc_info=True
+        )
+        with self._cond:
+            key = (job.user_id, job.month)
+            if key in self._queued:
+                return  # a fresh job for the same month will cover it
+            job.run_at = time.monotonic() + retry_delay(job.attempts)
+            self._queued.add(key)
+            heapq.heappush(self._heap, job)
+            self._cond.notify()
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """Run every job that is already due, then stop the workers.
+
+        Returns True if the queue drained within ``timeout``; retries still
+        waiting on backoff are dropped and logged.
+        """
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            while self._active or (self._heap and self._heap[0].run_at <= time.monotonic()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 0.1))
+            drained = not self._active
+            if self._heap:
+                logger.warning("Dropping %s delayed budget alert job(s) on shutdown", len(self._heap))
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return drained
+
+
+_app: Flask | None = None
+
+
+def _run_in_app_context(user_id: int, month: str) -> None:
+    if _app is None:
+        raise RuntimeError("alerts.init_alerts(app) has not been called")
+    with _app.app_context():
+        evaluate_budget_alerts(user_id, month)
+
+
+_dispatcher = AlertDispatcher(_run_in_app_context)
+
+
+def init_alerts(app: Flask) -> None:
+    """Register the Flask app whose mail settings background jobs use."""
+
+    global _app
+    _app = app
+
+
+def get_dispatcher() -> AlertDispatcher:
+    """Return the in-process dispatcher (thread backend)."""
+
+    return _dispatcher
+
+
+def enqueue_budget_alerts(user_id: int, months: Iterable[str]) -> None:
+    """Schedule alert evaluation for a user's months without waiting for it."""
+
+    months = sorted(set(months))
+    if ALERT_BACKEND == "db":
+        queries.enqueue_alert_jobs(user_id, months)
+        return
+    for month in months:
+        _dispatcher.enqueue(user_id, month)
+
+
+def shutdown(timeout: float = 30.0) -> bool:
+    """Drain in-process alert jobs before the process exits."""
+
+    return _dispatcher.shutdown(timeout)
+
+
+def process_job_batch(batch_size: int = 50) -> int:
+    """Claim and process one batch of due ``alert_jobs`` rows.
+
+    Jobs are leased for ``ALERT_JOB_LEASE`` seconds in a short transaction
+    (``FOR UPDATE SKIP LOCKED``), so concurrent workers never pick the same
+    job and a crashed worker's jobs become due again when the lease ends.
+    Each outcome is then recorded in its own transaction. Duplicate rows for
+    one user and month are handled by a single evaluation. A job that fails
+    its ``ALERT_MAX_ATTEMPTS``-th attempt is logged and deleted, as the
+    thread backend drops it. Returns the number of rows claimed.
+    """
+
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            jobs = queries.claim_alert_jobs(batch_size, ALERT_JOB_LEASE, cur)
+
+    grouped: dict[tuple[int, str], list[tuple[int, int]]] = {}
+    exhausted: list[int] = []
+    for job_id, user_id, month, attempts in jobs:
+        if attempts >= ALERT_MAX_ATTEMPTS:
+            # Left over from a higher ALERT_MAX_ATTEMPTS.
+            logger.error(
+                "Dropping budget alert job %s for user %s (%s) after %s attempts",
+                job_id, user_id, month, attempts,
+            )
+            exhausted.append(job_id)
+        else:
+            grouped.setdefault((user_id, month), []).append((job_id, attempts))
+    if exhausted:
+        queries.delete_alert_jobs(exhausted)
+
+    for (user_id, month), group in grouped.items():
+        job_ids = [job_id for job_id, _ in group]
+        try:
+            evaluate_budget_alerts(user_id, month)
+        except Exception as exc:
+            attempts = max(attempts for _, attempts in group) + 1
+            if attempts >= ALERT_MAX_ATTEMPTS:
+                logger.error(
+                    "Budget alert for user %s (%s) failed after %s attempts: %s",
+                    user_id, month, attempts, exc,
+                )
+                queries.delete_alert_jobs(job_ids)
+                continue
+            logger.warning("Alert job for user %s (%s) failed: %s", user_id, month, exc)
+            queries.retry_alert_jobs(job_ids, attempts, retry_delay(attempts), str(exc))
+        else:
+            queries.delete_alert_jobs(job_ids)
+    return len(jobs)
+
+
+def run_worker(batch_size: int = 50, poll_interval: float = 1.0) -> None:
+    """Process ``alert_jobs`` until interrupted."""
+
+    app = Flask("alerts")
+    init_mail(app)
+    init_alerts(app)
+    with app.app_context():
+        while True:
+            try:
+                claimed = process_job_batch(batch_size)
+            except Exception:
+                logger.exception("Alert worker batch failed")
+                claimed = 0
+            if claimed < batch_size:
+                time.sleep(poll_interval)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point for the PostgreSQL-backed alert worker."""
+
+    parser = argparse.ArgumentParser(description="Budget alert worker.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="process queued alert_jobs rows")
+    worker.add_argument("--batch-size", type=int, default=50)
+    worker.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        run_worker(args.batch_size, args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,81 @@
-"""Smart Expense Tracker Flask application entry point."""
+"""Smart Expense Tracker Flask application.
 
+Routes live on a blueprint; :func:`create_app` builds a configured app. Run
+``python app.py`` for the development server, or serve ``wsgi:app`` with
+gunicorn in production (see gunicorn.conf.py).
+"""
+
+import csv
+import io
+import json
 import os
-from datetime import datetime
-from decimal import Decimal
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from typing import Any
 
-import numpy as np
-from flask import Flask, jsonify, render_template, request
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+    stream_with_context,
+)
 from flask_jwt_extended import (
     JWTManager,
     create_access_token,
+    create_refresh_token,
     get_jwt_identity,
     jwt_required,
 )
-from werkzeug.security import check_password_hash, generate_password_hash
-
-from db import db_time, get_connection
-from email_helper import get_user_email, init_mail, send_budget_alert
-from nlp_classifier import predict_category
 
-app = Flask(__name__)
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "super-secret-key")
-jwt = JWTManager(app)
-
-# Initialize Flask-Mail
-init_mail(app)
+import queries
+from alerts import ALERT_THRESHOLD_PERCENT, enqueue_budget_alerts, init_alerts
+from auth import (
+    AuthBusy,
+    LoginThrottled,
+    hash_password,
+    login_limiter,
+    needs_rehash,
+    verify_password,
+)
+from cache import cached_report, data_version, invalidate_user
+from db import connection, db_time, get_pool, month_bounds
+from email_helper import init_mail
+from forecasting import LINEAR_WINDOW, FittedModelCache, history_months
+from metrics import init_metrics, register_gauge
+from nlp_classifier import predict_categories, predict_category, record_labelled_transactions
+from payloads import (
+    analytics_options,
+    analytics_payload,
+    budget_history_payload,
+    budget_months,
+    budget_payload,
+    fit_history,
+    fitted_predict_payload,
+    forecast_payload,
+    parse_date,
+    parse_month,
+    predict_options,
+    predict_payload,
+    stored_forecast,
+    to_float,
+    transaction_page,
+    transaction_payload,
+)
 
+bp = Blueprint("expenses", __name__)
+jwt = JWTManager()
 
-def _to_float(value: Decimal | float | None) -> float | None:
-    """Convert Decimal to float for JSON payloads."""
+EXPORT_BATCH_SIZE = 2000
+BULK_MAX_ROWS = 5000
+DEFAULT_CATEGORY_ID = 4  # "Others", used when auto-detection fails
+EXPORT_COLUMNS = ("tx_id", "category_id", "amount", "note", "tx_date")
 
-    if value is None:
-        return None
-    return float(value) if isinstance(value, Decimal) else value
+_fitted_forecasts = FittedModelCache()
 
 
 def _json_body() -> dict[str, Any]:
@@ -41,12 +84,12 @@ def _json_body() -> dict[str, Any]:
     return request.get_json(silent=True) or {}
 
 
-@app.route("/")
+@bp.route("/")
 def index():
     return "Expense Tracker API running ✅"
 
 
-@app.route("/test_db")
+@bp.route("/test_db")
 def test_db():
     """Verify database connectivity and return current time."""
 
@@ -54,11 +97,11 @@ def test_db():
         current_time = db_time()
         return jsonify({"status": "ok", "db_time": current_time})
     except Exception as exc:  # pragma: no cover - runtime only
-        app.logger.exception("Database test failed")
+        current_app.logger.exception("Database test failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
 
 
-@app.route("/register", methods=["POST"])
+@bp.route("/register", methods=["POST"])
 def register():
     """Register a new user with hashed password."""
 
@@ -70,35 +113,38 @@ def register():
     if not username or not password:
         return jsonify({"status": "error", "message": "Username and password required"}), 400
 
-    conn = None
     try:
-        conn = get_connection()
-        password_hash = generate_password_hash(password)
-        with conn, conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO users (username, email, password_hash)
-                VALUES (%s, %s, %s)
-                RETURNING user_id;
-                """,
-                (username, email, password_hash),
-            )
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("Failed to create user")
-            user_id = row[0]
+        password_hash = hash_password(password)
+        row = queries.create_user(username, email, password_hash)
+        if not row:
+            raise ValueError("Failed to create user")
+        user_id = row[0]
         return jsonify({"status": "ok", "user_id": user_id}), 201
+    except AuthBusy as exc:
+        return _busy(exc)
     except Exception as exc:
-        app.logger.exception("User registration failed")
+        current_app.logger.exception("User registration failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/login", methods=["POST"])
+def _busy(exc: AuthBusy):
+    response = jsonify({"status": "error", "message": str(exc)})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def _upgrade_password_hash(user_id: int, old_hash: str, password: str) -> None:
+    """Store a hash made with the current parameters (best effort)."""
+
+    try:
+        queries.update_password_hash(user_id, old_hash, hash_password(password))
+    except Exception:
+        current_app.logger.warning("Password rehash for user %s failed", user_id, exc_info=True)
+
+
+@bp.route("/login", methods=["POST"])
 def login():
-    """Authenticate user and issue JWT token."""
+    """Authenticate user and issue access and refresh tokens."""
 
     data = _json_body()
     username = data.get("username")
@@ -107,29 +153,45 @@ def login():
     if not username or not password:
         return jsonify({"status": "error", "message": "Username and password required"}), 400
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT user_id, password_hash FROM users WHERE username = %s",
-                (username,),
-            )
-            row = cur.fetchone()
-        if not row or not check_password_hash(row[1], password):
+        login_limiter.check(username)
+        row = queries.user_credentials(username)
+        if not row or not verify_password(row[1], password):
+            login_limiter.failed(username)
             return jsonify({"status": "error", "message": "Invalid credentials"}), 401
+        login_limiter.succeeded(username)
+        user_id, password_hash = row
+        if needs_rehash(password_hash):
+            _upgrade_password_hash(user_id, password_hash, password)
         # identity must be a string for JWT "sub" claim
-        token = create_access_token(identity=str(row[0]))
-        return jsonify({"status": "ok", "token": token})
+        identity = str(user_id)
+        return jsonify(
+            {
+                "status": "ok",
+                "token": create_access_token(identity=identity),
+                "refresh_token": create_refresh_token(identity=identity),
+            }
+        )
+    except LoginThrottled as exc:
+        response = jsonify({"status": "error", "message": str(exc)})
+        response.headers["Retry-After"] = str(max(1, int(exc.retry_after + 0.5)))
+        return response, 429
+    except AuthBusy as exc:
+        return _busy(exc)
     except Exception as exc:
-        app.logger.exception("User login failed")
+        current_app.logger.exception("User login failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/transactions", methods=["POST"])
+@bp.route("/token/refresh", methods=["POST"])
+@jwt_required(refresh=True)
+def refresh_token():
+    """Issue a new access token for a valid refresh token."""
+
+    return jsonify({"status": "ok", "token": create_access_token(identity=get_jwt_identity())})
+
+
+@bp.route("/transactions", methods=["POST"])
 @jwt_required()
 def create_transaction():
     """Create a new transaction for the authenticated user with optional auto-category detection."""
@@ -158,99 +220,301 @@ def create_transaction():
     auto_detected = False
 
     if not category_id and note:
-        predicted = predict_category(note, data.get("amount"))
+        predicted = predict_category(note, data.get("amount"), user_id=current_user_id)
         if predicted:
             category_id = predicted
             auto_detected = True
         else:
             # Default to "Others" if prediction fails
-            category_id = 4
+            category_id = DEFAULT_CATEGORY_ID
             auto_detected = True
     elif not category_id:
         return jsonify({"status": "error", "message": "category_id required when note is empty"}), 400
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn, conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO transactions (user_id, category_id, amount, note)
-                VALUES (%s, %s, %s, %s)
-                RETURNING tx_id;
-                """,
-                (
-                    current_user_id,
-                    category_id,
-                    data["amount"],
-                    note,
-                ),
-            )
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("Failed to create transaction")
-            tx_id = row[0]
+        row = queries.insert_transaction(current_user_id, category_id, data["amount"], note)
+        if not row:
+            raise ValueError("Failed to create transaction")
+        tx_id, tx_date = row
+
+        invalidate_user(current_user_id)
+        if note:
+            record_labelled_transactions(current_user_id)
 
-        # Check budget alerts after transaction creation
-        _check_and_send_budget_alerts(current_user_id)
+        # Budget alerts are evaluated and emailed in the background
+        enqueue_budget_alerts(current_user_id, [tx_date.strftime("%Y-%m")])
 
         response = {"status": "ok", "tx_id": tx_id}
         if auto_detected:
             response["auto_category"] = category_id
         return jsonify(response), 201
     except Exception as exc:
-        app.logger.exception("Create transaction failed")
+        current_app.logger.exception("Create transaction failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/transactions", methods=["GET"])
+def _read_bulk_rows() -> list[Any]:
+    """Read bulk transactions from a JSON array, a CSV upload or a CSV body.
+
+    JSON may be a bare array or ``{"transactions": [...]}``; CSV needs a header
+    row with ``amount`` and any of ``category_id``, ``note``, ``tx_date``.
+    """
+
+    upload = request.files.get("file")
+    if upload is not None:
+        return list(csv.DictReader(io.StringIO(upload.read().decode("utf-8-sig"))))
+    if request.mimetype == "text/csv":
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("transactions")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of transactions or a CSV file")
+    return data
+
+
+def _validate_bulk_row(item: Any) -> dict[str, Any]:
+    """Normalize one bulk row, raising ValueError with a per-row message."""
+
+    if not isinstance(item, dict):
+        raise ValueError("Row must be an object")
+
+    raw_amount = item.get("amount")
+    if raw_amount in (None, ""):
+        raise ValueError("Missing fields: amount")
+    try:
+        amount = Decimal(str(raw_amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount '{raw_amount}'") from None
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount '{raw_amount}'")
+
+    raw_category = item.get("category_id")
+    category_id = None
+    if raw_category not in (None, ""):
+        try:
+            category_id = int(raw_category)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid category_id '{raw_category}'") from None
+
+    note = item.get("note") or ""
+    if not isinstance(note, str):
+        raise ValueError("note must be a string")
+    if category_id is None and not note.strip():
+        raise ValueError("category_id required when note is empty")
+
+    return {
+        "amount": amount,
+        "category_id": category_id,
+        "note": note,
+        "tx_date": parse_date(str(item.get("tx_date") or "")),
+    }
+
+
+@bp.route("/transactions/bulk", methods=["POST"])
 @jwt_required()
-def list_transactions():
-    """List transactions for the authenticated user."""
+def create_transactions_bulk():
+    """Insert many transactions in one request (JSON array or CSV upload).
+
+    Rows are validated independently; invalid rows are reported in ``errors``
+    (with their 0-based ``row`` index) while valid rows are still inserted.
+    Notes without a category are classified in a single batch, rows are
+    written with one multi-row INSERT, and budget alerts run once per
+    affected month.
+    """
 
     current_user_id = int(get_jwt_identity())
-    requested_user_id = request.args.get("user_id", type=int) or current_user_id
-    if requested_user_id != current_user_id:
-        return jsonify({"status": "error", "message": "User mismatch"}), 403
+    try:
+        items = _read_bulk_rows()
+    except (ValueError, UnicodeDecodeError) as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+    if not items:
+        return jsonify({"status": "error", "message": "No transactions provided"}), 400
+    if len(items) > BULK_MAX_ROWS:
+        return (
+            jsonify({"status": "error", "message": f"At most {BULK_MAX_ROWS} rows per request"}),
+            413,
+        )
+
+    errors: list[dict[str, Any]] = []
+    rows: list[tuple[int, dict[str, Any]]] = []
+    for index, item in enumerate(items):
+        try:
+            rows.append((index, _validate_bulk_row(item)))
+        except ValueError as exc:
+            errors.append({"row": index, "message": str(exc)})
+
+    to_classify = [row for _, row in rows if row["category_id"] is None]
+    predictions = predict_categories([row["note"] for row in to_classify], user_id=current_user_id)
+    for row, predicted in zip(to_classify, predictions):
+        row["category_id"] = predicted or DEFAULT_CATEGORY_ID
+        row["auto_category"] = True
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT tx_id, category_id, amount, note, tx_date
-                FROM transactions
-                WHERE user_id = %s
-                ORDER BY tx_date DESC;
-                """,
-                (current_user_id,),
-            )
-            rows = cur.fetchall()
+        with connection() as conn:
+            with conn, conn.cursor() as cur:
+                known_categories = queries.category_ids(cur=cur)
+                accepted = []
+                for index, row in rows:
+                    if row["category_id"] in known_categories:
+                        accepted.append((index, row))
+                    else:
+                        errors.append(
+                            {"row": index, "message": f"Unknown category_id {row['category_id']}"}
+                        )
+
+                inserted = []
+                if accepted:
+                    inserted = queries.insert_transactions(
+                        current_user_id,
+                        [
+                            (row["category_id"], row["amount"], row["note"], row["tx_date"])
+                            for _, row in accepted
+                        ],
+                        cur=cur,
+                    )
+
+        invalidate_user(current_user_id)
+        record_labelled_transactions(
+            current_user_id, sum(1 for _, row in accepted if row["note"].strip())
+        )
+        enqueue_budget_alerts(current_user_id, [tx_date.strftime("%Y-%m") for _, tx_date in inserted])
 
-        result = [
+        errors.sort(key=lambda error: error["row"])
+        created = [
             {
-                "tx_id": row[0],
-                "category_id": row[1],
-                "amount": _to_float(row[2]),
-                "note": row[3],
-                "tx_date": row[4].isoformat() if row[4] else None,
+                "row": index,
+                "tx_id": tx_id,
+                **({"auto_category": row["category_id"]} if row.get("auto_category") else {}),
             }
-            for row in rows
+            for (index, row), (tx_id, _) in zip(accepted, inserted)
         ]
-        return jsonify(result)
+        if not created:
+            return jsonify({"status": "error", "inserted": 0, "errors": errors}), 400
+        return (
+            jsonify(
+                {
+                    "status": "partial" if errors else "ok",
+                    "inserted": len(created),
+                    "transactions": created,
+                    "errors": errors,
+                }
+            ),
+            201,
+        )
     except Exception as exc:
-        app.logger.exception("List transactions failed")
+        current_app.logger.exception("Bulk transaction import failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/budget", methods=["POST"])
+@bp.route("/categorize", methods=["POST"])
+@jwt_required()
+def categorize():
+    """Predict categories for a batch of notes without saving anything.
+
+    Body: ``{"notes": ["Uber", "Coffee shop", ...]}`` (or a bare array).
+    Returns ``categories`` aligned with ``notes``; ``null`` for empty notes.
+    """
+
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True)
+    notes = data.get("notes") if isinstance(data, dict) else data
+    if not isinstance(notes, list) or not all(isinstance(note, str) for note in notes):
+        return jsonify({"status": "error", "message": "notes must be a list of strings"}), 400
+    if len(notes) > BULK_MAX_ROWS:
+        return (
+            jsonify({"status": "error", "message": f"At most {BULK_MAX_ROWS} notes per request"}),
+            413,
+        )
+
+    categories = predict_categories(notes, user_id=current_user_id)
+    return jsonify({"status": "ok", "categories": categories})
+
+
+@bp.route("/transactions", methods=["GET"])
+@jwt_required()
+def list_transactions():
+    """List one page of transactions for the authenticated user, newest first.
+
+    Query parameters: ``limit`` (page size), ``after`` (``next_cursor`` from the
+    previous page), ``from``/``to`` (inclusive YYYY-MM-DD bounds) and
+    ``category_id``. Pages are keyset-paginated on ``(tx_date, tx_id)``.
+    """
+
+    current_user_id = int(get_jwt_identity())
+    requested_user_id = request.args.get("user_id", type=int) or current_user_id
+    if requested_user_id != current_user_id:
+        return jsonify({"status": "error", "message": "User mismatch"}), 403
+
+    try:
+        rows, limit = queries.transaction_page(request.args, current_user_id)
+        return jsonify(transaction_page(rows, limit))
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+    except Exception as exc:
+        current_app.logger.exception("List transactions failed")
+        return jsonify({"status": "error", "message": str(exc)}), 500
+
+
+def _format_export_batch(rows: list[tuple], export_format: str) -> str:
+    """Render a batch of transaction rows as NDJSON lines or CSV records."""
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            payload = transaction_payload(row)
+            writer.writerow([payload[column] for column in EXPORT_COLUMNS])
+        return buffer.getvalue()
+    return "".join(json.dumps(transaction_payload(row)) + "\n" for row in rows)
+
+
+@bp.route("/transactions/export", methods=["GET"])
+@jwt_required()
+def export_transactions():
+    """Stream every matching transaction as NDJSON (default) or CSV.
+
+    Accepts ``format`` (``ndjson`` or ``csv``) plus the same ``from``/``to``/
+    ``category_id`` filters as GET /transactions. Rows are read through a
+    server-side cursor and written in batches of ``EXPORT_BATCH_SIZE``, so
+    memory stays flat however long the history is.
+    """
+
+    current_user_id = int(get_jwt_identity())
+    export_format = request.args.get("format", "ndjson").lower()
+    if export_format not in ("ndjson", "csv"):
+        return jsonify({"status": "error", "message": "format must be ndjson or csv"}), 400
+    try:
+        statement, params = queries.transaction_export_statement(request.args, current_user_id)
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+
+    def generate() -> Iterator[str]:
+        if export_format == "csv":
+            yield ",".join(EXPORT_COLUMNS) + "\r\n"
+        try:
+            for batch in queries.stream(statement, params, EXPORT_BATCH_SIZE):
+                yield _format_export_batch(batch, export_format)
+        except Exception:
+            current_app.logger.exception("Transaction export failed")
+            raise
+
+    extension = "csv" if export_format == "csv" else "ndjson"
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    # The body is generated after the view returns; keep the app context
+    # (current_app.logger) alive until the stream ends.
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="transactions.{extension}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@bp.route("/budget", methods=["POST"])
 @jwt_required()
 def create_budget():
     """Create or update a monthly budget for a category."""
@@ -266,43 +530,36 @@ def create_budget():
             ),
             400,
         )
+    try:
+        parse_month(data["month_year"])
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn, conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO budgets (user_id, category_id, limit_amount, month_year)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_id, category_id, month_year)
-                DO UPDATE SET limit_amount = EXCLUDED.limit_amount
-                RETURNING budget_id;
-                """,
-                (
-                    current_user_id,
-                    data["category_id"],
-                    data["limit_amount"],
-                    data["month_year"],
-                ),
-            )
-            row = cur.fetchone()
-            if not row:
-                raise ValueError("Failed to create budget")
-            budget_id = row[0]
+        row = queries.upsert_budget(
+            current_user_id, data["category_id"], data["limit_amount"], data["month_year"]
+        )
+        if not row:
+            raise ValueError("Failed to create budget")
+        budget_id = row[0]
+        invalidate_user(current_user_id)
+        # A changed limit can cross or un-cross the alert threshold.
+        enqueue_budget_alerts(current_user_id, [data["month_year"]])
         return jsonify({"status": "ok", "budget_id": budget_id}), 201
     except Exception as exc:
-        app.logger.exception("Create budget failed")
+        current_app.logger.exception("Create budget failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/budget/status", methods=["GET"])
+@bp.route("/budget/status", methods=["GET"])
 @jwt_required()
+@cached_report
 def budget_status():
-    """Return budget utilization for a given month."""
+    """Return budget utilization for a given month, or per month for a range.
+
+    ``from``/``to`` or ``last`` select a range of months, answered by a
+    single query; see :func:`payloads.budget_months`.
+    """
 
     current_user_id = int(get_jwt_identity())
     user_id = request.args.get("user_id", type=int) or current_user_id
@@ -310,265 +567,308 @@ def budget_status():
 
     if user_id != current_user_id:
         return jsonify({"status": "error", "message": "User mismatch"}), 403
+    try:
+        months = budget_months(request.args, datetime.now().date())
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+    if months is not None:
+        try:
+            rows = queries.budget_history(current_user_id, *months)
+            return jsonify(budget_history_payload(rows, *months))
+        except Exception as exc:
+            current_app.logger.exception("Budget status failed")
+            return jsonify({"status": "error", "message": str(exc)}), 500
     if not month:
         return jsonify({"status": "error", "message": "Month parameter required"}), 400
-
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    b.category_id,
-                    c.name AS category,
-                    b.limit_amount,
-                    COALESCE(SUM(t.amount), 0) AS spent
-                FROM budgets b
-                LEFT JOIN transactions t
-                    ON b.category_id = t.category_id
-                    AND TO_CHAR(t.tx_date, 'YYYY-MM') = b.month_year
-                    AND t.user_id = b.user_id
-                LEFT JOIN categories c ON c.category_id = b.category_id
-                WHERE b.user_id = %s AND b.month_year = %s
-                GROUP BY b.category_id, c.name, b.limit_amount;
-                """,
-                (current_user_id, month),
-            )
-            rows = cur.fetchall()
+        month_start, _ = month_bounds(month)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Month must be in YYYY-MM format"}), 400
 
-        payload = []
-        for row in rows:
-            limit_amount = _to_float(row[2]) or 0.0
-            spent = _to_float(row[3]) or 0.0
-            used_percent = round((spent / limit_amount) * 100, 2) if limit_amount else 0.0
-            payload.append(
-                {
-                    "category_id": row[0],
-                    "category": row[1],
-                    "limit_amount": limit_amount,
-                    "spent": spent,
-                    "used_percent": used_percent,
-                }
-            )
-        return jsonify(payload)
+    try:
+        rows = queries.budget_usage(current_user_id, month_start)
+        return jsonify([budget_payload(row) for row in rows])
     except Exception as exc:
-        app.logger.exception("Budget status failed")
+        current_app.logger.exception("Budget status failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/report/monthly")
+@bp.route("/report/monthly")
 @jwt_required()
+@cached_report
 def monthly_report():
     """Return monthly expense aggregation."""
 
     current_user_id = int(get_jwt_identity())
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    TO_CHAR(t.tx_date, 'YYYY-MM') AS month,
-                    SUM(t.amount) AS total_expense
-                FROM transactions t
-                JOIN categories c ON t.category_id = c.category_id
-                WHERE c.type = 'expense' AND t.user_id = %s
-                GROUP BY month
-                ORDER BY month;
-                """,
-                (current_user_id,),
-            )
-            rows = cur.fetchall()
+        rows = queries.monthly_expense(current_user_id)
         payload = [
-            {"month": row[0], "total_expense": _to_float(row[1])} for row in rows
+            {"month": row[0], "total_expense": to_float(row[1])} for row in rows
         ]
         return jsonify(payload)
     except Exception as exc:
-        app.logger.exception("Monthly report failed")
+        current_app.logger.exception("Monthly report failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/report/category")
+@bp.route("/report/category")
 @jwt_required()
+@cached_report
 def category_report():
     """Return category expense aggregation."""
 
     current_user_id = int(get_jwt_identity())
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    c.name AS category,
-                    SUM(t.amount) AS total_expense
-                FROM transactions t
-                JOIN categories c ON t.category_id = c.category_id
-                WHERE c.type = 'expense' AND t.user_id = %s
-                GROUP BY c.name
-                ORDER BY total_expense DESC;
-                """,
-                (current_user_id,),
-            )
-            rows = cur.fetchall()
+        rows = queries.category_expense(current_user_id)
         payload = [
-            {"category": row[0], "total_expense": _to_float(row[1])} for row in rows
+            {"category": row[0], "total_expense": to_float(row[1])} for row in rows
         ]
         return jsonify(payload)
     except Exception as exc:
-        app.logger.exception("Category report failed")
+        current_app.logger.exception("Category report failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/predict")
+@bp.route("/report/analytics")
 @jwt_required()
-def predict_expense():
-    """Predict next month expense using linear regression."""
+@cached_report
+def analytics_report():
+    """Return income, expense and net cashflow per period and group.
+
+    Cells, period totals, group totals and the grand total come from one
+    ``GROUPING SETS`` query.
+    """
 
     current_user_id = int(get_jwt_identity())
+    try:
+        granularity, group_by, date_from, date_to = analytics_options(request.args)
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    TO_CHAR(t.tx_date, 'YYYY-MM') AS month,
-                    SUM(t.amount) AS total
-                FROM transactions t
-                WHERE t.user_id = %s
-                GROUP BY month
-                ORDER BY month;
-                """,
-                (current_user_id,),
-            )
-            rows = cur.fetchall()
+        rows = queries.analytics(current_user_id, granularity, group_by, date_from, date_to)
+        return jsonify(analytics_payload(rows, granularity, group_by, date_from, date_to))
+    except Exception as exc:
+        current_app.logger.exception("Analytics report failed")
+        return jsonify({"status": "error", "message": str(exc)}), 500
+
+
+def _fit_user_forecast(user_id: int, model: str) -> dict[str, Any] | None:
+    """Fit ``model`` to the user's total and per-category monthly series.
+
+    See :func:`payloads.fit_history` for the result. Unless the report cache
+    is off, fits are cached until the user's data version changes, so
+    repeat calls with another horizon or interval skip the database entirely.
+    """
+
+    version = data_version(user_id)
+    key = (user_id, version, model)
+    if version is not None:
+        cached = _fitted_forecasts.get(key)
+        if cached is not None:
+            return cached
+
+    history = history_months(model)
+    fitted = fit_history(queries.forecast_history(user_id, history), model, history)
+    if fitted is not None and version is not None:
+        _fitted_forecasts.put(key, fitted)
+    return fitted
+
+
+@bp.route("/predict")
+@jwt_required()
+@cached_report
+def predict_expense():
+    """Forecast monthly expense.
 
-        if not rows:
+    Query parameters: ``model`` (linear, ses or seasonal_naive; default
+    linear), ``horizon`` (months ahead, default 1), ``interval`` (prediction
+    interval coverage, default 0.95) and ``by_category`` (also forecast each
+    category). ``months`` and ``predicted_next`` keep their original meaning.
+    """
+
+    current_user_id = int(get_jwt_identity())
+    try:
+        model, horizon, interval, by_category = predict_options(request.args)
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+
+    try:
+        if not by_category:
+            row = queries.stored_forecast(current_user_id, model, interval, horizon)
+            if row is not None:
+                first, n_months, forecast = stored_forecast(row)
+                return jsonify(predict_payload(model, interval, first, n_months, forecast))
+
+        fitted = _fit_user_forecast(current_user_id, model)
+        if fitted is None:
             return jsonify({"status": "error", "message": "Not enough data"}), 400
+        return jsonify(fitted_predict_payload(fitted, model, horizon, interval, by_category))
+    except Exception as exc:
+        current_app.logger.exception("Prediction failed")
+        return jsonify({"status": "error", "message": str(exc)}), 500
 
-        recent_rows = rows[-6:]
-        months = [row[0] for row in recent_rows]
-        totals = [float(row[1]) for row in recent_rows]
 
-        if len(totals) == 1:
-            predicted = totals[0]
-        else:
-            x = np.arange(len(totals), dtype=float)
-            y = np.array(totals, dtype=float)
-            slope, intercept = np.polyfit(x, y, 1)
-            predicted = max(0.0, float(slope * len(totals) + intercept))
+@bp.route("/report/dashboard")
+@jwt_required()
+@cached_report
+def dashboard_report():
+    """Return monthly, category, budget and forecast data for the dashboard.
+
+    Everything comes from one query over the user's rollup rows, so a page
+    load costs a single round trip instead of one per chart.
+    """
+
+    current_user_id = int(get_jwt_identity())
+    month = request.args.get("month") or datetime.now().strftime("%Y-%m")
+    try:
+        month_start, _ = month_bounds(month)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Month must be in YYYY-MM format"}), 400
+
+    try:
+        row = queries.dashboard(current_user_id, month_start, LINEAR_WINDOW)
+        if not row:
+            raise ValueError("Failed to load dashboard")
+        monthly, by_category, budget, recent, first_month = row
 
         return jsonify(
             {
-                "months": months,
-                "predicted_next": round(predicted, 2),
+                "month": month_start.strftime("%Y-%m"),
+                "monthly": [{"month": m, "total_expense": total} for m, total in monthly],
+                "category": [
+                    {"category": name, "total_expense": total} for name, total in by_category
+                ],
+                "budget": [budget_payload(row) for row in budget],
+                "predict": forecast_payload(recent, first_month) if recent else None,
             }
         )
     except Exception as exc:
-        app.logger.exception("Prediction failed")
+        current_app.logger.exception("Dashboard report failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
-    finally:
-        if conn is not None:
-            conn.close()
 
 
-@app.route("/report")
+@bp.route("/report")
 def report_page():
     """Render the dashboard page with Chart.js visualizations."""
 
     return render_template("report.html")
 
 
-def _check_and_send_budget_alerts(user_id: int) -> None:
-    """Check budget utilization and send email alerts if threshold exceeded."""
-    from datetime import datetime
+@bp.route("/budget/check-alerts", methods=["POST"])
+@jwt_required()
+def check_budget_alerts():
+    """Queue a budget alert check for the authenticated user's month."""
 
-    current_month = datetime.now().strftime("%Y-%m")
-    conn = None
+    current_user_id = int(get_jwt_identity())
+    month = request.args.get("month") or datetime.now().strftime("%Y-%m")
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    b.category_id,
-                    c.name AS category,
-                    b.limit_amount,
-                    COALESCE(SUM(t.amount), 0) AS spent,
-                    b.month_year
-                FROM budgets b
-                LEFT JOIN transactions t
-                    ON b.category_id = t.category_id
-                    AND TO_CHAR(t.tx_date, 'YYYY-MM') = b.month_year
-                    AND t.user_id = b.user_id
-                LEFT JOIN categories c ON c.category_id = b.category_id
-                WHERE b.user_id = %s AND b.month_year = %s
-                GROUP BY b.category_id, c.name, b.limit_amount, b.month_year;
-                """,
-                (user_id, current_month),
-            )
-            rows = cur.fetchall()
-
-        user_email = get_user_email(user_id)
-        if not user_email:
-            return
+        month_bounds(month)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Month must be in YYYY-MM format"}), 400
 
-        for row in rows:
-            limit_amount = _to_float(row[2]) or 0.0
-            spent = _to_float(row[3]) or 0.0
-            if limit_amount > 0:
-                used_percent = round((spent / limit_amount) * 100, 2)
-                if used_percent > 90.0:
-                    send_budget_alert(
-                        recipient_email=user_email,
-                        category_name=row[1] or "Unknown",
-                        limit_amount=limit_amount,
-                        spent=spent,
-                        used_percent=used_percent,
-                        month=row[4] or current_month,
-                    )
+    try:
+        enqueue_budget_alerts(current_user_id, [month])
+        return jsonify({"status": "ok", "message": "Budget alert check queued"}), 202
     except Exception as exc:
-        app.logger.exception("Budget alert check failed")
-    finally:
-        if conn is not None:
-            conn.close()
+        current_app.logger.exception("Budget alert check failed")
+        return jsonify({"status": "error", "message": str(exc)}), 500
 
 
-@app.route("/budget/check-alerts", methods=["POST"])
+@bp.route("/alerts/settings", methods=["GET"])
 @jwt_required()
-def check_budget_alerts():
-    """Manually trigger budget alert check for the authenticated user."""
+def get_alert_settings():
+    """Return the authenticated user's budget alert settings."""
 
     current_user_id = int(get_jwt_identity())
-    month = request.args.get("month")
-    if not month:
-        from datetime import datetime
+    try:
+        enabled, threshold, last_sent = queries.alert_settings(current_user_id) or (True, None, None)
+        return jsonify(
+            {
+                "status": "ok",
+                "email_enabled": enabled is not False,
+                "alert_threshold": to_float(threshold) or ALERT_THRESHOLD_PERCENT,
+                "last_alert_sent": last_sent.isoformat() if last_sent else None,
+            }
+        )
+    except Exception as exc:
+        current_app.logger.exception("Fetch alert settings failed")
+        return jsonify({"status": "error", "message": str(exc)}), 500
+
 
-        month = datetime.now().strftime("%Y-%m")
+@bp.route("/alerts/settings", methods=["PUT"])
+@jwt_required()
+def update_alert_settings():
+    """Set the alert threshold (percent of budget) and email opt-in."""
+
+    current_user_id = int(get_jwt_identity())
+    data = _json_body()
+    threshold = data.get("alert_threshold")
+    enabled = data.get("email_enabled")
+    if threshold is not None:
+        # Stored as DECIMAL(5, 2): round first so e.g. 999.999 cannot overflow.
+        try:
+            threshold = Decimal(str(threshold)).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            threshold = None
+        if threshold is None or not threshold.is_finite() or not (0 < threshold < 1000):
+            return (
+                jsonify({"status": "error", "message": "alert_threshold must be between 0 and 1000"}),
+                400,
+            )
+    if enabled is not None and not isinstance(enabled, bool):
+        return jsonify({"status": "error", "message": "email_enabled must be true or false"}), 400
 
     try:
-        _check_and_send_budget_alerts(current_user_id)
-        return jsonify({"status": "ok", "message": "Budget alerts checked"})
+        row = queries.upsert_alert_settings(
+            current_user_id, enabled, threshold, ALERT_THRESHOLD_PERCENT
+        )
+        if not row:
+            raise ValueError("Failed to update alert settings")
+        enabled, threshold = row
+        # Re-evaluate this month against the new threshold.
+        enqueue_budget_alerts(current_user_id, [datetime.now().strftime("%Y-%m")])
+        return jsonify(
+            {"status": "ok", "email_enabled": enabled, "alert_threshold": to_float(threshold)}
+        )
     except Exception as exc:
-        app.logger.exception("Budget alert check failed")
+        current_app.logger.exception("Update alert settings failed")
         return jsonify({"status": "error", "message": str(exc)}), 500
 
 
+def create_app(config: dict[str, Any] | None = None) -> Flask:
+    """Create and configure the Flask application.
+
+    Args:
+        config: Overrides applied on top of the environment-derived settings.
+    """
+
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "super-secret-key")
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(
+        seconds=int(os.getenv("JWT_ACCESS_TOKEN_EXPIRES", "900"))
+    )
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(
+        seconds=int(os.getenv("JWT_REFRESH_TOKEN_EXPIRES", str(30 * 24 * 3600)))
+    )
+    if config:
+        app.config.update(config)
+    jwt.init_app(app)
+
+    # Initialize Flask-Mail and the background alert worker that uses it
+    init_mail(app)
+    init_alerts(app)
+
+    # Per-request timings and the /metrics endpoint
+    init_metrics(app)
+    register_gauge("db_pool_connections", "Connections owned by the pool.", lambda: get_pool().size)
+    register_gauge("db_pool_in_use", "Connections currently checked out.", lambda: get_pool().in_use)
+
+    app.register_blueprint(bp)
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5050)
\ No newline at end of file
+    create_app().run(debug=True, host="0.0.0.0", port=5050)
\ No newline at end of file
@@ -0,0 +1,431 @@
+"""Async read path: the listing and report endpoints on Starlette and asyncpg.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5051 --workers 2
+
+Serves ``GET /transactions``, ``/report/monthly``, ``/report/category``,
+``/report/analytics``, ``/budget/status`` and ``/predict`` with the same
+responses as the Flask app (:mod:`app`), which keeps every other route
+including all writes. A request waiting on the database holds only a
+coroutine, not a thread, so one process serves thousands of concurrent
+dashboard requests over a small asyncpg pool.
+Route these paths to this server at the reverse proxy.
+
+Access tokens are the ones issued by the Flask app's ``/login``: the same
+``JWT_SECRET_KEY``, the identity in ``sub``, and refresh tokens rejected.
+Responses are cached only with ``REPORT_CACHE_BACKEND=sqlite``, the backend
+that sees the Flask app's invalidations (see :func:`cache.shared_cache`).
+"""
+
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from contextlib import asynccontextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional, cast
+
+import asyncpg
+import jwt
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+import queries
+from cache import response_key, shared_cache, store_response
+from db import load_config, load_pool_config, month_bounds
+from forecasting import FittedModelCache, history_months
+from payloads import (
+    analytics_options,
+    analytics_payload,
+    budget_history_payload,
+    budget_months,
+    budget_payload,
+    fit_history,
+    fitted_predict_payload,
+    int_arg,
+    month_labels,
+    predict_options,
+    predict_payload,
+    stored_forecast,
+    to_float,
+    transaction_page,
+)
+
+logger = logging.getLogger(__name__)
+
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "super-secret-key")
+JWT_ALGORITHMS = ["HS256"]
+
+_fitted_forecasts = FittedModelCache()
+
+Handler = Callable[[Request, int], Awaitable[Response]]
+
+
+class JSON(JSONResponse):
+    """JSON rendered like Flask's ``jsonify``, so both apps return identical bodies."""
+
+    def render(self, content: Any) -> bytes:
+        return (json.dumps(content, sort_keys=True, separators=(",", ":")) + "\n").encode()
+
+
+def _error(message: str, status: int) -> Response:
+    return JSON({"status": "error", "message": message}, status_code=status)
+
+
+class AuthError(Exception):
+    """An access token is missing or unusable; mirrors flask_jwt_extended's replies."""
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _identity(request: Request) -> int:
+    """Return the user id from the request's access token.
+
+    Raises:
+        AuthError: No token, an expired or invalid one, or a refresh token.
+    """
+
+    header = request.headers.get("Authorization")
+    if not header:
+        raise AuthError("Missing Authorization Header", 401)
+    scheme, _, token = header.partition(" ")
+    if scheme != "Bearer" or not token:
+        raise AuthError("Bad Authorization header. Expected 'Authorization: Bearer <JWT>'", 422)
+    try:
+        claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=JWT_ALGORITHMS)
+    except jwt.ExpiredSignatureError:
+        raise AuthError("Token has expired", 401) from None
+    except jwt.InvalidTokenError as exc:
+        raise AuthError(str(exc), 422) from None
+    if claims.get("type") != "access":
+        raise AuthError("Only non-refresh tokens are allowed", 422)
+    try:
+        return int(claims["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise AuthError("Invalid token identity", 422) from None
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match", "")
+    tags = {tag.strip().removeprefix("W/").strip('"') for tag in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+def _from_cache(request: Request, etag: str, body: bytes, mimetype: str) -> Response:
+    if _etag_matches(request, etag):
+        response = Response(status_code=304)
+    else:
+        response = Response(body, media_type=mimetype)
+    response.headers["ETag"] = f'"{etag}"'
+    # Let browsers keep the body but revalidate with If-None-Match.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def endpoint(description: str, cached: bool = True) -> Callable[[Handler], Callable]:
+    """Wrap a handler with authentication, optional caching and error handling.
+
+    Args:
+        description: Names the endpoint in the log when the handler fails.
+        cached: Cache 200 responses per user, like ``cache.cached_report``.
+    """
+
+    def decorate(handler: Handler) -> Callable[[Request], Awaitable[Response]]:
+        async def run(request: Request, user_id: int) -> Response:
+            try:
+                return await handler(request, user_id)
+            except Exception as exc:
+                logger.exception("%s failed", description)
+                return _error(str(exc), 500)
+
+        async def route(request: Request) -> Response:
+            try:
+                user_id = _identity(request)
+            except AuthError as exc:
+                return JSON({"msg": exc.message}, status_code=exc.status)
+
+            cache = shared_cache() if cached else None
+            if cache is None:
+                return await run(request, user_id)
+            key = await run_in_threadpool(
+                response_key, cache, user_id, request.url.path, request.query_params.multi_items()
+            )
+            hit = await run_in_threadpool(cache.get, key)
+            if hit is not None:
+                return _from_cache(request, *hit)
+            response = await run(request, user_id)
+            if response.status_code != 200:
+                return response
+            body = bytes(response.body)
+            media_type = response.media_type or "application/json"
+            etag = await run_in_threadpool(store_response, cache, key, body, media_type)
+            return _from_cache(request, etag, body, media_type)
+
+        return route
+
+    return decorate
+
+
+async def _fetch(
+    request: Request, statement: queries.Statement, *args: Any
+) -> list[Sequence[Any]]:
+    """Run a named statement on a pooled connection, reporting it to :mod:`metrics`.
+
+    asyncpg prepares and caches the statement's SQL per connection itself.
+    Records index and iterate like the psycopg2 tuples the payload builders
+    take, so they are returned as plain sequences.
+    """
+
+    pool: asyncpg.Pool = request.app.state.pool
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        metrics.record_checkout(time.perf_counter() - started)
+        started = time.perf_counter()
+        try:
+            return cast(list[Sequence[Any]], await conn.fetch(statement.sql, *args))
+        finally:
+            duration = time.perf_counter() - started
+            metrics.record_query(statement.sql, duration)
+            metrics.record_statement(statement.name, duration)
+
+
+def _user_mismatch(request: Request, user_id: int) -> bool:
+    return (int_arg(request.query_params, "user_id", 0) or user_id) != user_id
+
+
+@endpoint("List transactions", cached=False)
+async def list_transactions(request: Request, user_id: int) -> Response:
+    """One keyset page of the user's transactions, as ``app.list_transactions``."""
+
+    if _user_mismatch(request, user_id):
+        return _error("User mismatch", 403)
+    try:
+        statement, params, limit = queries.transaction_page_statement(
+            request.query_params, user_id
+        )
+    except ValueError as exc:
+        return _error(str(exc), 400)
+    rows = await _fetch(request, statement, *params)
+    return JSON(transaction_page(rows, limit))
+
+
+@endpoint("Budget status")
+async def budget_status(request: Request, user_id: int) -> Response:
+    """Budget utilization for one month or a range, as ``app.budget_status``."""
+
+    if _user_mismatch(request, user_id):
+        return _error("User mismatch", 403)
+    try:
+        months = budget_months(request.query_params, datetime.now().date())
+    except ValueError as exc:
+        return _error(str(exc), 400)
+    if months is not None:
+        rows = await _fetch(
+            request, queries.BUDGET_HISTORY, user_id, *months, month_labels(*months)
+        )
+        return JSON(budget_history_payload(rows, *months))
+    month = request.query_params.get("month")
+    if not month:
+        return _error("Month parameter required", 400)
+    try:
+        month_start, _ = month_bounds(month)
+    except ValueError:
+        return _error("Month must be in YYYY-MM format", 400)
+
+    rows = await _fetch(request, queries.BUDGET_USAGE, user_id, month_start)
+    return JSON([budget_payload(row) for row in rows])
+
+
+@endpoint("Monthly report")
+async def monthly_report(request: Request, user_id: int) -> Response:
+    """Monthly expense totals, as ``app.monthly_report``."""
+
+    rows = await _fetch(request, queries.MONTHLY_EXPENSE, user_id)
+    return JSON([{"month": row[0], "total_expense": to_float(row[1])} for row in rows])
+
+
+@endpoint("Category report")
+async def category_report(request: Request, user_id: int) -> Response:
+    """Expense totals per category, as ``app.category_report``."""
+
+    rows = await _fetch(request, queries.CATEGORY_EXPENSE, user_id)
+    return JSON([{"category": row[0], "total_expense": to_float(row[1])} for row in rows])
+
+
+@endpoint("Analytics report")
+async def analytics_report(request: Request, user_id: int) -> Response:
+    """Cashflow per period and group, as ``app.analytics_report``."""
+
+    try:
+        granularity, group_by, date_from, date_to = analytics_options(request.query_params)
+    except ValueError as exc:
+        return _error(str(exc), 400)
+
+    rows = await _fetch(
+        request,
+        queries.analytics_statement(granularity, date_from, date_to),
+        user_id,
+        granularity,
+        date_from,
+        date_to,
+        group_by == "category",
+    )
+    return JSON(analytics_payload(rows, granularity, group_by, date_from, date_to))
+
+
+async def _fit_user_forecast(request: Request, user_id: int, model: str) -> Optional[dict[str, Any]]:
+    """Fit ``model`` to the user's rollup history, as ``app._fit_user_forecast``.
+
+    Fits are memoized only under a shared cache's data version; fitting runs
+    in a worker thread so it does not block the event loop.
+    """
+
+    cache = shared_cache()
+    version = await run_in_threadpool(cache.get_version, user_id) if cache is not None else None
+    key = (user_id, version, model)
+    if version is not None:
+        fitted = _fitted_forecasts.get(key)
+        if fitted is not None:
+            return fitted
+
+    history = history_months(model)
+    rows = await _fetch(request, queries.FORECAST_HISTORY, user_id, history)
+    fitted = await run_in_threadpool(fit_history, rows, model, history)
+    if fitted is not None and version is not None:
+        _fitted_forecasts.put(key, fitted)
+    return fitted
+
+
+@endpoint("Prediction")
+async def predict_expense(request: Request, user_id: int) -> Response:
+    """Forecast monthly expense, as ``app.predict_expense``."""
+
+    try:
+        model, horizon, interval, by_category = predict_options(request.query_params)
+    except ValueError as exc:
+        return _error(str(exc), 400)
+
+    if not by_category:
+        rows = await _fetch(
+            request, queries.STORED_FORECAST, user_id, model, Decimal(str(interval)), horizon
+        )
+        if rows:
+            first, n_months, forecast = stored_forecast(rows[0])
+            return JSON(predict_payload(model, interval, first, n_months, forecast))
+
+    fitted = await _fit_user_forecast(request, user_id, model)
+    if fitted is None:
+        return _error("Not enough data", 400)
+    return JSON(fitted_predict_payload(fitted, model, horizon, interval, by_category))
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if not metrics.authorized(request.headers.get("Authorization")):
+        return Response("Unauthorized\n", status_code=401, media_type="text/plain")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class RequestMetrics:
+    """ASGI middleware feeding each request's breakdown to :mod:`metrics`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = metrics.start_request()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            metrics.finish_request(
+                token, scope["method"], scope["path"], getattr(route, "path", None), status
+            )
+
+
+async def _create_pool() -> asyncpg.Pool:
+    config = load_config()
+    pool_config = load_pool_config()
+
+    async def opened(conn: asyncpg.Connection) -> None:
+        metrics.record_connection_opened()
+
+    return await asyncpg.create_pool(
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        database=config.dbname,
+        min_size=pool_config.min_size,
+        max_size=pool_config.max_size,
+        max_queries=pool_config.max_uses,
+        max_inactive_connection_lifetime=pool_config.max_age,
+        # Behind a transaction-mode pooler a cached statement may be missing
+        # on the next server connection; see queries.PREPARE_STATEMENTS.
+        statement_cache_size=100 if queries.PREPARE_STATEMENTS else 0,
+        init=opened,
+    )
+
+
+def create_app() -> Starlette:
+    """Create the Starlette application; the pool opens on startup."""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        app.state.pool = await _create_pool()
+        metrics.register_gauge(
+            "db_pool_connections", "Connections owned by the pool.", app.state.pool.get_size
+        )
+        metrics.register_gauge(
+            "db_pool_in_use",
+            "Connections currently checked out.",
+            lambda: app.state.pool.get_size() - app.state.pool.get_idle_size(),
+        )
+        try:
+            yield
+        finally:
+            await app.state.pool.close()
+
+    app = Starlette(
+        routes=[
+            Route("/transactions", list_transactions, methods=["GET"]),
+            Route("/budget/status", budget_status, methods=["GET"]),
+            Route("/report/monthly", monthly_report, methods=["GET"]),
+            Route("/report/category", category_report, methods=["GET"]),
+            Route("/report/analytics", analytics_report, methods=["GET"]),
+            Route("/predict", predict_expense, methods=["GET"]),
+            Route("/metrics", metrics_endpoint, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.add_middleware(RequestMetrics)
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=5051)
@@ -0,0 +1,222 @@
+"""Password hashing and login throttling.
+
+Hashing and verifying passwords is deliberately slow, so it runs in a small
+process pool instead of on request threads, and the pool's queue is bounded:
+when ``AUTH_MAX_PENDING`` operations are already waiting, new ones fail fast
+with :class:`AuthBusy` (the API answers 503) instead of piling up.
+
+``PASSWORD_HASH_METHOD`` selects the werkzeug hash method and parameters,
+e.g. ``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. A stored hash made
+with other parameters still verifies, and login replaces it with a hash made
+with the current ones.
+
+Failed logins are counted per username; after ``LOGIN_MAX_FAILURES`` within
+``LOGIN_FAILURE_WINDOW`` seconds further attempts are refused (429) without
+touching the database or hashing anything. Counts are kept per process.
+"""
+
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional, TypeVar
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import timed
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", str(max(AUTH_WORKERS, 1) * 4)))
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+LOGIN_TRACKED_USERS = 100_000
+
+T = TypeVar("T")
+
+
+class AuthBusy(Exception):
+    """Raised when too many password operations are already queued."""
+
+
+class LoginThrottled(Exception):
+    """Raised when a username has too many recent failed logins."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("Too many failed login attempts")
+        self.retry_after = retry_after
+
+
+class _HashPool:
+    """Bounded process pool for password hashing, created per process.
+
+    Workers are started with ``forkserver`` so they are never forked from a
+    multi-threaded request worker. If a worker dies, the broken pool is
+    replaced and the operation retried once. An operation that does not
+    finish within ``AUTH_TIMEOUT`` raises :class:`AuthBusy` but keeps its
+    slot until the worker is done with it, so at most ``AUTH_MAX_PENDING``
+    operations are ever queued or running. With ``AUTH_WORKERS=0``
+    operations run on the calling thread, still bounded by
+    ``AUTH_MAX_PENDING``.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor: Optional[Executor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self._workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard(self, executor: Executor) -> None:
+        # Replace a pool whose worker died (OOM kill, crash) unless another
+        # thread already has.
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusy("Authentication is busy, try again shortly")
+
+    def _submit(self, executor: Executor, fn: Callable[..., T], args: tuple) -> Future[T]:
+        # The slot is held until the work itself finishes, not until the
+        # caller stops waiting, so a timed-out hash still counts as pending.
+        self._acquire()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _wait(self, future: Future[T]) -> T:
+        try:
+            return future.result(timeout=AUTH_TIMEOUT)
+        except FutureTimeout:
+            future.cancel()  # frees the slot if it never started
+            raise AuthBusy("Authentication timed out, try again shortly") from None
+
+    def run(self, fn: Callable[..., T], *args: Any) -> T:
+        with timed("password_hash"):
+            if self._workers <= 0:
+                self._acquire()
+                try:
+                    return fn(*args)
+                finally:
+                    self._slots.release()
+            executor = self._get_executor()
+            try:
+                return self._wait(self._submit(executor, fn, args))
+            except BrokenProcessPool:
+                self._discard(executor)
+                return self._wait(self._submit(self._get_executor(), fn, args))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            owned = self._pid == os.getpid()
+        if executor is not None and owned:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = _HashPool(AUTH_WORKERS, AUTH_MAX_PENDING)
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the configured method."""
+
+    return _pool.run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """Check a password against a stored hash.
+
+    Raises:
+        AuthBusy: The hashing pool is saturated or the check timed out.
+    """
+
+    return _pool.run(check_password_hash, password_hash, password)
+
+
+@functools.cache
+def _current_method() -> str:
+    # Expands defaults, e.g. "scrypt" -> "scrypt:32768:8:1".
+    return generate_password_hash("", method=PASSWORD_HASH_METHOD).split("$", 1)[0]
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Return True when a stored hash uses other parameters than the configured ones."""
+
+    return password_hash.split("$", 1)[0] != _current_method()
+
+
+def shutdown() -> None:
+    """Stop this process's hashing workers."""
+
+    _pool.shutdown()
+
+
+class LoginLimiter:
+    """Per-username count of recent failed logins, bounded LRU."""
+
+    def __init__(self, max_failures: int, window: float, max_users: int) -> None:
+        self.max_failures = max_failures
+        self.window = window
+        self.max_users = max_users
+        self._failures: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, username: str, now: float) -> list[float]:
+        failures = [t for t in self._failures.get(username, ()) if now - t < self.window]
+        if failures:
+            self._failures[username] = failures
+        else:
+            self._failures.pop(username, None)
+        return failures
+
+    def check(self, username: str) -> None:
+        """Raise :class:`LoginThrottled` if the username is locked out."""
+
+        if self.max_failures <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent(username, now)
+            if len(failures) >= self.max_failures:
+                raise LoginThrottled(failures[-self.max_failures] + self.window - now)
+
+    def failed(self, username: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent(username, now)
+            failures.append(now)
+            self._failures[username] = failures
+            self._failures.move_to_end(username)
+            while len(self._failures) > self.max_users:
+                self._failures.popitem(last=False)
+
+    def succeeded(self, username: str) -> None:
+        with self._lock:
+            self._failures.pop(username, None)
+
+
+login_limiter = LoginLimiter(LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW, LOGIN_TRACKED_USERS)
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Load-testing and benchmark suite for the Smart Expense Tracker API.
+
+Seeds benchmark users through the sample data generator, drives each
+endpoint with concurrent clients against a running server, and writes
+latency percentiles, throughput and database query counts to a JSON file
+that can be compared between commits.
+
+Start the server without SMTP first (budget alerts would otherwise send
+real email)::
+
+    MAIL_SUPPRESS_SEND=true python app.py
+
+Then::
+
+    python benchmark.py --users 20 --transactions 300 --months 12 --output baseline.json
+    # ... change code, restart the server ...
+    python benchmark.py --skip-seed --compare baseline.json --output current.json
+
+Query counts come from ``pg_stat_statements`` when the extension is
+installed, otherwise only transaction counts from ``pg_stat_database`` are
+reported (after waiting for idle backends to publish them, which adds about
+20 seconds per scenario). Both are database-wide, so run against a quiet
+database.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import get_connection
+from generate_sample_data import ScaleConfig, generate_users
+
+BENCH_PASSWORD = "bench-password"
+# Idle backends publish pg_stat_database counters about every 10 seconds;
+# pg_stat_statements is updated as each statement finishes.
+STATS_FLUSH_WAIT = 11
+# Seconds before a request is abandoned and counted as an error
+REQUEST_TIMEOUT = 30
+
+
+@dataclass
+class Session:
+    """A logged-in benchmark user."""
+
+    username: str
+    token: str
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """One endpoint to benchmark: builds (method, path, body) for a session."""
+
+    name: str
+    build: Callable[[Session, random.Random], tuple[str, str, Optional[dict]]]
+
+
+def _current_month() -> str:
+    return datetime.now().strftime("%Y-%m")
+
+
+SCENARIOS = [
+    Scenario(
+        "login",
+        lambda s, rng: ("POST", "/login", {"username": s.username, "password": BENCH_PASSWORD}),
+    ),
+    Scenario(
+        "create_transaction",
+        lambda s, rng: (
+            "POST",
+            "/transactions",
+            {
+                "amount": round(rng.uniform(5, 100), 2),
+                "category_id": rng.randint(1, 4),
+                "note": "benchmark",
+            },
+        ),
+    ),
+    Scenario("list_transactions", lambda s, rng: ("GET", "/transactions?limit=50", None)),
+    Scenario(
+        "budget_status", lambda s, rng: ("GET", f"/budget/status?month={_current_month()}", None)
+    ),
+    Scenario("report_monthly", lambda s, rng: ("GET", "/report/monthly", None)),
+    Scenario("report_category", lambda s, rng: ("GET", "/report/category", None)),
+    Scenario(
+        "report_dashboard",
+        lambda s, rng: ("GET", f"/report/dashboard?month={_current_month()}", None),
+    ),
+    Scenario("predict", lambda s, rng: ("GET", "/predict", None)),
+]
+
+
+def seed_users(count: int, transactions: int, months: int, seed: int) -> list[str]:
+    """
+    Create benchmark users with transactions and budgets.
+
+    Users are named ``bench_<seed>_<n>``; users that already exist are
+    reused as they are, so re-running with the same seed is cheap.
+
+    Returns:
+        Usernames of all benchmark users for this seed
+    """
+    config = ScaleConfig(transactions_per_user=transactions, months=months, seed=seed)
+    created, _ = generate_users(count, config, prefix=f"bench_{seed}", password=BENCH_PASSWORD)
+    print(f"Seeded {created} new user(s), reusing {count - created}")
+    return [f"bench_{seed}_{i}" for i in range(count)]
+
+
+def _request(base_url: str, method: str, path: str, body: Optional[dict], token: str = "") -> tuple[int, bytes]:
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def login_all(base_url: str, usernames: list[str]) -> list[Session]:
+    """Log every benchmark user in once."""
+    sessions = []
+    for username in usernames:
+        status, body = _request(
+            base_url, "POST", "/login", {"username": username, "password": BENCH_PASSWORD}
+        )
+        if status != 200:
+            raise RuntimeError(f"Login failed for {username}: {status} {body[:200]!r}")
+        sessions.append(Session(username, json.loads(body)["token"]))
+    return sessions
+
+
+@dataclass(frozen=True)
+class CounterSnapshot:
+    """One reading of the database counters; ``queries`` needs pg_stat_statements."""
+
+    xacts: int
+    queries: Optional[int]
+
+
+class DBCounters:
+    """Database-wide statement and transaction counters."""
+
+    def __init__(self) -> None:
+        self.conn = get_connection()
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            self.has_statements = cur.fetchone() is not None
+        # Statements the snapshots themselves run between two readings.
+        self.overhead = 3 if self.has_statements else 2
+
+    def _count(self, cur, sql: str) -> int:
+        cur.execute(sql)
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    def snapshot(self) -> CounterSnapshot:
+        if not self.has_statements:
+            time.sleep(STATS_FLUSH_WAIT)
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT pg_stat_clear_snapshot()")
+            xacts = self._count(
+                cur,
+                """
+                SELECT xact_commit + xact_rollback
+                FROM pg_stat_database
+                WHERE datname = current_database()
+                """,
+            )
+            calls = None
+            if self.has_statements:
+                calls = self._count(
+                    cur,
+                    """
+                    SELECT COALESCE(SUM(calls), 0)
+                    FROM pg_stat_statements
+                    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                    """,
+                )
+        return CounterSnapshot(xacts, calls)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def run_scenario(
+    base_url: str,
+    scenario: Scenario,
+    sessions: list[Session],
+    requests: int,
+    clients: int,
+    warmup: int,
+    seed: int,
+    counters: DBCounters,
+) -> dict[str, Any]:
+    """Send ``requests`` requests from ``clients`` threads and summarize them."""
+
+    def one(session: Session, rng: random.Random) -> tuple[float, bool]:
+        method, path, body = scenario.build(session, rng)
+        started = time.perf_counter()
+        try:
+            status, _ = _request(base_url, method, path, body, session.token)
+            ok = 200 <= status < 300
+        except OSError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    warm_rng = random.Random(seed)
+    for i in range(warmup):
+        one(sessions[i % len(sessions)], warm_rng)
+
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker(index: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            latency, ok = one(sessions[rng.randrange(len(sessions))], rng)
+            with lock:
+                latencies.append(latency)
+                errors += not ok
+
+    before = counters.snapshot()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(worker, range(clients)))
+    elapsed = time.perf_counter() - started
+    after = counters.snapshot()
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "db_xacts_per_request": round(
+            (after.xacts - before.xacts - counters.overhead) / len(latencies), 2
+        ),
+        "db_queries_per_request": None,
+    }
+    if before.queries is not None and after.queries is not None:
+        result["db_queries_per_request"] = round(
+            (after.queries - before.queries - counters.overhead) / len(latencies), 2
+        )
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict[str, dict[str, Any]]) -> None:
+    print(f"\n{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}{'db q/req':>10}")
+    for name, r in results.items():
+        queries = "-" if r["db_queries_per_request"] is None else r["db_queries_per_request"]
+        print(
+            f"{name:<20}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+            f"{r['throughput_rps']:>10}{r['errors']:>8}{queries:>10}"
+        )
+
+
+def compare(results: dict[str, dict[str, Any]], baseline: dict[str, Any], max_regression: Optional[float]) -> bool:
+    """
+    Print changes against a baseline file's scenarios.
+
+    Returns:
+        False if any p95 rose, or throughput fell, by more than ``max_regression`` percent
+    """
+
+    def change(new: float, old: float) -> float:
+        return (new - old) / old * 100 if old else 0.0
+
+    ok = True
+    print(f"\nCompared with {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    print(f"{'scenario':<20}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}")
+    for name, r in results.items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            print(f"{name:<20}{'(new)':>10}")
+            continue
+        deltas = [
+            change(r["p50_ms"], old["p50_ms"]),
+            change(r["p95_ms"], old["p95_ms"]),
+            change(r["p99_ms"], old["p99_ms"]),
+            change(r["throughput_rps"], old["throughput_rps"]),
+        ]
+        print(f"{name:<20}" + "".join(f"{d:>+9.1f}%" for d in deltas))
+        if max_regression is not None and (deltas[1] > max_regression or -deltas[3] > max_regression):
+            ok = False
+    return ok
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the expense tracker API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5050")
+    parser.add_argument("--users", type=int, default=10, help="benchmark users to seed and use")
+    parser.add_argument("--transactions", type=int, default=200, help="transactions per seeded user")
+    parser.add_argument("--months", type=int, default=6, help="months of history per seeded user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse existing benchmark users")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(s.name for s in SCENARIOS),
+        help="comma-separated scenarios to run",
+    )
+    parser.add_argument("--output", default="benchmark.json", help="where to write results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        help="with --compare, exit 1 if p95 or throughput regress by more than this percent",
+    )
+    args = parser.parse_args(argv)
+
+    by_name = {s.name: s for s in SCENARIOS}
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in by_name]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    print("📊 Smart Expense Tracker - Benchmark")
+    print("=" * 50)
+    if args.skip_seed:
+        usernames = [f"bench_{args.seed}_{i}" for i in range(args.users)]
+    else:
+        usernames = seed_users(args.users, args.transactions, args.months, args.seed)
+    sessions = login_all(args.base_url, usernames)
+
+    counters = DBCounters()
+    results = {}
+    try:
+        for name in selected:
+            print(f"Running {name} ...")
+            results[name] = run_scenario(
+                args.base_url,
+                by_name[name],
+                sessions,
+                args.requests,
+                args.clients,
+                args.warmup,
+                args.seed,
+                counters,
+            )
+    finally:
+        counters.close()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "base_url": args.base_url,
+            "users": args.users,
+            "transactions_per_user": args.transactions,
+            "months": args.months,
+            "clients": args.clients,
+            "requests_per_scenario": args.requests,
+            "seed": args.seed,
+            "db_query_source": "pg_stat_statements" if counters.has_statements else None,
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+    print_results(results)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if not compare(results, baseline, args.max_regression):
+            print("❌ Performance regressed beyond --max-regression")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""Per-user response cache for read-only report endpoints.
+
+Cached responses are keyed by user, the user's data version, path and query
+string. Writes (new transactions, budgets) bump the user's version, so
+entries computed before the write are never served again; ``REPORT_CACHE_TTL``
+bounds staleness for changes made outside the API. Responses carry an ETag,
+and a matching ``If-None-Match`` returns 304 without touching the database.
+
+Backends, selected with ``REPORT_CACHE_BACKEND``:
+
+* ``memory`` (default): in-process LRU with TTL. Versions are per process,
+  so use it only with a single app process.
+* ``sqlite``: a local SQLite file (``REPORT_CACHE_PATH``) shared by every
+  process on the host, for multi-worker deployments.
+* ``off``: no caching.
+"""
+
+import functools
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Optional, Protocol
+
+from flask import Response, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "300"))
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "4096"))
+REPORT_CACHE_PATH = os.getenv(
+    "REPORT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "expense_report_cache.sqlite3")
+)
+
+# A cached response: (ETag, body, mimetype).
+CachedResponse = tuple[str, bytes, str]
+
+
+class CacheBackend(Protocol):
+    """Storage for cached responses and per-user data versions."""
+
+    def get(self, key: str) -> Optional[CachedResponse]: ...
+
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None: ...
+
+    def get_version(self, user_id: int) -> int: ...
+
+    def bump_version(self, user_id: int) -> None: ...
+
+    def stats(self) -> dict[str, int]: ...
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump_version(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteCache:
+    """Cache shared by all processes on a host through a SQLite file.
+
+    Each thread uses its own connection; WAL mode lets readers proceed while
+    another process writes.
+    """
+
+    _PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body BLOB NOT NULL,
+                mimetype TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_expires_at ON responses (expires_at);
+            CREATE TABLE IF NOT EXISTS versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self._conn().execute(
+            "SELECT etag, body, mimetype FROM responses WHERE key = ? AND expires_at >= ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], bytes(row[1]), row[2]
+
+    def set(self, key: str, value: CachedResponse, ttl: float) -> None:
+        if self.max_entries <= 0:
+            return
+        conn = self._conn()
+        etag, body, mimetype = value
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, etag, body, mimetype, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, etag, body, mimetype, time.time() + ttl),
+        )
+        self._sets += 1
+        if self._sets % self._PRUNE_EVERY == 0:
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Drop expired entries, then the soonest-expiring beyond the bound."""
+
+        conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def get_version(self, user_id: int) -> int:
+        row = self._conn().execute(
+            "SELECT version FROM versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, user_id: int) -> None:
+        self._conn().execute(
+            "INSERT INTO versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
+
+    def stats(self) -> dict[str, int]:
+        (entries,) = self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[CacheBackend] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[CacheBackend]:
+    """Return the configured backend (None when caching is off), per process."""
+
+    global _cache, _cache_pid
+    if REPORT_CACHE_BACKEND == "off":
+        return None
+    pid = os.getpid()
+    if _cache is not None and _cache_pid == pid:
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            if REPORT_CACHE_BACKEND == "sqlite":
+                _cache = SQLiteCache(REPORT_CACHE_PATH, REPORT_CACHE_MAX_ENTRIES)
+            elif REPORT_CACHE_BACKEND == "memory":
+                _cache = MemoryCache(REPORT_CACHE_MAX_ENTRIES)
+            else:
+                raise ValueError(f"Unknown REPORT_CACHE_BACKEND: {REPORT_CACHE_BACKEND!r}")
+            _cache_pid = pid
+        return _cache
+
+
+def invalidate_user(user_id: int) -> None:
+    """Bump a user's data version so their cached responses are not reused.
+
+    Call after the write has committed.
+    """
+
+    cache = get_cache()
+    if cache is not None:
+        cache.bump_version(user_id)
+
+
+def data_version(user_id: int) -> Optional[int]:
+    """Return the user's data version, or None when caching is off.
+
+    Derived results may be memoized under this version; None means nothing
+    should be memoized. The version follows the same rule as cached
+    responses: with ``memory`` it only sees writes made by this process, so
+    that backend is valid only with a single app process.
+    """
+
+    cache = get_cache()
+    return cache.get_version(user_id) if cache is not None else None
+
+
+def cache_stats() -> dict[str, int]:
+    """Return response cache counters for monitoring."""
+
+    cache = get_cache()
+    return cache.stats() if cache is not None else {}
+
+
+def shared_cache() -> Optional[CacheBackend]:
+    """Return the backend if every process on the host sees the same data.
+
+    Processes that only read (the ASGI app) never see invalidations made by
+    another process's in-memory backend, so they cache only with ``sqlite``.
+    """
+
+    return get_cache() if REPORT_CACHE_BACKEND == "sqlite" else None
+
+
+def response_key(
+    cache: CacheBackend, user_id: int, path: str, args: Iterable[tuple[str, str]]
+) -> str:
+    """Key for a user's response under their current data version."""
+
+    query = "&".join(f"{k}={v}" for k, v in sorted(args))
+    return f"{user_id}:{cache.get_version(user_id)}:{path}?{query}"
+
+
+def store_response(cache: CacheBackend, key: str, body: bytes, mimetype: str) -> str:
+    """Cache a response body and return its ETag."""
+
+    etag = hashlib.sha1(body).hexdigest()
+    cache.set(key, (etag, body, mimetype), REPORT_CACHE_TTL)
+    return etag
+
+
+def _etag_matches(etag: str) -> bool:
+    return etag in request.if_none_match or "*" in request.if_none_match
+
+
+def _from_cache(etag: str, body: bytes, mimetype: str) -> Response:
+    if _etag_matches(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    return response
+
+
+def cached_report(view: Callable) -> Callable:
+    """Cache a JWT-protected GET view's successful responses per user.
+
+    Apply below ``@jwt_required()`` so the identity is available. Only 200
+    responses are stored; errors always reach the view.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_cache()
+        if cache is None:
+            return view(*args, **kwargs)
+
+        user_id = int(get_jwt_identity())
+        key = response_key(cache, user_id, request.path, request.args.items(multi=True))
+        cached = cache.get(key)
+        if cached is not None:
+            response = _from_cache(*cached)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            mimetype = response.mimetype or "application/json"
+            etag = store_response(cache, key, body, mimetype)
+            response = _from_cache(etag, body, mimetype)
+        # Let browsers keep the body but revalidate with If-None-Match.
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return wrapper
@@ -1,9 +1,18 @@
 """Database connection configuration and helpers."""
 
+from collections.abc import Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 import os
+import threading
+import time
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extensions import connection as PGConnection
+from psycopg2.extensions import cursor as PGCursor
+
+import metrics
 
 
 @dataclass(frozen=True)
@@ -17,6 +26,18 @@ class DBConfig:
     port: int
 
 
+@dataclass(frozen=True)
+class PoolConfig:
+    """Represent connection pool sizing and recycling settings."""
+
+    min_size: int
+    max_size: int
+    timeout: float
+    max_uses: int
+    max_age: float
+    ping_after: float
+
+
 def load_config() -> DBConfig:
     """Load configuration from environment variables."""
 
@@ -29,29 +50,325 @@ def load_config() -> DBConfig:
     )
 
 
-def get_connection() -> PGConnection:
-    """Create a new psycopg2 connection."""
+def load_pool_config() -> PoolConfig:
+    """Load pool settings from environment variables."""
+
+    return PoolConfig(
+        min_size=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+        max_size=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+        timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")),
+        max_uses=int(os.getenv("POSTGRES_POOL_MAX_USES", "5000")),
+        max_age=float(os.getenv("POSTGRES_POOL_MAX_AGE", "1800")),
+        ping_after=float(os.getenv("POSTGRES_POOL_PING_AFTER", "30")),
+    )
+
+
+class TimedCursor(PGCursor):
+    """Cursor that reports every statement's duration to :mod:`metrics`.
 
-    config = load_config()
-    return psycopg2.connect(
+    The query template is recorded rather than the bound statement, so
+    parameter values never reach metrics or logs.
+    """
+
+    def _record(self, query, started: float) -> None:
+        if not isinstance(query, (str, bytes)):
+            query = query.as_string(self)
+        metrics.record_query(query, time.perf_counter() - started)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, started)
+
+
+def _connect(config: DBConfig) -> PGConnection:
+    """Open a psycopg2 connection for the given settings."""
+
+    conn = psycopg2.connect(
         dbname=config.dbname,
         user=config.user,
         password=config.password,
         host=config.host,
         port=config.port,
+        cursor_factory=TimedCursor,
     )
+    metrics.record_connection_opened()
+    return conn
+
+
+def get_connection() -> PGConnection:
+    """Create a new, unpooled psycopg2 connection.
+
+    Request handlers should use :func:`connection` instead; this is kept for
+    one-off scripts that hold a single connection for their whole run.
+    """
+
+    return _connect(load_config())
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class PoolClosed(Exception):
+    """Raised when checking out from a pool that has been closed."""
+
+
+@dataclass
+class _PooledConnection:
+    """Bookkeeping for a connection owned by the pool."""
+
+    conn: PGConnection
+    created_at: float
+    last_used: float
+    uses: int = 0
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool.
+
+    Idle connections are reused LIFO so the warmest connection is handed out
+    first. A connection is health-checked on checkout (closed or broken
+    connections, and idle ones past ``ping_after`` that fail ``SELECT 1``, are
+    replaced) and recycled once it exceeds ``max_uses`` checkouts or
+    ``max_age`` seconds.
+    """
+
+    def __init__(self, config: DBConfig, pool_config: PoolConfig) -> None:
+        self._config = config
+        self._pool_config = pool_config
+        self._idle: list[_PooledConnection] = []
+        self._in_use: dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(min(pool_config.min_size, pool_config.max_size)):
+            self._idle.append(self._open())
+            self._size += 1
+
+    @property
+    def size(self) -> int:
+        """Number of connections currently owned by the pool."""
+
+        return self._size
+
+    @property
+    def in_use(self) -> int:
+        """Number of connections currently checked out."""
+
+        return len(self._in_use)
+
+    def _open(self) -> _PooledConnection:
+        now = time.monotonic()
+        return _PooledConnection(conn=_connect(self._config), created_at=now, last_used=now)
+
+    def _expired(self, entry: _PooledConnection, now: float) -> bool:
+        """Return True when a connection should be recycled."""
+
+        if entry.conn.closed:
+            return True
+        max_uses = self._pool_config.max_uses
+        if max_uses and entry.uses >= max_uses:
+            return True
+        max_age = self._pool_config.max_age
+        return bool(max_age) and now - entry.created_at >= max_age
+
+    def _healthy(self, entry: _PooledConnection, now: float) -> bool:
+        """Ping connections that have been idle long enough to have gone stale."""
+
+        if now - entry.last_used < self._pool_config.ping_after:
+            return True
+        try:
+            with entry.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            entry.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, entry: _PooledConnection) -> None:
+        try:
+            entry.conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self) -> PGConnection:
+        """Check out a connection, waiting up to the configured timeout."""
+
+        started = time.monotonic()
+        deadline = started + self._pool_config.timeout
+        while True:
+            entry: _PooledConnection | None = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosed("Connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self._pool_config.max_size:
+                        # Reserve the slot now, connect outside the lock.
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection available within {self._pool_config.timeout}s"
+                        )
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(entry, now) or not self._healthy(entry, now):
+                    self._discard(entry)
+                    continue
+
+            entry.uses += 1
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+            metrics.record_checkout(time.monotonic() - started)
+            return entry.conn
+
+    def putconn(self, conn: PGConnection, discard: bool = False) -> None:
+        """Return a connection to the pool, resetting any open transaction."""
+
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            conn.close()
+            return
+
+        if not discard and not conn.closed:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        now = time.monotonic()
+        if discard or self._closed or self._expired(entry, now):
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[PGConnection]:
+        """Context manager that checks a connection out and always returns it."""
+
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self) -> None:
+        """Close idle connections and refuse further checkouts."""
+
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+
+_pool: ConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it on first use.
+
+    The pool is keyed to the current PID so a forked worker never shares the
+    parent's sockets; it simply builds its own pool on first checkout.
+    """
+
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(load_config(), load_pool_config())
+            _pool_pid = pid
+        return _pool
+
+
+def close_pool() -> None:
+    """Close the process-wide pool (used on shutdown)."""
+
+    global _pool, _pool_pid
+    with _pool_lock:
+        pool, _pool, _pool_pid = _pool, None, None
+    if pool is not None:
+        pool.close()
+
+
+def connection():
+    """Check out a pooled connection as a context manager.
+
+    Usage::
+
+        with connection() as conn:
+            with conn, conn.cursor() as cur:
+                ...
+    """
+
+    return get_pool().connection()
+
+
+def month_bounds(month: str) -> tuple[date, date]:
+    """Return the first day of a YYYY-MM month and of the month after it.
+
+    Filtering on ``tx_date >= start AND tx_date < end`` keeps month predicates
+    sargable so the ``(user_id, ...)`` transaction indexes can be used.
+    """
+
+    start = datetime.strptime(month, "%Y-%m").date()
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
 
 
 def db_time() -> str:
     """Fetch current timestamp from the database."""
 
-    conn: PGConnection | None = None
-    try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT NOW()")
-            row = cur.fetchone()
-            return str(row[0]) if row else "unknown"
-    finally:
-        if conn is not None:
-            conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT NOW()")
+        row = cur.fetchone()
+        return str(row[0]) if row else "unknown"
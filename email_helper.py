@@ -6,6 +6,8 @@ from typing import Optional
 from flask import Flask
 from flask_mail import Mail, Message
 
+from metrics import timed
+
 mail = Mail()
 
 
@@ -17,19 +19,23 @@ def init_mail(app: Flask) -> None:
     app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME", "")
     app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD", "")
     app.config["MAIL_DEFAULT_SENDER"] = os.getenv("MAIL_DEFAULT_SENDER", app.config["MAIL_USERNAME"])
+    # Skip SMTP entirely (e.g. for benchmarks); Flask-Mail defaults to app.testing
+    suppress_send = os.getenv("MAIL_SUPPRESS_SEND")
+    if suppress_send is not None:
+        app.config["MAIL_SUPPRESS_SEND"] = suppress_send.lower() == "true"
     mail.init_app(app)
 
 
-def send_budget_alert(
+def build_budget_alert(
     recipient_email: str,
     category_name: str,
     limit_amount: float,
     spent: float,
     used_percent: float,
     month: str,
-) -> bool:
+) -> Message:
     """
-    Send budget alert email when usage exceeds 90%.
+    Build the budget alert email for one category.
 
     Args:
         recipient_email: User's email address
@@ -40,14 +46,10 @@ def send_budget_alert(
         month: Month string (YYYY-MM)
 
     Returns:
-        True if email sent successfully, False otherwise
+        The unsent message
     """
-    if not recipient_email:
-        return False
-
-    try:
-        subject = f"Budget Alert: {category_name} - {used_percent:.1f}% Used"
-        body = f"""
+    subject = f"Budget Alert: {category_name} - {used_percent:.1f}% Used"
+    body = f"""
 Hello,
 
 Your budget for {category_name} in {month} has reached {used_percent:.1f}% usage.
@@ -62,30 +64,70 @@ Please review your spending to stay within budget.
 
 Best regards,
 Smart Expense Tracker
-        """.strip()
+    """.strip()
+    return Message(subject=subject, recipients=[recipient_email], body=body)
+
+
+def send_budget_alert(
+    recipient_email: str,
+    category_name: str,
+    limit_amount: float,
+    spent: float,
+    used_percent: float,
+    month: str,
+) -> bool:
+    """
+    Send a single budget alert email.
+
+    Args:
+        recipient_email: User's email address
+        category_name: Category name
+        limit_amount: Budget limit
+        spent: Amount spent
+        used_percent: Usage percentage
+        month: Month string (YYYY-MM)
 
-        msg = Message(subject=subject, recipients=[recipient_email], body=body)
-        mail.send(msg)
-        return True
+    Returns:
+        True if email sent successfully, False otherwise
+    """
+    if not recipient_email:
+        return False
+    msg = build_budget_alert(recipient_email, category_name, limit_amount, spent, used_percent, month)
+    return send_messages([msg])[0]
+
+
+def send_messages(messages: list[Message]) -> list[bool]:
+    """
+    Send several emails over one SMTP connection.
+
+    Args:
+        messages: Messages to send
+
+    Returns:
+        One success flag per message, in order
+    """
+    results = [False] * len(messages)
+    if not messages:
+        return results
+    try:
+        with timed("smtp"), mail.connect() as conn:
+            for i, msg in enumerate(messages):
+                try:
+                    conn.send(msg)
+                    results[i] = True
+                except Exception as e:
+                    print(f"Failed to send email: {e}")
     except Exception as e:
         print(f"Failed to send email: {e}")
-        return False
+    return results
 
 
 def get_user_email(user_id: int) -> Optional[str]:
     """Get user's email address from database."""
-    from db import get_connection
+    import queries
 
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT email FROM users WHERE user_id = %s", (user_id,))
-            row = cur.fetchone()
-            return row[0] if row else None
+        return queries.user_email(user_id)
     except Exception:
         return None
-    finally:
-        if conn is not None:
-            conn.close()
 
@@ -0,0 +1,237 @@
+"""Precompute forecasts for every user into the ``forecasts`` table.
+
+Monthly totals for all users are streamed from the rollup table with one
+server-side cursor, ordered by user. Users are processed in chunks: each
+chunk becomes one ``(users x months)`` matrix, left-padded and masked for
+users with shorter histories, that every model fits in a single vectorized
+call. Results are bulk-upserted per chunk, so memory stays bounded by the
+chunk size however many users there are::
+
+    python forecast_batch.py [--models linear,ses] [--horizon 12] [--chunk-users 10000]
+
+Run it nightly (e.g. from cron). ``/predict`` serves a stored row only while
+the user's rollup rows still have the newest update time, row count and
+transaction count the forecast was computed from, and fits live otherwise.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from collections.abc import Iterator
+from datetime import datetime
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db import connection
+from forecasting import MODELS, fit, history_months, month_from_number, month_number
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON = 12
+DEFAULT_COVERAGE = 0.95
+DEFAULT_CHUNK_USERS = 10000
+FETCH_SIZE = 20000
+
+
+class _Chunk:
+    """Columnar (user, month, total) rows for a run of complete users."""
+
+    def __init__(self) -> None:
+        self.user_ids: list[int] = []
+        self.months: list[int] = []
+        self.totals: list[float] = []
+        self.updated_at: dict[int, datetime] = {}
+        self.source_rows: dict[int, int] = {}
+        self.source_tx_count: dict[int, int] = {}
+
+    def add(
+        self, user_id: int, month_start, total, updated_at: datetime, rows: int, tx_count: int
+    ) -> None:
+        self.user_ids.append(user_id)
+        self.months.append(month_number(month_start))
+        self.totals.append(float(total))
+        previous = self.updated_at.get(user_id)
+        if previous is None or updated_at > previous:
+            self.updated_at[user_id] = updated_at
+        self.source_rows[user_id] = self.source_rows.get(user_id, 0) + rows
+        self.source_tx_count[user_id] = self.source_tx_count.get(user_id, 0) + tx_count
+
+    def __len__(self) -> int:
+        return len(self.updated_at)
+
+
+def _stream_chunks(chunk_users: int) -> Iterator[_Chunk]:
+    """Yield chunks of at most ``chunk_users`` users, never splitting a user."""
+
+    with connection() as conn:
+        with conn:
+            with conn.cursor(name="forecast_batch_totals") as cur:
+                cur.itersize = FETCH_SIZE
+                # Follows the rollup primary key, so no sort is needed.
+                cur.execute(
+                    """
+                    SELECT
+                        user_id, month_start, SUM(total), MAX(updated_at),
+                        COUNT(*), SUM(tx_count)
+                    FROM user_month_category_totals
+                    GROUP BY user_id, month_start
+                    ORDER BY user_id, month_start;
+                    """
+                )
+                chunk = _Chunk()
+                current_user = None
+                for user_id, month_start, total, updated_at, rows, tx_count in cur:
+                    if user_id != current_user:
+                        if len(chunk) >= chunk_users:
+                            yield chunk
+                            chunk = _Chunk()
+                        current_user = user_id
+                    chunk.add(user_id, month_start, total, updated_at, rows, tx_count)
+                if len(chunk):
+                    yield chunk
+
+
+def _stack(
+    chunk: _Chunk, months: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Scatter a chunk into a right-aligned ``(users x months)`` matrix.
+
+    Column ``months - 1`` is each user's latest month. Cells before a user's
+    first month are masked out; months without rows after it are zero.
+
+    Returns:
+        ``(user_ids, first_month_numbers, last_month_numbers, values, mask)``.
+    """
+
+    user_ids, row_user = np.unique(np.asarray(chunk.user_ids), return_inverse=True)
+    month_numbers = np.asarray(chunk.months, dtype=np.int64)
+    n_users = len(user_ids)
+    last = np.full(n_users, np.iinfo(np.int64).min)
+    np.maximum.at(last, row_user, month_numbers)
+    first = np.full(n_users, np.iinfo(np.int64).max)
+    np.minimum.at(first, row_user, month_numbers)
+    first = np.maximum(first, last - months + 1)
+
+    column = months - 1 - (last[row_user] - month_numbers)
+    keep = column >= 0
+    values = np.zeros((n_users, months))
+    np.add.at(values, (row_user[keep], column[keep]), np.asarray(chunk.totals)[keep])
+    mask = np.arange(months) >= (months - (last - first + 1))[:, None]
+    return user_ids, first, last, values, mask
+
+
+def _write(rows: list[tuple]) -> None:
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO forecasts (
+                    user_id, model, coverage, first_month, n_months,
+                    point, lower_bound, upper_bound,
+                    source_updated_at, source_rows, source_tx_count
+                )
+                VALUES %s
+                ON CONFLICT (user_id, model) DO UPDATE SET
+                    coverage = EXCLUDED.coverage,
+                    first_month = EXCLUDED.first_month,
+                    n_months = EXCLUDED.n_months,
+                    point = EXCLUDED.point,
+                    lower_bound = EXCLUDED.lower_bound,
+                    upper_bound = EXCLUDED.upper_bound,
+                    source_updated_at = EXCLUDED.source_updated_at,
+                    source_rows = EXCLUDED.source_rows,
+                    source_tx_count = EXCLUDED.source_tx_count,
+                    computed_at = NOW()
+                """,
+                rows,
+                page_size=1000,
+            )
+
+
+def run(
+    models: list[str],
+    horizon: int = DEFAULT_HORIZON,
+    coverage: float = DEFAULT_COVERAGE,
+    chunk_users: int = DEFAULT_CHUNK_USERS,
+) -> int:
+    """Forecast every user with each model and store the results.
+
+    Returns:
+        Number of users processed.
+    """
+
+    # Fit on the longest history once per chunk; shorter models take the
+    # trailing columns of the same matrix.
+    longest = max(history_months(model) for model in models)
+    processed = 0
+    for chunk in _stream_chunks(chunk_users):
+        started = time.perf_counter()
+        user_ids, first, last, values, mask = _stack(chunk, longest)
+        rows = []
+        for model in models:
+            months = history_months(model)
+            model_first = np.maximum(first, last - months + 1)
+            forecast = fit(model, values[:, -months:], mask[:, -months:]).forecast(
+                horizon, coverage
+            )
+            point = forecast.point.round(2).tolist()
+            lower = forecast.lower.round(2).tolist()
+            upper = forecast.upper.round(2).tolist()
+            for i, user_id in enumerate(user_ids.tolist()):
+                rows.append(
+                    (
+                        user_id,
+                        model,
+                        coverage,
+                        month_from_number(int(model_first[i])),
+                        int(last[i] - model_first[i] + 1),
+                        point[i],
+                        lower[i],
+                        upper[i],
+                        chunk.updated_at[user_id],
+                        chunk.source_rows[user_id],
+                        chunk.source_tx_count[user_id],
+                    )
+                )
+        _write(rows)
+        processed += len(user_ids)
+        logger.info(
+            "Forecast %d users (%d total) in %.2fs",
+            len(user_ids),
+            processed,
+            time.perf_counter() - started,
+        )
+    return processed
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point."""
+
+    parser = argparse.ArgumentParser(description="Precompute forecasts for all users.")
+    parser.add_argument(
+        "--models",
+        default=",".join(MODELS),
+        help=f"comma-separated models to run (default: {','.join(MODELS)})",
+    )
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--coverage", type=float, default=DEFAULT_COVERAGE)
+    parser.add_argument("--chunk-users", type=int, default=DEFAULT_CHUNK_USERS)
+    args = parser.parse_args(argv)
+
+    models = [model.strip() for model in args.models.split(",") if model.strip()]
+    unknown = sorted(set(models) - set(MODELS))
+    if unknown or not models:
+        parser.error(f"unknown model(s): {', '.join(unknown) or '(none)'}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    started = time.perf_counter()
+    processed = run(models, args.horizon, args.coverage, args.chunk_users)
+    print(f"✅ Forecast {processed} user(s) in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""Vectorized monthly expense forecasting.
+
+Every model fits many series at once. Input is a ``(n_series, n_months)``
+matrix with one row per series (a category, a user's total, or one user per
+row in batch jobs) and one column per calendar month, oldest first, plus an
+optional boolean mask of the same shape marking observed cells. Masked-out
+cells are left padding before a series starts, so rows of different length
+can be stacked; months with no transactions inside a series are real zeros,
+not gaps.
+
+Models:
+
+* ``linear``: least-squares trend line (the original ``/predict`` model).
+* ``ses``: simple exponential smoothing, alpha picked per series from a grid
+  by one-step-ahead squared error.
+* ``seasonal_naive``: the value twelve months earlier, or the last value
+  while a series has less than a year of history.
+
+Fitting returns a :class:`FittedModel` whose parameters are enough to
+forecast any horizon without the original data, so they can be cached or
+stored.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from dataclasses import dataclass
+from datetime import date
+from statistics import NormalDist
+from typing import Any, Optional
+
+import numpy as np
+
+MODELS = ("linear", "ses", "seasonal_naive")
+LINEAR_WINDOW = 6  # months behind the linear trend (the original /predict window)
+HISTORY_MONTHS = 36  # months behind the other models
+SEASON_LENGTH = 12
+SES_ALPHAS = np.linspace(0.1, 0.9, 9)
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class Forecast:
+    """Point forecasts and prediction interval bounds, ``(n_series, horizon)``."""
+
+    point: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+
+@dataclass(frozen=True)
+class FittedModel:
+    """Per-series parameters of a fitted model."""
+
+    model: str
+    params: dict[str, np.ndarray]
+
+    def forecast(self, horizon: int = 1, interval: float = 0.95) -> Forecast:
+        """Forecast ``horizon`` months past the last column.
+
+        Args:
+            horizon: Number of months ahead.
+            interval: Coverage of the prediction interval (e.g. 0.95).
+
+        Returns:
+            Forecasts clamped at zero, since spending cannot be negative.
+        """
+
+        steps = np.arange(1, horizon + 1, dtype=float)
+        p = self.params
+        if self.model == "linear":
+            x0 = p["last_x"][:, None] + steps
+            point = p["intercept"][:, None] + p["slope"][:, None] * x0
+            leverage = np.divide(
+                (x0 - p["x_mean"][:, None]) ** 2,
+                p["sxx"][:, None],
+                out=np.zeros_like(x0),
+                where=p["sxx"][:, None] > 0,
+            )
+            n = np.maximum(p["n"], 1)[:, None]
+            scale = np.sqrt(1 + 1 / n + leverage)
+        elif self.model == "ses":
+            point = np.repeat(p["level"][:, None], horizon, axis=1)
+            scale = np.sqrt(1 + (steps - 1) * p["alpha"][:, None] ** 2)
+        elif self.model == "seasonal_naive":
+            season = p["season"][:, (steps.astype(int) - 1) % SEASON_LENGTH]
+            seasonal = p["has_season"][:, None]
+            point = np.where(seasonal, season, p["last"][:, None])
+            period = np.where(seasonal, SEASON_LENGTH, 1)
+            scale = np.sqrt(np.floor((steps - 1) / period) + 1)
+        else:
+            raise ValueError(f"Unknown forecast model: {self.model!r}")
+
+        half_width = _z(interval) * p["sigma"][:, None] * scale
+        return Forecast(
+            point=np.maximum(point, 0.0),
+            lower=np.maximum(point - half_width, 0.0),
+            upper=np.maximum(point + half_width, 0.0),
+        )
+
+
+def history_months(model: str) -> int:
+    """Number of trailing months a model is fitted on."""
+
+    return LINEAR_WINDOW if model == "linear" else HISTORY_MONTHS
+
+
+def _z(interval: float) -> float:
+    return NormalDist().inv_cdf(0.5 + interval / 2)
+
+
+def fit(model: str, values: np.ndarray, mask: Optional[np.ndarray] = None) -> FittedModel:
+    """Fit ``model`` to every row of ``values``.
+
+    Args:
+        model: One of :data:`MODELS`.
+        values: ``(n_series, n_months)`` monthly totals, oldest first.
+        mask: Observed cells; all observed when None. Only left padding
+            may be masked.
+
+    Returns:
+        The fitted per-series parameters.
+    """
+
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[None, :]
+    mask = np.ones(values.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+    values = np.where(mask, values, 0.0)
+    if model == "linear":
+        return FittedModel(model, _fit_linear(values, mask))
+    if model == "ses":
+        return FittedModel(model, _fit_ses(values, mask))
+    if model == "seasonal_naive":
+        return FittedModel(model, _fit_seasonal_naive(values, mask))
+    raise ValueError(f"Unknown forecast model: {model!r}")
+
+
+def _fit_linear(values: np.ndarray, mask: np.ndarray) -> dict[str, np.ndarray]:
+    """Closed-form least squares per row over the observed cells."""
+
+    weights = mask.astype(float)
+    x = np.arange(values.shape[1], dtype=float)
+    n = weights.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    x_mean = (weights * x).sum(axis=1) / safe_n
+    y_mean = (weights * values).sum(axis=1) / safe_n
+    dx = (x - x_mean[:, None]) * weights
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * (values - y_mean[:, None])).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    intercept = y_mean - slope * x_mean
+    residuals = (values - (intercept[:, None] + slope[:, None] * x)) * weights
+    dof = n - 2
+    sigma = np.sqrt(
+        np.divide((residuals**2).sum(axis=1), dof, out=np.zeros_like(n), where=dof > 0)
+    )
+    return {
+        "slope": slope,
+        "intercept": intercept,
+        "sigma": sigma,
+        "n": n,
+        "x_mean": x_mean,
+        "sxx": sxx,
+        "last_x": np.full(values.shape[0], values.shape[1] - 1, dtype=float),
+    }
+
+
+def _fit_ses(values: np.ndarray, mask: np.ndarray) -> dict[str, np.ndarray]:
+    """Run every candidate alpha for every row in one pass over the months."""
+
+    n_series, n_months = values.shape
+    alphas = SES_ALPHAS[None, :]
+    level = np.zeros((n_series, alphas.shape[1]))
+    sse = np.zeros_like(level)
+    errors = np.zeros(n_series)
+    started = np.zeros(n_series, dtype=bool)
+    for t in range(n_months):
+        y = values[:, t : t + 1]
+        observed = mask[:, t]
+        update = (observed & started)[:, None]
+        error = y - level
+        sse += np.where(update, error**2, 0.0)
+        errors += update[:, 0]
+        level = np.where(update, level + alphas * error, level)
+        level = np.where((observed & ~started)[:, None], y, level)
+        started |= observed
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(n_series)
+    return {
+        "alpha": SES_ALPHAS[best],
+        "level": level[rows, best],
+        "sigma": np.sqrt(sse[rows, best] / np.maximum(errors, 1)),
+    }
+
+
+def _fit_seasonal_naive(values: np.ndarray, mask: np.ndarray) -> dict[str, np.ndarray]:
+    """Keep the last season per row; rows under a year fall back to naive."""
+
+    n_series, n_months = values.shape
+    last = values[:, -1] if n_months else np.zeros(n_series)
+    if n_months >= SEASON_LENGTH:
+        season = values[:, -SEASON_LENGTH:]
+        has_season = mask[:, -SEASON_LENGTH]
+    else:
+        season = np.repeat(last[:, None], SEASON_LENGTH, axis=1)
+        has_season = np.zeros(n_series, dtype=bool)
+
+    def rms_diff(lag: int) -> np.ndarray:
+        if n_months <= lag:
+            return np.zeros(n_series)
+        observed = mask[:, lag:] & mask[:, :-lag]
+        diff = np.where(observed, values[:, lag:] - values[:, :-lag], 0.0)
+        count = observed.sum(axis=1)
+        return np.sqrt((diff**2).sum(axis=1) / np.maximum(count, 1))
+
+    sigma = np.where(has_season, rms_diff(SEASON_LENGTH), rms_diff(1))
+    return {"season": season, "has_season": has_season, "last": last, "sigma": sigma}
+
+
+def month_number(month_start: date) -> int:
+    """Months since year 0, so consecutive months differ by one."""
+
+    return month_start.year * 12 + month_start.month - 1
+
+
+def month_from_number(number: int) -> date:
+    """Inverse of :func:`month_number`."""
+
+    return date(number // 12, number % 12 + 1, 1)
+
+
+def monthly_matrix(
+    month_starts: Sequence[date],
+    series_index: Sequence[int],
+    amounts: Sequence[Any],
+    n_series: int,
+    months: int,
+    first_month: Optional[date] = None,
+) -> tuple[int, np.ndarray]:
+    """Scatter (month, series, amount) rows into a dense matrix.
+
+    The matrix covers at most ``months`` calendar months ending at the latest
+    month present, starting no earlier than ``first_month`` (the start of the
+    history, which may predate the rows passed in; defaults to the earliest
+    row). Earlier rows are dropped and months without rows are 0.
+
+    Returns:
+        ``(first_month_number, matrix)``; the matrix is all-zero with no
+        columns when there are no rows.
+    """
+
+    if not month_starts:
+        return 0, np.zeros((n_series, 0))
+    numbers = np.fromiter((month_number(m) for m in month_starts), dtype=np.int64)
+    last = int(numbers.max())
+    start = month_number(first_month) if first_month is not None else int(numbers.min())
+    first = max(start, last - months + 1)
+    keep = numbers >= first
+    matrix = np.zeros((n_series, last - first + 1))
+    np.add.at(
+        matrix,
+        (np.asarray(series_index)[keep], numbers[keep] - first),
+        np.asarray(amounts, dtype=float)[keep],
+    )
+    return first, matrix
+
+
+class FittedModelCache:
+    """Thread-safe bounded LRU of fitted models."""
+
+    def __init__(self, max_size: int = FORECAST_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
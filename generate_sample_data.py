@@ -2,73 +2,104 @@
 """
 Sample data generation script for Smart Expense Tracker.
 This script generates test data for demonstration and testing purposes.
+
+Two modes:
+
+* Single user (the original behaviour): row-by-row inserts for an existing
+  user::
+
+      python generate_sample_data.py <user_id> [num_transactions]
+
+* Scale mode: creates ``--users`` users and generates their transactions and
+  budgets with NumPy, streaming rows into PostgreSQL with ``COPY`` in chunks
+  of users, optionally across several processes. Output is deterministic for
+  a given ``--seed``, ``--chunk-users`` and ``--end-month``::
+
+      python generate_sample_data.py --users 100000 --transactions-per-user 500 --workers 8
 """
 
+import argparse
+import io
+import multiprocessing
 import os
 import sys
-from datetime import datetime, timedelta
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 import random
 
+import numpy as np
+
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from db import get_connection
+from werkzeug.security import generate_password_hash
 
+# Category mapping
+CATEGORIES = {
+    1: "Food",
+    2: "Transport",
+    3: "Entertainment",
+    4: "Others"
+}
 
-def generate_sample_data(user_id: int, num_transactions: int = 50):
+# Sample notes for each category
+SAMPLE_NOTES = {
+    1: ["Lunch at restaurant", "Coffee shop", "Dinner with friends", "Grocery shopping", "Fast food"],
+    2: ["Taxi ride", "Bus ticket", "Uber", "Gas station", "Parking fee"],
+    3: ["Movie tickets", "Concert", "Game purchase", "Netflix subscription", "Theater show"],
+    4: ["Pharmacy", "Shopping mall", "Utility bill", "Medicine", "General store"]
+}
+
+# Amount ranges for each category
+AMOUNT_RANGES = {
+    1: (10.0, 100.0),
+    2: (5.0, 50.0),
+    3: (15.0, 150.0),
+    4: (20.0, 200.0)
+}
+
+# Budget limits for each category
+BUDGET_LIMITS = {
+    1: 500.0,  # Food
+    2: 300.0,  # Transport
+    3: 200.0,  # Entertainment
+    4: 400.0   # Others
+}
+
+
+def generate_sample_data(user_id: int, num_transactions: int = 50, days: int = 90):
     """
     Generate sample transaction data for a user.
     
     Args:
         user_id: User ID to generate data for
         num_transactions: Number of transactions to generate
+        days: Spread transactions over this many days before today
     """
     conn = None
     try:
         conn = get_connection()
         
-        # Category mapping
-        categories = {
-            1: "Food",
-            2: "Transport", 
-            3: "Entertainment",
-            4: "Others"
-        }
-        
-        # Sample notes for each category
-        sample_notes = {
-            1: ["Lunch at restaurant", "Coffee shop", "Dinner with friends", "Grocery shopping", "Fast food"],
-            2: ["Taxi ride", "Bus ticket", "Uber", "Gas station", "Parking fee"],
-            3: ["Movie tickets", "Concert", "Game purchase", "Netflix subscription", "Theater show"],
-            4: ["Pharmacy", "Shopping mall", "Utility bill", "Medicine", "General store"]
-        }
-        
-        # Amount ranges for each category
-        amount_ranges = {
-            1: (10.0, 100.0),
-            2: (5.0, 50.0),
-            3: (15.0, 150.0),
-            4: (20.0, 200.0)
-        }
-        
         with conn.cursor() as cur:
-            # Generate transactions over the last 3 months
+            # Generate transactions over the last `days` days
             base_date = datetime.now()
             transactions_created = 0
             
             for i in range(num_transactions):
                 # Random category
-                category_id = random.choice(list(categories.keys()))
+                category_id = random.choice(list(CATEGORIES.keys()))
                 
                 # Random amount
-                min_amount, max_amount = amount_ranges[category_id]
+                min_amount, max_amount = AMOUNT_RANGES[category_id]
                 amount = round(random.uniform(min_amount, max_amount), 2)
                 
                 # Random note
-                note = random.choice(sample_notes[category_id])
+                note = random.choice(SAMPLE_NOTES[category_id])
                 
-                # Random date within last 3 months
-                days_ago = random.randint(0, 90)
+                # Random date within the period
+                days_ago = random.randint(0, days)
                 tx_date = (base_date - timedelta(days=days_ago)).date()
                 
                 try:
@@ -107,20 +138,12 @@ def generate_sample_budgets(user_id: int):
     try:
         conn = get_connection()
         
-        # Budget limits for each category
-        budget_limits = {
-            1: 500.0,  # Food
-            2: 300.0,  # Transport
-            3: 200.0,  # Entertainment
-            4: 400.0   # Others
-        }
-        
         # Generate budgets for current month and next month
         current_month = datetime.now().strftime("%Y-%m")
         next_month = (datetime.now().replace(day=1) + timedelta(days=32)).replace(day=1).strftime("%Y-%m")
         
         with conn.cursor() as cur:
-            for category_id, limit_amount in budget_limits.items():
+            for category_id, limit_amount in BUDGET_LIMITS.items():
                 # Current month budget
                 cur.execute(
                     """
@@ -155,33 +178,296 @@ def generate_sample_budgets(user_id: int):
             conn.close()
 
 
-if __name__ == "__main__":
+DEFAULT_PASSWORD = "password123"
+DEFAULT_CHUNK_USERS = 1000
+
+
+@dataclass(frozen=True)
+class ScaleConfig:
+    """Parameters shared by every chunk of a scale-mode run."""
+
+    transactions_per_user: int = 200
+    months: int = 12
+    end_month: str = datetime.now().strftime("%Y-%m")
+    seed: int = 42
+    budgets: bool = True
+
+
+def _month_grid(config: ScaleConfig) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return month starts (oldest first), usable days and calendar month (0-11).
+
+    The current month only has days up to today, so no future-dated
+    transactions are generated.
+    """
+
+    end = np.datetime64(config.end_month, "M")
+    month_starts = end - np.arange(config.months - 1, -1, -1)
+    days = ((month_starts + 1).astype("datetime64[D]") - month_starts.astype("datetime64[D]")).astype(int)
+    if end == np.datetime64(date.today(), "M"):
+        days[-1] = date.today().day
+    calendar_month = month_starts.astype(int) % 12
+    return month_starts, days, calendar_month
+
+
+def _sample_rows(rng: np.random.Generator, cdf: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    """Draw one column index per row from the owning row's cumulative weights.
+
+    Offsetting row ``i`` of ``cdf`` by ``i`` turns the per-row inverse CDF
+    lookups into a single ``searchsorted`` over the flattened array.
+    """
+
+    n_rows, width = cdf.shape
+    flat = (cdf + np.arange(n_rows)[:, None]).ravel()
+    index = np.searchsorted(flat, rng.random(len(owner)) + owner, side="right")
+    return np.clip(index - owner * width, 0, width - 1)
+
+
+def _generate_chunk(
+    user_ids: np.ndarray, chunk_key: int, config: ScaleConfig
+) -> tuple[str, str, int]:
+    """Generate transactions and budgets for one chunk of users.
+
+    Each user gets a Poisson number of transactions, their own category mix
+    (Dirichlet), a spending scale (log-normal) and a yearly seasonal curve
+    with a December peak.
+
+    Returns:
+        ``(transactions_tsv, budgets_tsv, n_transactions)`` in ``COPY`` text
+        format.
+    """
+
+    rng = np.random.default_rng([config.seed, chunk_key])
+    n_users = len(user_ids)
+    month_starts, days, calendar_month = _month_grid(config)
+    categories = np.array(sorted(CATEGORIES))
+
+    counts = rng.poisson(config.transactions_per_user, n_users)
+    owner = np.repeat(np.arange(n_users), counts)
+
+    amplitude = rng.uniform(0.05, 0.4, n_users)[:, None]
+    phase = rng.uniform(0, 2 * np.pi, n_users)[:, None]
+    season = 1 + amplitude * np.sin(2 * np.pi * calendar_month / 12 + phase)
+    # Weight by usable days so a partial current month gets fewer rows.
+    season = season * np.where(calendar_month == 11, 1.3, 1.0) * days
+    month_weights = season / season.sum(axis=1, keepdims=True)
+    month_index = _sample_rows(rng, np.cumsum(month_weights, axis=1), owner)
+
+    mix = rng.dirichlet(np.full(len(categories), 1.5), n_users)
+    category_index = _sample_rows(rng, np.cumsum(mix, axis=1), owner)
+
+    scale = rng.lognormal(0.0, 0.35, n_users)
+    low = np.array([AMOUNT_RANGES[c][0] for c in categories])
+    high = np.array([AMOUNT_RANGES[c][1] for c in categories])
+    amount = rng.uniform(low[category_index], high[category_index]) * scale[owner]
+    amount = np.maximum(amount.round(2), 0.01)
+
+    notes = np.array([SAMPLE_NOTES[c] for c in categories])
+    note = notes[category_index, rng.integers(0, notes.shape[1], len(owner))]
+    day = (rng.random(len(owner)) * days[month_index]).astype(int)
+    tx_date = month_starts[month_index].astype("datetime64[D]") + day
+
+    columns = (
+        user_ids[owner].astype(str),
+        categories[category_index].astype(str),
+        np.char.mod("%.2f", amount),
+        note,
+        tx_date.astype(str),
+    )
+    transactions = "".join(f"{row}\n" for row in map("\t".join, zip(*columns)))
+
+    budgets = ""
+    if config.budgets:
+        # Limits near each user's typical monthly spend, so some go over.
+        typical = (
+            config.transactions_per_user / config.months
+            * mix * scale[:, None] * (low + high) / 2
+        )
+        limits = np.maximum((typical * rng.uniform(0.8, 1.3, typical.shape)).round(-1), 10)
+        end = np.datetime64(config.end_month, "M")
+        budget_months = [str(end), str(end + 1)]
+        budgets = "".join(
+            f"{user_id}\t{category}\t{limit:.2f}\t{month}\n"
+            for user_id, user_limits in zip(user_ids.tolist(), limits.tolist())
+            for category, limit in zip(categories.tolist(), user_limits)
+            for month in budget_months
+        )
+    return transactions, budgets, len(owner)
+
+
+def _load_chunk(job: tuple[np.ndarray, int, ScaleConfig]) -> int:
+    """Generate one chunk and ``COPY`` it in a single transaction."""
+
+    user_ids, chunk_key, config = job
+    transactions, budgets, n_transactions = _generate_chunk(user_ids, chunk_key, config)
+    conn = get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            # One statement per chunk, so the rollup triggers run once per chunk.
+            cur.copy_expert(
+                "COPY transactions (user_id, category_id, amount, note, tx_date) FROM STDIN",
+                io.StringIO(transactions),
+            )
+            if budgets:
+                cur.execute(
+                    "CREATE TEMP TABLE generated_budgets (LIKE budgets INCLUDING DEFAULTS) "
+                    "ON COMMIT DROP"
+                )
+                cur.copy_expert(
+                    "COPY generated_budgets (user_id, category_id, limit_amount, month_year) "
+                    "FROM STDIN",
+                    io.StringIO(budgets),
+                )
+                cur.execute(
+                    """
+                    INSERT INTO budgets (user_id, category_id, limit_amount, month_year)
+                    SELECT user_id, category_id, limit_amount, month_year
+                    FROM generated_budgets
+                    ON CONFLICT (user_id, category_id, month_year)
+                    DO UPDATE SET limit_amount = EXCLUDED.limit_amount
+                    """
+                )
+    finally:
+        conn.close()
+    return n_transactions
+
+
+def create_users(prefix: str, count: int, password: str) -> list[int]:
+    """
+    Create users ``<prefix>_0`` .. ``<prefix>_<count-1>``.
+
+    Existing usernames are skipped, so re-running does not duplicate data.
+
+    Returns:
+        IDs of the newly created users, ordered by username index
+    """
+    conn = get_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO users (username, email, password_hash)
+                SELECT %(prefix)s || '_' || i, %(prefix)s || '_' || i || '@example.com', %(hash)s
+                FROM generate_series(0, %(count)s - 1) AS i
+                ORDER BY i
+                ON CONFLICT (username) DO NOTHING
+                RETURNING user_id
+                """,
+                {"prefix": prefix, "count": count, "hash": generate_password_hash(password)},
+            )
+            return sorted(row[0] for row in cur.fetchall())
+    finally:
+        conn.close()
+
+
+def generate_users(
+    count: int,
+    config: ScaleConfig = ScaleConfig(),
+    prefix: str = "gen",
+    password: str = DEFAULT_PASSWORD,
+    workers: int = 1,
+    chunk_users: int = DEFAULT_CHUNK_USERS,
+) -> tuple[int, int]:
+    """
+    Create ``count`` users and load generated transactions and budgets.
+
+    Chunks are seeded by ``(seed, position of the chunk)``, so the data does
+    not depend on ``workers``.
+
+    Args:
+        count: Number of users named ``<prefix>_<n>``
+        config: Generation parameters
+        prefix: Username prefix
+        password: Password for every generated user
+        workers: Processes generating and loading chunks in parallel
+        chunk_users: Users per chunk (one COPY transaction each)
+
+    Returns:
+        ``(new_users, transactions_loaded)``
+    """
+    user_ids = np.array(create_users(prefix, count, password), dtype=np.int64)
+    jobs = [
+        (user_ids[start:start + chunk_users], start, config)
+        for start in range(0, len(user_ids), chunk_users)
+    ]
+    if workers > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(min(workers, len(jobs))) as pool:
+            loaded = sum(pool.imap_unordered(_load_chunk, jobs))
+    else:
+        loaded = sum(map(_load_chunk, jobs))
+    return len(user_ids), loaded
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Generate sample data for Smart Expense Tracker.")
+    parser.add_argument("user_id", type=int, nargs="?", help="existing user to generate data for")
+    parser.add_argument("num_transactions", type=int, nargs="?", default=50)
+    scale = parser.add_argument_group("scale mode")
+    scale.add_argument("--users", type=int, help="create this many users and generate data for them")
+    scale.add_argument("--transactions-per-user", type=int, default=ScaleConfig.transactions_per_user,
+                       help="mean transactions per user (default: %(default)s)")
+    scale.add_argument("--months", type=int, default=ScaleConfig.months,
+                       help="months of history (default: %(default)s)")
+    scale.add_argument("--end-month", default=ScaleConfig.end_month,
+                       help="last month of history, YYYY-MM (default: current month)")
+    scale.add_argument("--seed", type=int, default=ScaleConfig.seed)
+    scale.add_argument("--workers", type=int, default=1, help="parallel processes (default: 1)")
+    scale.add_argument("--chunk-users", type=int, default=DEFAULT_CHUNK_USERS,
+                       help="users per COPY transaction (default: %(default)s)")
+    scale.add_argument("--prefix", default="gen", help="username prefix (default: %(default)s)")
+    scale.add_argument("--password", default=DEFAULT_PASSWORD)
+    scale.add_argument("--no-budgets", action="store_true", help="skip budget generation")
+    args = parser.parse_args(argv)
+
     print("📊 Smart Expense Tracker - Sample Data Generator")
     print("=" * 50)
-    
-    if len(sys.argv) < 2:
+
+    if args.users is not None:
+        try:
+            datetime.strptime(args.end_month, "%Y-%m")
+        except ValueError:
+            parser.error("--end-month must be YYYY-MM")
+        if args.users < 1 or args.months < 1 or args.chunk_users < 1:
+            parser.error("--users, --months and --chunk-users must be positive")
+        config = ScaleConfig(
+            transactions_per_user=args.transactions_per_user,
+            months=args.months,
+            end_month=args.end_month,
+            seed=args.seed,
+            budgets=not args.no_budgets,
+        )
+        print(f"\nGenerating {args.users} user(s) '{args.prefix}_*' with ~{args.transactions_per_user} "
+              f"transactions each over {args.months} month(s) ending {args.end_month}\n")
+        started = time.perf_counter()
+        created, loaded = generate_users(
+            args.users, config, args.prefix, args.password, args.workers, args.chunk_users
+        )
+        elapsed = time.perf_counter() - started
+        print(f"✅ Created {created} user(s) ({args.users - created} already existed) and "
+              f"{loaded} transaction(s) in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/s)")
+        return 0
+
+    if args.user_id is None:
         print("Usage: python generate_sample_data.py <user_id> [num_transactions]")
+        print("       python generate_sample_data.py --users N [--transactions-per-user N] [--workers N]")
         print("Example: python generate_sample_data.py 1 50")
-        sys.exit(1)
-    
-    try:
-        user_id = int(sys.argv[1])
-        num_transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-    except ValueError:
-        print("❌ Error: user_id and num_transactions must be integers")
-        sys.exit(1)
-    
-    print(f"\nGenerating data for user_id: {user_id}")
-    print(f"Number of transactions: {num_transactions}\n")
-    
+        return 1
+
+    print(f"\nGenerating data for user_id: {args.user_id}")
+    print(f"Number of transactions: {args.num_transactions}\n")
+
     # Generate transactions
-    generate_sample_data(user_id, num_transactions)
-    
+    generate_sample_data(args.user_id, args.num_transactions)
+
     # Generate budgets
-    generate_sample_budgets(user_id)
-    
+    generate_sample_budgets(args.user_id)
+
     print("\n✅ Sample data generation complete!")
     print("\nNext steps:")
     print("1. Start the Flask app: python app.py")
     print("2. Login and view the data at: http://127.0.0.1:5050/report")
+    return 0
 
+
+if __name__ == "__main__":
+    sys.exit(main())
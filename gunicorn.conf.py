@@ -0,0 +1,77 @@
+"""Gunicorn settings for serving ``wsgi:app`` in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Sizing (see "Production serving" in README.md): requests spend most of their
+time waiting on PostgreSQL, so each worker runs several threads.
+``POSTGRES_POOL_MAX`` must be at least ``GUNICORN_THREADS`` plus
+``ALERT_WORKERS``, and ``GUNICORN_WORKERS * POSTGRES_POOL_MAX`` must fit in
+the server's ``max_connections``.
+"""
+
+import logging
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5050")
+workers = int(os.getenv("GUNICORN_WORKERS", str(max(multiprocessing.cpu_count(), 2))))
+# The memory report cache is per process: a write would only invalidate the
+# worker that handled it. Read before the app is preloaded.
+os.environ.setdefault("REPORT_CACHE_BACKEND", "sqlite")
+if workers > 1 and os.environ["REPORT_CACHE_BACKEND"] == "memory":
+    raise RuntimeError(
+        "REPORT_CACHE_BACKEND=memory serves stale reports with several workers; "
+        "use sqlite or off, or set GUNICORN_WORKERS=1"
+    )
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Load the app and classifier once in the master, then fork.
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# On SIGTERM, workers stop accepting and finish in-flight requests for this long.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Then each exiting worker gets this long to finish queued budget alerts.
+drain_timeout = float(os.getenv("GUNICORN_DRAIN_TIMEOUT", "10"))
+keepalive = 5
+# Recycle workers periodically; jitter keeps them from restarting together.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESS_LOG")  # e.g. "-" for stdout
+errorlog = "-"
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def when_ready(server):
+    """Close anything the master opened while preloading, before forking.
+
+    Workers build their own pools (db and caches are keyed by PID); a
+    connection inherited from the master would share its socket.
+    """
+
+    from db import close_pool
+
+    close_pool()
+
+
+def post_fork(server, worker):
+    """Open the worker's connection pool before it takes requests."""
+
+    from db import get_pool
+
+    get_pool()
+
+
+def worker_exit(server, worker):
+    """Drain background jobs and release connections as a worker stops."""
+
+    import alerts
+    import auth
+    from db import close_pool
+    from nlp_classifier import get_registry
+
+    if not alerts.shutdown(drain_timeout):
+        logger.warning("Worker %s exited with budget alerts still running", worker.pid)
+    get_registry().shutdown(wait=False)
+    auth.shutdown()
+    close_pool()
@@ -0,0 +1,376 @@
+"""Per-request instrumentation and Prometheus metrics.
+
+Each request collects its own breakdown (database queries and their
+durations, connections checked out and opened, classifier and SMTP time) in
+a context variable. Every cursor created through :mod:`db` reports its
+queries here, and code around the classifier and SMTP calls uses
+:func:`timed`. When the request ends, the breakdown feeds process-wide
+histograms served at ``/metrics`` in the Prometheus text format. Requests
+slower than ``SLOW_REQUEST_MS`` are logged along with their slowest queries.
+
+Metrics are kept per process. With several worker processes, scrape each
+worker or aggregate in Prometheus.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Optional
+
+from flask import Flask, Response, g, request
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+SLOW_LOG_QUERIES = 5
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+# Label values: a tuple of (name, value) pairs.
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series: dict[Labels, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # Per-bucket counts, then sum and count.
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_labels(key + (('le', _number(bound)),))} {_number(cumulative)}"
+                )
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {_number(series[-1])}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(key)} {_number(series[-1])}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_labels(key)} {_number(value)}")
+        return lines
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request wall time.", LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries executed per request.", COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per request.", LATENCY_BUCKETS
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Duration of individual database statements.", QUERY_BUCKETS
+)
+CONNECTIONS_OPENED = Counter("db_connections_opened_total", "New database connections opened.")
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool.")
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection.", QUERY_BUCKETS
+)
+STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds",
+    "Execution time of named statements from the queries module.",
+    QUERY_BUCKETS,
+)
+STATEMENTS_PREPARED = Counter(
+    "db_statements_prepared_total", "Named statements prepared on a new connection."
+)
+OPERATION_DURATION = Histogram(
+    "operation_duration_seconds",
+    "Time spent in instrumented operations (classifier, password_hash, smtp).",
+    LATENCY_BUCKETS,
+)
+
+_METRICS = (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_DB_TIME,
+    QUERY_DURATION,
+    CONNECTIONS_OPENED,
+    POOL_CHECKOUTS,
+    POOL_WAIT,
+    STATEMENT_DURATION,
+    STATEMENTS_PREPARED,
+    OPERATION_DURATION,
+)
+
+# Extra gauges computed at scrape time: name -> (help, callback).
+_gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+
+def register_gauge(name: str, help_text: str, callback: Callable[[], float]) -> None:
+    """Expose ``callback()`` as a gauge on every scrape."""
+
+    _gauges[name] = (help_text, callback)
+
+
+@dataclass
+class RequestStats:
+    """Breakdown of where one request spent its time."""
+
+    started: float = field(default_factory=time.perf_counter)
+    queries: list[tuple[str, float]] = field(default_factory=list)
+    checkouts: int = 0
+    connections_opened: int = 0
+    operations: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Return the stats of the request being handled, if any."""
+
+    return _current.get()
+
+
+_KEYWORD = re.compile(r"^\s*(\w+)")
+
+
+def _statement_kind(query: str) -> str:
+    match = _KEYWORD.match(query)
+    return match.group(1).upper() if match else "OTHER"
+
+
+def record_query(query: str | bytes, duration: float) -> None:
+    """Record one executed statement (called by the db cursor)."""
+
+    text = query.decode(errors="replace") if isinstance(query, bytes) else str(query)
+    QUERY_DURATION.observe(duration, statement=_statement_kind(text))
+    stats = _current.get()
+    if stats is not None:
+        stats.queries.append((text, duration))
+
+
+def record_statement(name: str, duration: float) -> None:
+    """Record one execution of a named statement."""
+
+    STATEMENT_DURATION.observe(duration, statement=name)
+
+
+def record_prepare(name: str) -> None:
+    """Record a named statement being prepared on a connection."""
+
+    STATEMENTS_PREPARED.inc(statement=name)
+
+
+def record_checkout(wait: float) -> None:
+    """Record a pool checkout and how long it waited."""
+
+    POOL_CHECKOUTS.inc()
+    POOL_WAIT.observe(wait)
+    stats = _current.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def record_connection_opened() -> None:
+    """Record a new physical database connection."""
+
+    CONNECTIONS_OPENED.inc()
+    stats = _current.get()
+    if stats is not None:
+        stats.connections_opened += 1
+
+
+@contextmanager
+def timed(operation: str) -> Iterator[None]:
+    """Time a block as ``operation`` (e.g. ``classifier``, ``smtp``)."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        OPERATION_DURATION.observe(elapsed, operation=operation)
+        stats = _current.get()
+        if stats is not None:
+            stats.operations[operation] = stats.operations.get(operation, 0.0) + elapsed
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format."""
+
+    lines: list[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, (help_text, callback) in sorted(_gauges.items()):
+        try:
+            value = float(callback())
+        except Exception:
+            logger.exception("Gauge %s failed", name)
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_number(value)}"])
+    return "\n".join(lines) + "\n"
+
+
+def _compact(query: str, limit: int = 120) -> str:
+    text = " ".join(query.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def _log_slow(stats: RequestStats, elapsed: float, method: str, path: str, status: int) -> None:
+    slowest = sorted(stats.queries, key=lambda item: item[1], reverse=True)[:SLOW_LOG_QUERIES]
+    breakdown = "".join(
+        f"\n    {duration * 1000:8.1f} ms  {_compact(query)}" for query, duration in slowest
+    )
+    operations = ", ".join(
+        f"{name} {seconds * 1000:.1f} ms" for name, seconds in sorted(stats.operations.items())
+    )
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms: %d queries (%.1f ms), %d checkouts, "
+        "%d connections opened%s%s",
+        method,
+        path,
+        status,
+        elapsed * 1000,
+        len(stats.queries),
+        stats.db_seconds * 1000,
+        stats.checkouts,
+        stats.connections_opened,
+        f", {operations}" if operations else "",
+        breakdown,
+    )
+
+
+def start_request() -> Token:
+    """Begin collecting stats for a request; pass the token to :func:`finish_request`."""
+
+    return _current.set(RequestStats())
+
+
+def finish_request(
+    token: Token, method: str, path: str, endpoint: Optional[str], status: int
+) -> None:
+    """Stop collecting stats for a request and record them.
+
+    Args:
+        token: Returned by :func:`start_request`.
+        method: HTTP method.
+        path: Request path, used only in the slow-request log.
+        endpoint: The matched route rule (not the path, which keeps label
+            cardinality bounded), or None when no route matched.
+        status: Response status code.
+    """
+
+    stats = _current.get()
+    _current.reset(token)
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - stats.started
+    endpoint = endpoint or "unmatched"
+    REQUEST_DURATION.observe(elapsed, method=method, endpoint=endpoint, status=str(status))
+    REQUEST_QUERIES.observe(len(stats.queries), endpoint=endpoint)
+    REQUEST_DB_TIME.observe(stats.db_seconds, endpoint=endpoint)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        _log_slow(stats, elapsed, method, path, status)
+
+
+def authorized(authorization: Optional[str]) -> bool:
+    """Check an ``Authorization`` header against ``METRICS_TOKEN``."""
+
+    return not METRICS_TOKEN or authorization == f"Bearer {METRICS_TOKEN}"
+
+
+def init_metrics(app: Flask) -> None:
+    """Install the per-request hooks and the ``/metrics`` endpoint."""
+
+    @app.before_request
+    def _start_request_stats() -> None:
+        g._metrics_token = start_request()
+
+    @app.after_request
+    def _record_status(response: Response) -> Response:
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_stats(exc: Optional[BaseException]) -> None:
+        token = g.pop("_metrics_token", None)
+        if token is None:
+            return
+        if request.endpoint == "metrics":
+            _current.reset(token)
+            return
+        finish_request(
+            token,
+            request.method,
+            request.path,
+            request.url_rule.rule if request.url_rule is not None else None,
+            g.pop("_metrics_status", 500),
+        )
+
+    @app.route("/metrics")
+    def metrics():
+        if not authorized(request.headers.get("Authorization")):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,11 @@
+-- Migration 001: composite indexes for per-user transaction queries.
+-- Safe to run on a live database (psql runs each statement outside a transaction block):
+--   psql -U postgres -d expense_db -f migrations/001_transaction_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_user_date
+    ON transactions (user_id, tx_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_user_category_date
+    ON transactions (user_id, category_id, tx_date) INCLUDE (amount);
+
+ANALYZE transactions;
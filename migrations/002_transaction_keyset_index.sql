@@ -0,0 +1,7 @@
+-- Migration 002: extend the per-user date index with tx_id so GET /transactions
+-- can page on (tx_date, tx_id) straight from the index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_user_date_id
+    ON transactions (user_id, tx_date, tx_id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_transactions_user_date;
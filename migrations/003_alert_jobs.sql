@@ -0,0 +1,15 @@
+-- Migration 003: job table for the PostgreSQL-backed budget alert worker
+-- (ALERT_BACKEND=db, run with: python alerts.py worker).
+
+CREATE TABLE IF NOT EXISTS alert_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    month_year VARCHAR(7) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_alert_jobs_run_after
+    ON alert_jobs (run_after);
@@ -0,0 +1,11 @@
+-- Migration 004: remember which budgets have been alerted so an email is sent
+-- once per threshold crossing instead of on every transaction.
+
+CREATE TABLE IF NOT EXISTS budget_alert_state (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    category_id INT NOT NULL REFERENCES categories(category_id),
+    month_year VARCHAR(7) NOT NULL,
+    used_percent DECIMAL(8, 2),
+    alerted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, month_year, category_id)
+);
@@ -0,0 +1,116 @@
+-- Migration 005: monthly per-category rollup of transactions, maintained by
+-- triggers, so reports and budget checks read O(months x categories) rows.
+-- The backfill holds a SHARE lock on transactions (blocking writes, not
+-- reads) so no write can slip between the backfill and the triggers.
+
+BEGIN;
+
+-- Per-user monthly totals by category, kept current by statement-level
+-- triggers on transactions. Uncategorised transactions roll up under
+-- category_id 0; rows with a NULL user_id or tx_date are not counted.
+CREATE TABLE IF NOT EXISTS user_month_category_totals (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    month_start DATE NOT NULL,
+    category_id INT NOT NULL,
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, month_start, category_id)
+);
+
+CREATE OR REPLACE FUNCTION apply_transaction_rollup() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    delta TEXT;
+BEGIN
+    -- DELETE rather than TRUNCATE: a TRUNCATE ... CASCADE that reaches the
+    -- rollup through users is still running, and would make it fail.
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM user_month_category_totals;
+        RETURN NULL;
+    END IF;
+
+    -- Only the transition tables of the firing event exist, so pick the
+    -- delta source per operation.
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT user_id, tx_date, category_id, amount, 1 AS n FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT user_id, tx_date, category_id, -amount, -1 AS n FROM old_rows'
+        ELSE
+            'SELECT user_id, tx_date, category_id, amount, 1 AS n FROM new_rows
+             UNION ALL
+             SELECT user_id, tx_date, category_id, -amount, -1 FROM old_rows'
+    END;
+
+    -- Net the statement's changes per (user, month, category) and apply them
+    -- in key order so concurrent writers lock rollup rows consistently.
+    EXECUTE format($sql$
+        INSERT INTO user_month_category_totals AS r
+            (user_id, month_start, category_id, total, tx_count)
+        SELECT
+            user_id,
+            DATE_TRUNC('month', tx_date)::date,
+            COALESCE(category_id, 0),
+            SUM(amount),
+            SUM(n)
+        FROM (%s) AS delta (user_id, tx_date, category_id, amount, n)
+        WHERE user_id IS NOT NULL AND tx_date IS NOT NULL
+        GROUP BY 1, 2, 3
+        HAVING SUM(n) <> 0 OR SUM(amount) <> 0
+        ORDER BY 1, 2, 3
+        ON CONFLICT (user_id, month_start, category_id) DO UPDATE SET
+            total = r.total + EXCLUDED.total,
+            tx_count = r.tx_count + EXCLUDED.tx_count,
+            updated_at = NOW()
+    $sql$, delta);
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM user_month_category_totals
+        WHERE tx_count <= 0
+          AND user_id IN (SELECT user_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_rollup_insert ON transactions;
+CREATE TRIGGER transactions_rollup_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_update ON transactions;
+CREATE TRIGGER transactions_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_delete ON transactions;
+CREATE TRIGGER transactions_rollup_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_truncate ON transactions;
+CREATE TRIGGER transactions_rollup_truncate
+    AFTER TRUNCATE ON transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+LOCK TABLE transactions IN SHARE MODE;
+
+DELETE FROM user_month_category_totals;
+INSERT INTO user_month_category_totals (user_id, month_start, category_id, total, tx_count)
+SELECT
+    user_id,
+    DATE_TRUNC('month', tx_date)::date,
+    COALESCE(category_id, 0),
+    SUM(amount),
+    COUNT(*)
+FROM transactions
+WHERE user_id IS NOT NULL AND tx_date IS NOT NULL
+GROUP BY 1, 2, 3;
+
+COMMIT;
+
+ANALYZE user_month_category_totals;
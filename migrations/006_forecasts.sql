@@ -0,0 +1,20 @@
+-- Migration 006: precomputed per-user forecasts written by forecast_batch.py.
+-- /predict serves a row while the user's rollup rows still have the latest
+-- update time, row count and transaction count in its source_* columns, and
+-- fits live otherwise.
+
+CREATE TABLE IF NOT EXISTS forecasts (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    model VARCHAR(20) NOT NULL,
+    coverage DECIMAL(4, 3) NOT NULL,
+    first_month DATE NOT NULL,
+    n_months INT NOT NULL,
+    point DECIMAL(14, 2)[] NOT NULL,
+    lower_bound DECIMAL(14, 2)[] NOT NULL,
+    upper_bound DECIMAL(14, 2)[] NOT NULL,
+    source_updated_at TIMESTAMPTZ NOT NULL,
+    source_rows BIGINT NOT NULL,
+    source_tx_count BIGINT NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, model)
+);
@@ -0,0 +1,153 @@
+-- Migration 007: range-partition transactions by month on tx_date.
+--
+-- Month-bounded queries then only touch the partitions they need, and old
+-- months can be detached or dropped as whole tables
+-- (python partitions.py detach). The table is rebuilt in place: rows are
+-- copied into the partitioned table before its rollup triggers exist, so
+-- user_month_category_totals stays as it is. Writes (not reads) are blocked
+-- while it runs. The copy rewrites the whole table, so plan the time and
+-- disk space on large databases.
+--
+-- The partition key must be part of the primary key, so it becomes
+-- (tx_id, tx_date), and tx_date becomes NOT NULL. The migration stops if
+-- any row has a NULL tx_date. Fix those rows first.
+
+BEGIN;
+
+LOCK TABLE transactions IN EXCLUSIVE MODE;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM transactions WHERE tx_date IS NULL) THEN
+        RAISE EXCEPTION 'transactions has rows with a NULL tx_date'
+            USING HINT = 'Set their tx_date (e.g. UPDATE transactions SET tx_date = CURRENT_DATE WHERE tx_date IS NULL) and re-run.';
+    END IF;
+END;
+$$;
+
+ALTER TABLE transactions RENAME TO transactions_unpartitioned;
+
+-- Free the constraint names (transactions_pkey, ..._fkey) for the new table.
+DO $$
+DECLARE
+    c RECORD;
+BEGIN
+    FOR c IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'transactions_unpartitioned'::regclass
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT %I TO %I',
+            c.conname, 'unpartitioned_' || c.conname
+        );
+    END LOOP;
+END;
+$$;
+
+CREATE TABLE transactions (
+    tx_id INT NOT NULL DEFAULT nextval('transactions_tx_id_seq'),
+    user_id INT REFERENCES users(user_id),
+    category_id INT REFERENCES categories(category_id),
+    amount DECIMAL(10, 2) NOT NULL,
+    note TEXT,
+    tx_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (tx_id, tx_date)
+) PARTITION BY RANGE (tx_date);
+
+-- Catches rows outside every monthly partition until
+-- ensure_transaction_partitions() moves them into one.
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+-- Create monthly partitions for every month from from_month (default: the
+-- current month) through months_ahead months ahead, and for any month with
+-- rows in the default partition. Those rows are moved into the new
+-- partition; moving them does not touch the rollups, since the rows stay in
+-- transactions. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(
+    months_ahead INT DEFAULT 3,
+    from_month DATE DEFAULT NULL
+) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    -- Serialize concurrent callers (e.g. overlapping cron runs).
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_transaction_partitions'));
+
+    FOR month IN
+        SELECT generate_series(
+            DATE_TRUNC('month', COALESCE(from_month, CURRENT_DATE)),
+            DATE_TRUNC('month', CURRENT_DATE) + make_interval(months => months_ahead),
+            INTERVAL '1 month'
+        )::date
+        UNION
+        SELECT DISTINCT DATE_TRUNC('month', tx_date)::date FROM transactions_default
+        ORDER BY 1
+    LOOP
+        partition_name := 'transactions_p' || TO_CHAR(month, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS)', partition_name
+            );
+            EXECUTE format(
+                'WITH moved AS (
+                     DELETE FROM transactions_default
+                     WHERE tx_date >= %L AND tx_date < %L
+                     RETURNING *
+                 )
+                 INSERT INTO %I SELECT * FROM moved',
+                month, (month + INTERVAL '1 month')::date, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month, (month + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT ensure_transaction_partitions(3, (SELECT MIN(tx_date) FROM transactions_unpartitioned));
+
+INSERT INTO transactions (tx_id, user_id, category_id, amount, note, tx_date)
+SELECT tx_id, user_id, category_id, amount, note, tx_date
+FROM transactions_unpartitioned;
+
+-- Keep the sequence when the old table (its previous owner) is dropped.
+ALTER SEQUENCE transactions_tx_id_seq OWNED BY transactions.tx_id;
+DROP TABLE transactions_unpartitioned;
+
+-- Per-user date range scans and (tx_date, tx_id) keyset pagination
+CREATE INDEX idx_transactions_user_date_id
+    ON transactions (user_id, tx_date, tx_id);
+
+-- Covering index for per-category month sums (budget status and alerts)
+CREATE INDEX idx_transactions_user_category_date
+    ON transactions (user_id, category_id, tx_date) INCLUDE (amount);
+
+CREATE TRIGGER transactions_rollup_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+CREATE TRIGGER transactions_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+CREATE TRIGGER transactions_rollup_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+CREATE TRIGGER transactions_rollup_truncate
+    AFTER TRUNCATE ON transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+COMMIT;
+
+ANALYZE transactions;
@@ -1,14 +1,67 @@
-"""NLP-based category classification using TF-IDF and Naive Bayes."""
+"""NLP-based category classification using TF-IDF and Naive Bayes.
 
+Trained pipelines are published to ``CLASSIFIER_MODEL_DIR`` as versioned
+artifacts (a joblib file plus a JSON header carrying the version and SHA-256),
+with a ``CURRENT`` pointer naming the live version. Workers load the current
+artifact lazily and pick up newly published versions without restarting.
+
+CLI::
+
+    python nlp_classifier.py publish [--from-db] [--model-dir DIR]
+    python nlp_classifier.py current [--model-dir DIR]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
 import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Optional
 
+import joblib
 import numpy as np
+import sklearn
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 
-from db import get_connection
+import queries
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv(
+    "CLASSIFIER_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"),
+)
+# Seconds between checks of the CURRENT pointer for a newly published version
+RELOAD_INTERVAL = float(os.getenv("CLASSIFIER_RELOAD_INTERVAL", "30"))
+ARTIFACT_FORMAT = 1
+CURRENT_POINTER = "CURRENT"
+BUILTIN_VERSION = "builtin"
+
+# Per-user model registry bounds
+USER_MODEL_MAX_COUNT = int(os.getenv("USER_MODEL_MAX_COUNT", "1000"))
+USER_MODEL_MAX_BYTES = int(os.getenv("USER_MODEL_MAX_BYTES", str(256 * 1024 * 1024)))
+USER_MODEL_MIN_SAMPLES = 10
+USER_MODEL_TRAIN_LIMIT = 1000
+# A user's model is retrained each time their labelled count crosses one of
+# these, then every RETRAIN_THRESHOLDS[-1] transactions after the last.
+RETRAIN_THRESHOLDS = (10, 25, 50, 100, 250, 500, 1000)
+
+# Memoized normalized-note -> category predictions
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
 
 # Training keywords for each category
 CATEGORY_KEYWORDS = {
@@ -39,60 +92,474 @@ def _build_training_data() -> tuple[list[str], list[int]]:
     return texts, labels
 
 
-def _train_classifier() -> Pipeline:
-    """Train TF-IDF + Naive Bayes classifier."""
-    texts, labels = _build_training_data()
-    pipeline = Pipeline(
+def _build_pipeline() -> Pipeline:
+    """Create an untrained TF-IDF + Naive Bayes pipeline."""
+    return Pipeline(
         [
             ("tfidf", TfidfVectorizer(max_features=100, ngram_range=(1, 2))),
             ("nb", MultinomialNB(alpha=0.1)),
         ]
     )
+
+
+def _train_classifier() -> Pipeline:
+    """Train TF-IDF + Naive Bayes classifier."""
+    texts, labels = _build_training_data()
+    pipeline = _build_pipeline()
     pipeline.fit(texts, labels)
     return pipeline
 
 
-# Global classifier instance (lazy-loaded)
+class _PredictionCache:
+    """Thread-safe bounded LRU of (model key, normalized note) -> category."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str]) -> Optional[int]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple[str, str], value: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_prediction_cache = _PredictionCache(PREDICTION_CACHE_SIZE)
+
+
+def prediction_cache_stats() -> dict[str, int]:
+    """Return prediction cache counters for monitoring."""
+    return _prediction_cache.stats()
+
+
+class ArtifactError(Exception):
+    """Raised when a published classifier artifact is missing or corrupt."""
+
+
+def _sha256(path: str) -> str:
+    """Hash a file in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, content: str) -> None:
+    """Write a small text file so readers never observe a partial write."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w") as fh:
+        fh.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_current_version(model_dir: Optional[str] = None) -> Optional[str]:
+    """Return the version named by the CURRENT pointer, if any."""
+    try:
+        with open(os.path.join(model_dir or MODEL_DIR, CURRENT_POINTER)) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_classifier(
+    pipeline: Pipeline,
+    model_dir: Optional[str] = None,
+    source: str = "keywords",
+    n_samples: int = 0,
+) -> str:
+    """
+    Serialize a trained pipeline as a new version and make it current.
+
+    Args:
+        pipeline: Fitted pipeline to publish
+        model_dir: Artifact directory (defaults to CLASSIFIER_MODEL_DIR)
+        source: Description of the training data, stored in the header
+        n_samples: Number of training samples, stored in the header
+
+    Returns:
+        The published version string
+    """
+    model_dir = model_dir or MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+
+    # Dump uncompressed so numpy arrays can be memory-mapped on load.
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix=".tmp-", suffix=".joblib")
+    os.close(fd)
+    joblib.dump(pipeline, tmp_path)
+    sha256 = _sha256(tmp_path)
+
+    created_at = datetime.now(timezone.utc)
+    version = f"{created_at:%Y%m%d%H%M%S}-{sha256[:8]}"
+    os.replace(tmp_path, os.path.join(model_dir, f"classifier-{version}.joblib"))
+
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "sha256": sha256,
+        "created_at": created_at.isoformat(),
+        "source": source,
+        "n_samples": n_samples,
+        "sklearn_version": sklearn.__version__,
+    }
+    _write_atomic(
+        os.path.join(model_dir, f"classifier-{version}.json"), json.dumps(header, indent=2)
+    )
+    # Flipping the pointer is the atomic "publish" step running workers watch.
+    _write_atomic(os.path.join(model_dir, CURRENT_POINTER), version + "\n")
+    return version
+
+
+def load_classifier(version: str, model_dir: Optional[str] = None) -> Pipeline:
+    """
+    Load and verify a published classifier version.
+
+    Args:
+        version: Version string from the CURRENT pointer
+        model_dir: Artifact directory (defaults to CLASSIFIER_MODEL_DIR)
+
+    Returns:
+        The deserialized pipeline, with arrays memory-mapped read-only
+
+    Raises:
+        ArtifactError: If the header is missing, incompatible or the hash differs
+    """
+    model_dir = model_dir or MODEL_DIR
+    artifact_path = os.path.join(model_dir, f"classifier-{version}.joblib")
+    try:
+        with open(os.path.join(model_dir, f"classifier-{version}.json")) as fh:
+            header = json.load(fh)
+    except (OSError, ValueError) as exc:
+        raise ArtifactError(f"Unreadable header for classifier {version}: {exc}") from exc
+
+    if header.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"Unsupported artifact format {header.get('format')!r}")
+    if header.get("sklearn_version") != sklearn.__version__:
+        raise ArtifactError(
+            f"Classifier {version} was built with scikit-learn {header.get('sklearn_version')}, "
+            f"running {sklearn.__version__}"
+        )
+    if not os.path.exists(artifact_path) or _sha256(artifact_path) != header.get("sha256"):
+        raise ArtifactError(f"Checksum mismatch for classifier {version}")
+    return joblib.load(artifact_path, mmap_mode="r")
+
+
+# Global classifier instance (lazy-loaded, hot-swapped on publish)
 _classifier: Optional[Pipeline] = None
+_classifier_version: Optional[str] = None
+_last_checked = 0.0
+_load_lock = threading.Lock()
+
+
+def _refresh_classifier() -> None:
+    """Load the current artifact if it differs from the one in memory."""
+    global _classifier, _classifier_version, _last_checked
+
+    with _load_lock:
+        _last_checked = time.monotonic()
+        version = read_current_version()
+        if version is not None and version != _classifier_version:
+            try:
+                _classifier = load_classifier(version)
+                _classifier_version = version
+                _prediction_cache.clear()
+                return
+            except ArtifactError:
+                logger.exception("Ignoring classifier artifact %s", version)
+        if _classifier is None:
+            # No usable artifact published yet: fall back to the keyword model.
+            _classifier = _train_classifier()
+            _classifier_version = BUILTIN_VERSION
 
 
 def get_classifier() -> Pipeline:
-    """Get or create the classifier instance."""
-    global _classifier
-    if _classifier is None:
-        _classifier = _train_classifier()
+    """Get the current classifier, loading or hot-swapping it as needed."""
+    if _classifier is None or time.monotonic() - _last_checked >= RELOAD_INTERVAL:
+        _refresh_classifier()
+    assert _classifier is not None
     return _classifier
 
 
-def predict_category(note: str, amount: Optional[float] = None) -> Optional[int]:
+def get_classifier_version() -> str:
+    """Return the version of the classifier currently in memory."""
+    get_classifier()
+    return _classifier_version or BUILTIN_VERSION
+
+
+def _next_threshold(trained_on: int) -> int:
+    """Labelled-transaction count at which a user's model is next retrained."""
+    for threshold in RETRAIN_THRESHOLDS:
+        if threshold > trained_on:
+            return threshold
+    step = RETRAIN_THRESHOLDS[-1]
+    return (trained_on // step + 1) * step
+
+
+_model_generation = count(1)
+
+
+@dataclass
+class _UserModel:
+    """A user's personal classifier and the data it was trained on."""
+
+    pipeline: Optional[Pipeline]  # None: too little data, use the global model
+    labelled: int  # labelled transactions known for the user
+    trained_on: int  # labelled count when the pipeline was fitted
+    nbytes: int
+    key: str = ""  # unique per trained pipeline, used as prediction cache key
+
+    def __post_init__(self) -> None:
+        if not self.key:
+            self.key = f"user-model-{next(_model_generation)}"
+
+
+class ClassifierRegistry:
+    """
+    Bounded LRU of per-user classifiers.
+
+    Lookups never train inline: a miss returns None (callers fall back to the
+    global model) and schedules a background load. Entries are evicted least
+    recently used first once either the model count or the approximate
+    serialized size exceeds its bound.
+    """
+
+    def __init__(self, max_models: int, max_bytes: int) -> None:
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: OrderedDict[int, _UserModel] = OrderedDict()
+        self._bytes = 0
+        self._pending: set[int] = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    def get(self, user_id: int) -> Optional[Pipeline]:
+        """Return the user's model, or None to use the global model."""
+        entry = self.lookup(user_id)
+        return entry.pipeline if entry is not None else None
+
+    def lookup(self, user_id: int) -> Optional[_UserModel]:
+        """Return the user's registry entry, scheduling a load on a miss."""
+        with self._lock:
+            entry = self._models.get(user_id)
+            if entry is not None:
+                self.hits += 1
+                self._models.move_to_end(user_id)
+                return entry
+            self.misses += 1
+        self._schedule(user_id)
+        return None
+
+    def record_labelled(self, user_id: int, count: int = 1) -> None:
+        """Note new labelled transactions, retraining when a threshold is crossed."""
+        with self._lock:
+            entry = self._models.get(user_id)
+            if entry is not None:
+                entry.labelled += count
+                if entry.labelled < _next_threshold(entry.trained_on):
+                    return
+        self._schedule(user_id)
+
+    def stats(self) -> dict[str, int]:
+        """Return registry counters for monitoring."""
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "pending": len(self._pending),
+            }
+
+    def train(self, user_id: int) -> bool:
+        """
+        Train (or confirm there is too little data for) a user's model now.
+
+        Returns:
+            True if a personal model was trained
+        """
+        rows = queries.user_training_notes(user_id, USER_MODEL_TRAIN_LIMIT)
+
+        labelled = rows[0][2] if rows else 0
+        labels = [row[1] for row in rows]
+        pipeline: Optional[Pipeline] = None
+        nbytes = 0
+        if labelled >= USER_MODEL_MIN_SAMPLES and len(set(labels)) > 1:
+            pipeline = _build_pipeline()
+            pipeline.fit([_preprocess_text(row[0]) for row in rows], labels)
+            nbytes = len(pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL))
+
+        self._store(user_id, _UserModel(pipeline, labelled, labelled, nbytes))
+        return pipeline is not None
+
+    def _store(self, user_id: int, entry: _UserModel) -> None:
+        with self._lock:
+            previous = self._models.pop(user_id, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._models[user_id] = entry
+            self._bytes += entry.nbytes
+            while len(self._models) > 1 and (
+                len(self._models) > self.max_models or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._models.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def _schedule(self, user_id: int) -> None:
+        """Queue a background (re)train unless one is already pending."""
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+            if self._executor is None or self._executor_pid != os.getpid():
+                # Threads do not survive fork; each process gets its own worker.
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="classifier-train"
+                )
+                self._executor_pid = os.getpid()
+            executor = self._executor
+        executor.submit(self._train_in_background, user_id)
+
+    def _train_in_background(self, user_id: int) -> None:
+        try:
+            self.train(user_id)
+        except Exception:
+            logger.exception("Background training failed for user %s", user_id)
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the background training worker."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_registry = ClassifierRegistry(USER_MODEL_MAX_COUNT, USER_MODEL_MAX_BYTES)
+
+
+def get_registry() -> ClassifierRegistry:
+    """Return the process-wide per-user classifier registry."""
+    return _registry
+
+
+def record_labelled_transactions(user_id: int, count: int = 1) -> None:
+    """Tell the registry a user saved ``count`` new transactions with notes."""
+    if count > 0:
+        _registry.record_labelled(user_id, count)
+
+
+def predict_category(
+    note: str, amount: Optional[float] = None, user_id: Optional[int] = None
+) -> Optional[int]:
     """
     Predict category ID from transaction note using NLP.
 
     Args:
         note: Transaction note/description
         amount: Optional amount (not used currently, but can be extended)
+        user_id: Use this user's personal model when one is loaded
 
     Returns:
         Predicted category_id or None if prediction fails
     """
     if not note or not note.strip():
         return None
+    return predict_categories([note], user_id=user_id)[0]
+
+
+def _resolve_model(user_id: Optional[int]) -> tuple[Pipeline, str]:
+    """Pick the user's model if loaded, else the global one, with its cache key."""
+    entry = _registry.lookup(user_id) if user_id is not None else None
+    if entry is not None and entry.pipeline is not None:
+        return entry.pipeline, entry.key
+    clf = get_classifier()
+    return clf, f"global-{_classifier_version}"
+
+
+def predict_categories(notes: list[str], user_id: Optional[int] = None) -> list[Optional[int]]:
+    """
+    Predict category IDs for many notes with a single vectorized call.
+
+    Normalized notes are memoized per model version, and repeated notes in
+    one batch are only classified once.
+
+    Args:
+        notes: Transaction notes/descriptions
+        user_id: Use this user's personal model when one is loaded
+
+    Returns:
+        One predicted category_id per note, None for empty notes or if
+        prediction fails
+    """
+    results: list[Optional[int]] = [None] * len(notes)
+    processed = [_preprocess_text(note) for note in notes]
+    if not any(processed):
+        return results
 
     try:
-        processed = _preprocess_text(note)
-        if not processed:
-            return None
+        clf, model_key = _resolve_model(user_id)
+        pending: dict[str, list[int]] = {}
+        for i, text in enumerate(processed):
+            if not text:
+                continue
+            cached = _prediction_cache.get((model_key, text))
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(text, []).append(i)
 
-        clf = get_classifier()
-        predicted = clf.predict([processed])[0]
-        return int(predicted)
+        if pending:
+            texts = list(pending)
+            with timed("classifier"):
+                predicted = clf.predict(texts)
+            for text, category_id in zip(texts, predicted):
+                category_id = int(category_id)
+                _prediction_cache.put((model_key, text), category_id)
+                for i in pending[text]:
+                    results[i] = category_id
     except Exception:
-        return None
+        return [None] * len(notes)
+    return results
 
 
 def train_from_user_data(user_id: int) -> bool:
     """
-    Retrain classifier using user's historical transaction data.
+    Retrain a user's personal classifier from their transaction history.
+
+    Only that user's predictions change; everyone else keeps the global model.
 
     Args:
         user_id: User ID to fetch transactions from
@@ -100,42 +567,51 @@ def train_from_user_data(user_id: int) -> bool:
     Returns:
         True if retraining succeeded, False otherwise
     """
-    global _classifier
-
-    conn = None
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT t.note, t.category_id
-                FROM transactions t
-                WHERE t.user_id = %s AND t.note IS NOT NULL AND t.note != ''
-                ORDER BY t.tx_date DESC
-                LIMIT 1000;
-                """,
-                (user_id,),
-            )
-            rows = cur.fetchall()
-
-        if len(rows) < 10:
-            return False
-
-        texts = [_preprocess_text(row[0]) for row in rows]
-        labels = [row[1] for row in rows]
-
-        pipeline = Pipeline(
-            [
-                ("tfidf", TfidfVectorizer(max_features=100, ngram_range=(1, 2))),
-                ("nb", MultinomialNB(alpha=0.1)),
-            ]
-        )
-        pipeline.fit(texts, labels)
-        _classifier = pipeline
-        return True
+        return _registry.train(user_id)
     except Exception:
         return False
-    finally:
-        if conn is not None:
-            conn.close()
+
+
+def _fetch_labelled_notes(limit: int) -> list[tuple[str, int]]:
+    """Fetch the most recent labelled notes across all users."""
+    return queries.labelled_notes(limit)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Command-line entry point for training and publishing classifiers."""
+    parser = argparse.ArgumentParser(description="Manage published category classifiers.")
+    parser.add_argument("--model-dir", default=None, help="artifact directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="train and publish a new version")
+    publish.add_argument(
+        "--from-db",
+        action="store_true",
+        help="add recent labelled transactions from the database to the keyword seed data",
+    )
+    publish.add_argument("--limit", type=int, default=50000, help="max transactions to train on")
+    commands.add_parser("current", help="print the currently published version")
+    args = parser.parse_args(argv)
+
+    if args.command == "current":
+        print(read_current_version(args.model_dir) or "(none published)")
+        return 0
+
+    texts, labels = _build_training_data()
+    source = "keywords"
+    if args.from_db:
+        rows = _fetch_labelled_notes(args.limit)
+        texts += [_preprocess_text(row[0]) for row in rows]
+        labels += [row[1] for row in rows]
+        source = f"keywords+db({len(rows)})"
+
+    pipeline = _build_pipeline()
+    pipeline.fit(texts, labels)
+    version = publish_classifier(pipeline, args.model_dir, source=source, n_samples=len(texts))
+    print(f"Published classifier {version} ({len(texts)} samples, {source})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
 
@@ -0,0 +1,188 @@
+"""Manage the monthly partitions of ``transactions``.
+
+``transactions`` is range-partitioned by month on ``tx_date`` (see
+schema.sql / migrations/007_partition_transactions.sql)::
+
+    python partitions.py ensure [--ahead 3]
+    python partitions.py list
+    python partitions.py detach --older-than 24 [--drop] [--dry-run]
+
+Run ``ensure`` daily (e.g. from cron) so future months always have a
+partition; rows that land in the default partition meanwhile are moved out
+the next time it runs. ``detach`` removes whole months older than the
+cutoff: each partition is detached (kept as ``archived_<name>``) or dropped,
+together with the month's rollup rows and the affected users' stored
+forecasts, so reports stay consistent with the transactions that remain.
+"""
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from db import connection
+from forecasting import month_from_number, month_number
+
+DEFAULT_AHEAD = 3
+_BOUNDS = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+@dataclass(frozen=True)
+class Partition:
+    """One attached partition; ``start``/``end`` are None for the default."""
+
+    name: str
+    start: Optional[date]
+    end: Optional[date]
+    rows: int
+    size_bytes: int
+
+
+def ensure(months_ahead: int = DEFAULT_AHEAD) -> int:
+    """Create missing partitions through ``months_ahead`` months from now.
+
+    Returns:
+        Number of partitions created.
+    """
+
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT ensure_transaction_partitions(%s)", (months_ahead,))
+            row = cur.fetchone()
+            return row[0] if row else 0
+
+
+def list_partitions() -> list[Partition]:
+    """Return attached partitions, oldest first, the default partition last.
+
+    Row counts are the planner's estimates (current as of the last ANALYZE).
+    """
+
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT
+                c.relname,
+                pg_get_expr(c.relpartbound, c.oid),
+                GREATEST(c.reltuples, 0)::bigint,
+                pg_total_relation_size(c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'transactions'::regclass;
+            """
+        )
+        partitions = []
+        for name, bound, rows, size in cur.fetchall():
+            match = _BOUNDS.search(bound)
+            start, end = (
+                (date.fromisoformat(match.group(1)), date.fromisoformat(match.group(2)))
+                if match
+                else (None, None)
+            )
+            partitions.append(Partition(name, start, end, rows, size))
+    return sorted(partitions, key=lambda p: (p.start is None, p.start or date.min))
+
+
+def detach_older_than(cutoff: date, drop: bool = False, dry_run: bool = False) -> list[str]:
+    """Remove every month that ends on or before ``cutoff``.
+
+    Each partition is detached in its own transaction together with the
+    rollup rows of its month, and the stored forecasts of users who had
+    rows there. Older rows still in the default partition are deleted
+    through the parent table, so the rollup triggers account for them.
+
+    Args:
+        cutoff: First day of the oldest month to keep.
+        drop: Drop detached partitions instead of keeping them as tables.
+        dry_run: Only report what would be removed.
+
+    Returns:
+        Names of the partitions detached (or that would be).
+    """
+
+    old = [p for p in list_partitions() if p.end is not None and p.end <= cutoff]
+    if dry_run:
+        return [p.name for p in old]
+
+    for partition in old:
+        with connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(f'ALTER TABLE transactions DETACH PARTITION "{partition.name}"')
+                cur.execute(
+                    """
+                    WITH removed AS (
+                        DELETE FROM user_month_category_totals
+                        WHERE month_start >= %s AND month_start < %s
+                        RETURNING user_id
+                    )
+                    DELETE FROM forecasts
+                    WHERE user_id IN (SELECT user_id FROM removed);
+                    """,
+                    (partition.start, partition.end),
+                )
+                if drop:
+                    cur.execute(f'DROP TABLE "{partition.name}"')
+                else:
+                    # Free the name so ensure() can recreate the month if needed.
+                    cur.execute(
+                        f'ALTER TABLE "{partition.name}" RENAME TO "archived_{partition.name}"'
+                    )
+
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM transactions WHERE tx_date < %s", (cutoff,))
+    return [p.name for p in old]
+
+
+def _cutoff(months: int) -> date:
+    return month_from_number(month_number(date.today()) - months)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point."""
+
+    parser = argparse.ArgumentParser(description="Manage transaction partitions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure_cmd = commands.add_parser("ensure", help="create upcoming monthly partitions")
+    ensure_cmd.add_argument(
+        "--ahead",
+        type=int,
+        default=DEFAULT_AHEAD,
+        help=f"months ahead of the current one (default: {DEFAULT_AHEAD})",
+    )
+    commands.add_parser("list", help="show partitions with row estimates and sizes")
+    detach_cmd = commands.add_parser("detach", help="remove months older than a cutoff")
+    detach_cmd.add_argument(
+        "--older-than",
+        type=int,
+        required=True,
+        metavar="MONTHS",
+        help="keep the current month and this many before it",
+    )
+    detach_cmd.add_argument("--drop", action="store_true", help="drop instead of keeping tables")
+    detach_cmd.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "ensure":
+        print(f"Created {ensure(args.ahead)} partition(s)")
+        return 0
+
+    if args.command == "list":
+        for p in list_partitions():
+            bounds = f"{p.start:%Y-%m}" if p.start else "default"
+            print(f"{p.name:<28} {bounds:<8} ~{p.rows:>10} rows {p.size_bytes / 1024 / 1024:>9.1f} MB")
+        return 0
+
+    if args.older_than < 1:
+        parser.error("--older-than must be at least 1")
+    cutoff = _cutoff(args.older_than)
+    names = detach_older_than(cutoff, args.drop, args.dry_run)
+    verb = "Would remove" if args.dry_run else ("Dropped" if args.drop else "Detached")
+    print(f"{verb} {len(names)} partition(s) before {cutoff:%Y-%m}: {', '.join(names) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,513 @@
+"""Request parsing and response payloads shared by the WSGI and ASGI apps.
+
+Nothing here touches the database or a web framework: query parameters come
+in as a plain mapping and rows as tuples, so :mod:`app` (Flask, psycopg2)
+and :mod:`asgi_app` (Starlette, asyncpg) build identical responses. SQL is
+written with a ``placeholder`` callable because the two drivers spell bind
+parameters differently (``%s`` and ``$1``).
+"""
+
+import base64
+import re
+from collections.abc import Callable, Mapping, Sequence
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+import numpy as np
+
+from forecasting import (
+    LINEAR_WINDOW,
+    MODELS,
+    Forecast,
+    fit,
+    month_from_number,
+    month_number,
+    monthly_matrix,
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FORECAST_MAX_HORIZON = 24
+BUDGET_MAX_MONTHS = 36
+ANALYTICS_GRANULARITIES = ("day", "week", "month", "year")
+ANALYTICS_GROUPS = ("category", "type")
+_MONTH = re.compile(r"\d{4}-\d{2}")
+# How /report/analytics labels a period; weeks start on Monday.
+_PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+# Maps a 1-based parameter position to the driver's bind marker.
+Placeholder = Callable[[int], str]
+
+
+def psycopg_placeholder(_: int) -> str:
+    return "%s"
+
+
+def asyncpg_placeholder(position: int) -> str:
+    return f"${position}"
+
+
+def to_float(value: Decimal | float | None) -> float | None:
+    """Convert Decimal to float for JSON payloads."""
+
+    if value is None:
+        return None
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def int_arg(args: Mapping[str, str], name: str, default: int) -> int:
+    """Read an integer query parameter, falling back to ``default`` when malformed."""
+
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def float_arg(args: Mapping[str, str], name: str, default: float) -> float:
+    """Read a float query parameter, falling back to ``default`` when malformed."""
+
+    try:
+        return float(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_date(value: str | None) -> date | None:
+    """Parse an optional YYYY-MM-DD query parameter."""
+
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD") from None
+
+
+def parse_month(value: str) -> date:
+    """Parse a YYYY-MM month into its first day.
+
+    Strict about the format (``2026-1`` is rejected), since budgets store
+    the month as text and are matched on it exactly.
+    """
+
+    try:
+        if not _MONTH.fullmatch(value):
+            raise ValueError
+        return datetime.strptime(value, "%Y-%m").date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM") from None
+
+
+def month_labels(first_month: date, last_month: date) -> list[str]:
+    """Return the YYYY-MM labels of every month from ``first_month`` through ``last_month``."""
+
+    first = month_number(first_month)
+    return [
+        month_from_number(first + i).strftime("%Y-%m")
+        for i in range(month_number(last_month) - first + 1)
+    ]
+
+
+def encode_cursor(tx_date: date, tx_id: int) -> str:
+    """Encode a transaction's keyset position as an opaque cursor."""
+
+    raw = f"{tx_date.isoformat()}|{tx_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    """Decode a cursor produced by :func:`encode_cursor`."""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        tx_date, tx_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return date.fromisoformat(tx_date), int(tx_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor") from None
+
+
+def transaction_filters(
+    args: Mapping[str, str], user_id: int, placeholder: Placeholder = psycopg_placeholder
+) -> tuple[list[str], list[Any]]:
+    """Build WHERE conditions from the from/to/category_id query parameters.
+
+    Raises ValueError for malformed parameters.
+    """
+
+    params: list[Any] = []
+
+    def bind(value: Any) -> str:
+        params.append(value)
+        return placeholder(len(params))
+
+    conditions = [f"user_id = {bind(user_id)}"]
+    date_from = parse_date(args.get("from"))
+    if date_from:
+        conditions.append(f"tx_date >= {bind(date_from)}")
+    date_to = parse_date(args.get("to"))
+    if date_to:
+        conditions.append(f"tx_date <= {bind(date_to)}")
+
+    category_id = args.get("category_id")
+    if category_id:
+        if not category_id.isdigit():
+            raise ValueError("category_id must be an integer")
+        conditions.append(f"category_id = {bind(int(category_id))}")
+    return conditions, params
+
+
+def transaction_page_query(
+    args: Mapping[str, str], user_id: int, placeholder: Placeholder = psycopg_placeholder
+) -> tuple[str, list[Any], int]:
+    """Build the keyset-paginated ``GET /transactions`` query.
+
+    One row more than the page size is fetched to tell whether another page
+    follows; pass the rows to :func:`transaction_page`.
+
+    Returns:
+        ``(sql, params, limit)``.
+
+    Raises:
+        ValueError: Malformed filters or cursor.
+    """
+
+    limit = max(1, min(int_arg(args, "limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    conditions, params = transaction_filters(args, user_id, placeholder)
+    after = args.get("after")
+    if after:
+        cursor_date, cursor_id = decode_cursor(after)
+        params.extend([cursor_date, cursor_date, cursor_id])
+        first = len(params) - 2
+        # The plain tx_date bound lets the planner skip newer partitions.
+        conditions.append(
+            f"tx_date <= {placeholder(first)} "
+            f"AND (tx_date, tx_id) < ({placeholder(first + 1)}, {placeholder(first + 2)})"
+        )
+    params.append(limit + 1)
+    sql = f"""
+        SELECT tx_id, category_id, amount, note, tx_date
+        FROM transactions
+        WHERE {" AND ".join(conditions)}
+        ORDER BY tx_date DESC, tx_id DESC
+        LIMIT {placeholder(len(params))};
+    """
+    return sql, params, limit
+
+
+def transaction_payload(row: Sequence[Any]) -> dict[str, Any]:
+    """Serialize a (tx_id, category_id, amount, note, tx_date) row."""
+
+    return {
+        "tx_id": row[0],
+        "category_id": row[1],
+        "amount": to_float(row[2]),
+        "note": row[3],
+        "tx_date": row[4].isoformat() if row[4] else None,
+    }
+
+
+def transaction_page(rows: Sequence[Sequence[Any]], limit: int) -> dict[str, Any]:
+    """Build the ``GET /transactions`` response from up to ``limit + 1`` rows."""
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[4], last[0])
+    return {"items": [transaction_payload(row) for row in rows], "next_cursor": next_cursor}
+
+
+def budget_payload(row: Sequence[Any]) -> dict[str, Any]:
+    """Serialize a (category_id, category, limit_amount, spent) budget row."""
+
+    limit_amount = to_float(row[2]) or 0.0
+    spent = to_float(row[3]) or 0.0
+    used_percent = round((spent / limit_amount) * 100, 2) if limit_amount else 0.0
+    return {
+        "category_id": row[0],
+        "category": row[1],
+        "limit_amount": limit_amount,
+        "spent": spent,
+        "used_percent": used_percent,
+    }
+
+
+def budget_months(args: Mapping[str, str], today: date) -> Optional[tuple[date, date]]:
+    """Parse the month range of a multi-month ``/budget/status`` request.
+
+    ``from``/``to`` are YYYY-MM months, ``to`` defaulting to the current
+    one; ``last=N`` means the N months ending with ``to``.
+
+    Returns:
+        The first days of the first and last month, or None when the request
+        names no range (a single ``month`` or nothing).
+
+    Raises:
+        ValueError: Malformed months or a range outside 1-BUDGET_MAX_MONTHS.
+    """
+
+    if args.get("month") or not (args.get("from") or args.get("last")):
+        return None
+    if args.get("from") and args.get("last"):
+        raise ValueError("Use either from or last, not both")
+    last = month_number(parse_month(args["to"]) if args.get("to") else today.replace(day=1))
+    if args.get("last"):
+        count = int_arg(args, "last", 0)
+        if not 1 <= count <= BUDGET_MAX_MONTHS:
+            raise ValueError(f"last must be between 1 and {BUDGET_MAX_MONTHS}")
+        first = last - count + 1
+    else:
+        first = month_number(parse_month(args["from"]))
+        if first > last:
+            raise ValueError("from must not be after to")
+        if last - first >= BUDGET_MAX_MONTHS:
+            raise ValueError(f"A range can cover at most {BUDGET_MAX_MONTHS} months")
+    return month_from_number(first), month_from_number(last)
+
+
+def budget_history_payload(
+    rows: Sequence[Sequence[Any]], first_month: date, last_month: date
+) -> dict[str, Any]:
+    """Group (YYYY-MM, category_id, category, limit_amount, spent) rows by month.
+
+    Every month of the range is listed, with an empty ``budgets`` list when
+    the user set no budget for it.
+    """
+
+    months: dict[str, list[dict[str, Any]]] = {
+        month: [] for month in month_labels(first_month, last_month)
+    }
+    for row in rows:
+        months[row[0]].append(budget_payload(row[1:]))
+    return {
+        "from": first_month.strftime("%Y-%m"),
+        "to": last_month.strftime("%Y-%m"),
+        "months": [{"month": month, "budgets": budgets} for month, budgets in months.items()],
+    }
+
+
+def forecast_payload(rows: Sequence[Sequence[Any]], first_month: date) -> dict[str, Any]:
+    """Linear one-month forecast from (YYYY-MM, total) rows, as ``/predict`` returns it.
+
+    ``first_month`` is the user's first month with data, so empty months
+    between it and the rows count as zero spending.
+    """
+
+    months = [datetime.strptime(row[0], "%Y-%m").date() for row in rows]
+    first, matrix = monthly_matrix(
+        months, [0] * len(rows), [row[1] for row in rows], 1, LINEAR_WINDOW, first_month
+    )
+    forecast = fit("linear", matrix).forecast(1)
+    return {
+        "months": [
+            month_from_number(first + i).strftime("%Y-%m") for i in range(matrix.shape[1])
+        ],
+        "predicted_next": round(float(forecast.point[0, 0]), 2),
+    }
+
+
+def analytics_options(
+    args: Mapping[str, str],
+) -> tuple[str, str, Optional[date], Optional[date]]:
+    """Parse ``/report/analytics`` query parameters.
+
+    Returns:
+        ``(granularity, group_by, date_from, date_to)``.
+
+    Raises:
+        ValueError: A parameter is malformed or out of range.
+    """
+
+    granularity = args.get("granularity", "month")
+    group_by = args.get("group_by", "category")
+    if granularity not in ANALYTICS_GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(ANALYTICS_GRANULARITIES)}")
+    if group_by not in ANALYTICS_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(ANALYTICS_GROUPS)}")
+    date_from = parse_date(args.get("from"))
+    date_to = parse_date(args.get("to"))
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("from must not be after to")
+    return granularity, group_by, date_from, date_to
+
+
+def _cashflow(income: Decimal, expense: Decimal) -> dict[str, float]:
+    # The query coalesces both sums to 0, so neither is ever None.
+    return {
+        "income": float(income),
+        "expense": float(expense),
+        "net": float(income - expense),
+    }
+
+
+def analytics_payload(
+    rows: Sequence[Sequence[Any]],
+    granularity: str,
+    group_by: str,
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> dict[str, Any]:
+    """Build the ``/report/analytics`` response from grouping-set rows.
+
+    ``rows`` are ``(period, category_id, category, type, income, expense,
+    all_periods, all_groups)``, ordered with the per-period cells first and
+    the grand total last, as :func:`queries.analytics` returns them.
+    """
+
+    def group(row: Sequence[Any]) -> dict[str, Any]:
+        key = {"category_id": row[1], "category": row[2]} if group_by == "category" else {}
+        return {**key, "type": row[3], **_cashflow(row[4], row[5])}
+
+    periods: dict[date, dict[str, Any]] = {}
+    groups = []
+    total = _cashflow(Decimal(0), Decimal(0))
+    for row in rows:
+        all_periods, all_groups = row[6], row[7]
+        if all_periods and all_groups:
+            total = _cashflow(row[4], row[5])
+        elif all_periods:
+            groups.append(group(row))
+        else:
+            period = periods.setdefault(
+                row[0], {"period": row[0].strftime(_PERIOD_FORMATS[granularity]), "groups": []}
+            )
+            if all_groups:
+                period.update(_cashflow(row[4], row[5]))
+            else:
+                period["groups"].append(group(row))
+
+    return {
+        "granularity": granularity,
+        "group_by": group_by,
+        "from": date_from.isoformat() if date_from else None,
+        "to": date_to.isoformat() if date_to else None,
+        "periods": list(periods.values()),
+        "groups": groups,
+        "total": total,
+    }
+
+
+def predict_options(args: Mapping[str, str]) -> tuple[str, int, float, bool]:
+    """Parse ``/predict`` query parameters.
+
+    Returns:
+        ``(model, horizon, interval, by_category)``.
+
+    Raises:
+        ValueError: A parameter is out of range.
+    """
+
+    model = args.get("model", "linear")
+    horizon = int_arg(args, "horizon", 1)
+    interval = float_arg(args, "interval", 0.95)
+    by_category = args.get("by_category", "").lower() in ("1", "true", "yes")
+    if model not in MODELS:
+        raise ValueError(f"model must be one of: {', '.join(MODELS)}")
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {FORECAST_MAX_HORIZON}")
+    if not 0 < interval < 1:
+        raise ValueError("interval must be between 0 and 1")
+    return model, horizon, interval, by_category
+
+
+def fit_history(
+    rows: Sequence[Sequence[Any]], model: str, history: int
+) -> Optional[dict[str, Any]]:
+    """Fit ``model`` to a user's total and per-category monthly series.
+
+    Args:
+        rows: ``(month_start, category_id, category, total, first_month)``
+            rollup rows covering the last ``history`` months.
+        model: One of the forecasting models.
+        history: Months of history the rows cover.
+
+    Returns:
+        ``{"first_month", "n_months", "categories", "model"}``, where row 0 of
+        the fitted model is the total across categories and row ``i + 1`` is
+        ``categories[i]``; None without rows.
+    """
+
+    if not rows:
+        return None
+    categories = sorted({(row[1], row[2]) for row in rows})
+    position = {category_id: i for i, (category_id, _) in enumerate(categories)}
+    first, matrix = monthly_matrix(
+        [row[0] for row in rows],
+        [position[row[1]] for row in rows],
+        [row[3] for row in rows],
+        len(categories),
+        history,
+        rows[0][4],
+    )
+    return {
+        "first_month": first,
+        "n_months": matrix.shape[1],
+        "categories": categories,
+        "model": fit(model, np.vstack([matrix.sum(axis=0), matrix])),
+    }
+
+
+def stored_forecast(row: Sequence[Any]) -> tuple[int, int, Forecast]:
+    """Unpack a ``(first_month, n_months, point, lower, upper)`` forecasts row.
+
+    Returns:
+        ``(first_month_number, n_months, forecast)``.
+    """
+
+    first_month, n_months, point, lower, upper = row
+    forecast = Forecast(
+        point=np.array([point], dtype=float),
+        lower=np.array([lower], dtype=float),
+        upper=np.array([upper], dtype=float),
+    )
+    return month_number(first_month), n_months, forecast
+
+
+def forecast_rows(forecast: Forecast, row: int, first_month: int) -> list[dict[str, Any]]:
+    """Serialize one series of a forecast, labelling each step with its month."""
+
+    return [
+        {
+            "month": month_from_number(first_month + step).strftime("%Y-%m"),
+            "predicted": round(float(forecast.point[row, step]), 2),
+            "lower": round(float(forecast.lower[row, step]), 2),
+            "upper": round(float(forecast.upper[row, step]), 2),
+        }
+        for step in range(forecast.point.shape[1])
+    ]
+
+
+def predict_payload(
+    model: str, interval: float, first: int, n_months: int, forecast: Forecast
+) -> dict[str, Any]:
+    """Build the ``/predict`` response for row 0 (the total) of a forecast."""
+
+    return {
+        "months": [month_from_number(first + i).strftime("%Y-%m") for i in range(n_months)],
+        "predicted_next": round(float(forecast.point[0, 0]), 2),
+        "model": model,
+        "interval": interval,
+        "forecast": forecast_rows(forecast, 0, first + n_months),
+    }
+
+
+def fitted_predict_payload(
+    fitted: dict[str, Any], model: str, horizon: int, interval: float, by_category: bool
+) -> dict[str, Any]:
+    """Build the ``/predict`` response from a :func:`fit_history` result."""
+
+    first, n_months = fitted["first_month"], fitted["n_months"]
+    forecast = fitted["model"].forecast(horizon, interval)
+    payload = predict_payload(model, interval, first, n_months, forecast)
+    if by_category:
+        payload["categories"] = [
+            {
+                "category_id": category_id,
+                "category": name,
+                "forecast": forecast_rows(forecast, i + 1, first + n_months),
+            }
+            for i, (category_id, name) in enumerate(fitted["categories"])
+        ]
+    return payload
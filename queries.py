@@ -0,0 +1,1027 @@
+"""Named SQL statements, prepared once per connection.
+
+Every statement the API and the alert worker run lives here under a name,
+with PostgreSQL's ``$1`` parameters. The first time a pooled connection runs
+a statement it sends ``PREPARE``; after that only ``EXECUTE name (...)``
+travels, so the server skips parsing and reuses the plan. Each execution is
+timed per statement name in :mod:`metrics`
+(``db_statement_duration_seconds``).
+
+Call the function named after a statement, e.g.
+``queries.budget_usage(user_id, month_start)``. Functions check out their own
+connection, or run on ``cur`` when given one, inside the caller's
+transaction. The async app passes ``STATEMENT.sql`` to asyncpg, which
+prepares and caches statements per connection by itself.
+
+Set ``POSTGRES_PREPARE=0`` behind a transaction-mode pooler such as
+PgBouncer, where a later ``EXECUTE`` may reach a server connection that never
+saw the ``PREPARE``; statements then run as plain queries, and the async app
+turns off asyncpg's statement cache.
+
+Maintenance scripts (rollups.py, partitions.py, forecast_batch.py) keep their
+one-off SQL inline.
+
+The plans of these exact statements can be inspected (test_query_plans.sh
+checks them this way)::
+
+    python queries.py list
+    python queries.py explain budget_usage 1 2026-10-01
+    python queries.py explain transactions_page 1 'from=2026-10-01&limit=50'
+    python queries.py explain transactions_export 1 'from=2026-01-01'
+
+Parameters are given as SQL literals (``-`` for NULL), and the plan shown is
+the generic one PostgreSQL settles on for a prepared statement.
+"""
+
+import argparse
+import functools
+import hashlib
+import os
+import re
+import sys
+import textwrap
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from urllib.parse import parse_qsl
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Optional, TypeVar
+
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extensions import cursor as PGCursor
+
+import metrics
+from db import connection
+from payloads import (
+    asyncpg_placeholder,
+    month_labels,
+    transaction_filters,
+    transaction_page_query,
+)
+
+PREPARE_STATEMENTS = os.getenv("POSTGRES_PREPARE", "1").lower() not in ("0", "false", "no")
+
+T = TypeVar("T")
+Row = tuple[Any, ...]
+
+_PARAM = re.compile(r"\$(\d+)")
+
+
+@dataclass(frozen=True)
+class Statement:
+    """A named SQL statement with ``$n`` parameters."""
+
+    name: str
+    sql: str
+    # psycopg2 forms: EXECUTE of the prepared statement, and the plain query
+    # with %s markers plus the argument index behind each marker.
+    execute_sql: str = field(init=False, repr=False)
+    plain_sql: str = field(init=False, repr=False)
+    plain_order: tuple[int, ...] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        positions = [int(n) for n in _PARAM.findall(self.sql)]
+        count = max(positions, default=0)
+        markers = ", ".join(["%s"] * count)
+        object.__setattr__(
+            self, "execute_sql", f"EXECUTE {self.name} ({markers})" if count else f"EXECUTE {self.name}"
+        )
+        object.__setattr__(self, "plain_sql", _PARAM.sub("%s", self.sql.replace("%", "%%")))
+        object.__setattr__(self, "plain_order", tuple(n - 1 for n in positions))
+
+
+STATEMENTS: dict[str, Statement] = {}
+
+
+def _statement(name: str, sql: str) -> Statement:
+    statement = Statement(name, textwrap.dedent(sql).strip())
+    STATEMENTS[name] = statement
+    return statement
+
+
+# Names prepared on each live connection; entries vanish with the connection.
+_prepared: "weakref.WeakKeyDictionary[PGConnection, set[str]]" = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def _prepared_names(conn: PGConnection) -> set[str]:
+    with _prepared_lock:
+        names = _prepared.get(conn)
+        if names is None:
+            names = _prepared[conn] = set()
+        return names
+
+
+def execute(cur: PGCursor, statement: Statement, *args: Any) -> None:
+    """Run ``statement`` on ``cur``, preparing it on the connection first if needed."""
+
+    started = time.perf_counter()
+    if PREPARE_STATEMENTS:
+        names = _prepared_names(cur.connection)
+        if statement.name not in names:
+            cur.execute(f"PREPARE {statement.name} AS {statement.sql}")
+            names.add(statement.name)
+            metrics.record_prepare(statement.name)
+        cur.execute(statement.execute_sql, args)
+    else:
+        cur.execute(statement.plain_sql, [args[i] for i in statement.plain_order])
+    metrics.record_statement(statement.name, time.perf_counter() - started)
+
+
+def _run(
+    statement: Statement, args: Sequence[Any], cur: Optional[PGCursor], result: Callable[[PGCursor], T]
+) -> T:
+    if cur is not None:
+        execute(cur, statement, *args)
+        return result(cur)
+    with connection() as conn:
+        with conn, conn.cursor() as own:
+            execute(own, statement, *args)
+            return result(own)
+
+
+def _all(cur: PGCursor) -> list[Row]:
+    return cur.fetchall()
+
+
+def _one(cur: PGCursor) -> Optional[Row]:
+    return cur.fetchone()
+
+
+def _none(cur: PGCursor) -> None:
+    return None
+
+
+# Users
+
+CREATE_USER = _statement(
+    "create_user",
+    """
+    INSERT INTO users (username, email, password_hash)
+    VALUES ($1, $2, $3)
+    RETURNING user_id;
+    """,
+)
+
+USER_CREDENTIALS = _statement(
+    "user_credentials",
+    "SELECT user_id, password_hash FROM users WHERE username = $1;",
+)
+
+UPDATE_PASSWORD_HASH = _statement(
+    "update_password_hash",
+    "UPDATE users SET password_hash = $1 WHERE user_id = $2 AND password_hash = $3;",
+)
+
+USER_EMAIL = _statement("user_email", "SELECT email FROM users WHERE user_id = $1;")
+
+
+def create_user(
+    username: str, email: Optional[str], password_hash: str, cur: Optional[PGCursor] = None
+) -> Optional[Row]:
+    """Insert a user; returns ``(user_id,)``."""
+
+    return _run(CREATE_USER, (username, email, password_hash), cur, _one)
+
+
+def user_credentials(username: str, cur: Optional[PGCursor] = None) -> Optional[Row]:
+    """Return ``(user_id, password_hash)`` for a username."""
+
+    return _run(USER_CREDENTIALS, (username,), cur, _one)
+
+
+def update_password_hash(
+    user_id: int, old_hash: str, new_hash: str, cur: Optional[PGCursor] = None
+) -> None:
+    """Replace a password hash unless it changed since it was read."""
+
+    _run(UPDATE_PASSWORD_HASH, (new_hash, user_id, old_hash), cur, _none)
+
+
+def user_email(user_id: int, cur: Optional[PGCursor] = None) -> Optional[str]:
+    """Return a user's email address."""
+
+    row = _run(USER_EMAIL, (user_id,), cur, _one)
+    return row[0] if row else None
+
+
+# Transactions
+
+INSERT_TRANSACTION = _statement(
+    "insert_transaction",
+    """
+    INSERT INTO transactions (user_id, category_id, amount, note)
+    VALUES ($1, $2, $3, $4)
+    RETURNING tx_id, tx_date;
+    """,
+)
+
+# One statement for any batch size: rows arrive as parallel arrays.
+INSERT_TRANSACTIONS = _statement(
+    "insert_transactions",
+    """
+    INSERT INTO transactions (user_id, category_id, amount, note, tx_date)
+    SELECT $1, t.category_id, t.amount, t.note, COALESCE(t.tx_date, CURRENT_DATE)
+    FROM UNNEST($2::int[], $3::numeric[], $4::text[], $5::date[])
+        AS t(category_id, amount, note, tx_date)
+    RETURNING tx_id, tx_date;
+    """,
+)
+
+CATEGORY_IDS = _statement("category_ids", "SELECT category_id FROM categories;")
+
+
+def insert_transaction(
+    user_id: int, category_id: int, amount: Any, note: str, cur: Optional[PGCursor] = None
+) -> Optional[Row]:
+    """Insert one transaction dated today; returns ``(tx_id, tx_date)``."""
+
+    return _run(INSERT_TRANSACTION, (user_id, category_id, amount, note), cur, _one)
+
+
+def insert_transactions(
+    user_id: int,
+    rows: Sequence[tuple[int, Decimal, str, Optional[date]]],
+    cur: Optional[PGCursor] = None,
+) -> list[Row]:
+    """Insert ``(category_id, amount, note, tx_date)`` rows in one statement.
+
+    A None ``tx_date`` means today. Returns ``(tx_id, tx_date)`` per row, in
+    input order.
+    """
+
+    columns = [list(column) for column in zip(*rows)] or [[], [], [], []]
+    return _run(INSERT_TRANSACTIONS, (user_id, *columns), cur, _all)
+
+
+def category_ids(cur: Optional[PGCursor] = None) -> set[int]:
+    """Return every known category id."""
+
+    return {row[0] for row in _run(CATEGORY_IDS, (), cur, _all)}
+
+
+@functools.lru_cache(maxsize=64)
+def _shaped_statement(prefix: str, sql: str) -> Statement:
+    # Filters change the SQL; each shape is its own prepared statement.
+    return Statement(f"{prefix}_{hashlib.sha1(sql.encode()).hexdigest()[:10]}", sql)
+
+
+def transaction_page_statement(
+    args: Mapping[str, str], user_id: int
+) -> tuple[Statement, list[Any], int]:
+    """Build the ``GET /transactions`` statement for the query parameters ``args``.
+
+    Returns:
+        ``(statement, params, limit)``.
+
+    Raises:
+        ValueError: Malformed filters or cursor.
+    """
+
+    sql, params, limit = transaction_page_query(args, user_id, asyncpg_placeholder)
+    return _shaped_statement("transactions_page", textwrap.dedent(sql).strip()), params, limit
+
+
+def transaction_page(
+    args: Mapping[str, str], user_id: int, cur: Optional[PGCursor] = None
+) -> tuple[list[Row], int]:
+    """Fetch one ``GET /transactions`` page for the query parameters ``args``.
+
+    Returns:
+        ``(rows, limit)`` for :func:`payloads.transaction_page`.
+
+    Raises:
+        ValueError: Malformed filters or cursor.
+    """
+
+    statement, params, limit = transaction_page_statement(args, user_id)
+    return _run(statement, params, cur, _all), limit
+
+
+def transaction_export_statement(
+    args: Mapping[str, str], user_id: int
+) -> tuple[Statement, list[Any]]:
+    """Build the ``GET /transactions/export`` statement for the query parameters ``args``.
+
+    Returns:
+        ``(statement, params)``; rows are ``(tx_id, category_id, amount,
+        note, tx_date)`` oldest first.
+
+    Raises:
+        ValueError: Malformed filters.
+    """
+
+    conditions, params = transaction_filters(args, user_id, asyncpg_placeholder)
+    sql = "\n".join(
+        [
+            "SELECT tx_id, category_id, amount, note, tx_date",
+            "FROM transactions",
+            "WHERE " + "\n  AND ".join(conditions),
+            "ORDER BY tx_date, tx_id;",
+        ]
+    )
+    return _shaped_statement("transactions_export", sql), params
+
+
+def stream(statement: Statement, args: Sequence[Any], batch_size: int) -> Iterator[list[Row]]:
+    """Yield the rows of ``statement`` in lists of at most ``batch_size``.
+
+    Rows are read through a server-side cursor, so the result set stays on
+    the server and memory is bounded by the batch size. A cursor cannot be
+    declared over ``EXECUTE``, so the statement always runs as a plain query.
+    The connection is held until the generator is exhausted or closed.
+    """
+
+    with connection() as conn:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = batch_size
+            started = time.perf_counter()
+            cur.execute(statement.plain_sql, [args[i] for i in statement.plain_order])
+            metrics.record_statement(statement.name, time.perf_counter() - started)
+            while batch := list(islice(cur, batch_size)):
+                yield batch
+
+
+# Budgets and reports
+
+# Budgets of one user and month with what was spent against them, from the
+# monthly rollup. $1 is the user, $2 the first day of the month.
+_BUDGET_USAGE_FROM = """
+    FROM budgets b
+    LEFT JOIN user_month_category_totals r
+        ON r.user_id = b.user_id
+        AND r.category_id = b.category_id
+        AND r.month_start = $2::date
+    LEFT JOIN categories c ON c.category_id = b.category_id
+"""
+_BUDGET_USAGE_WHERE = "WHERE b.user_id = $1 AND b.month_year = TO_CHAR($2::date, 'YYYY-MM')"
+
+UPSERT_BUDGET = _statement(
+    "upsert_budget",
+    """
+    INSERT INTO budgets (user_id, category_id, limit_amount, month_year)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id, category_id, month_year)
+    DO UPDATE SET limit_amount = EXCLUDED.limit_amount
+    RETURNING budget_id;
+    """,
+)
+
+BUDGET_USAGE = _statement(
+    "budget_usage",
+    f"""
+    SELECT
+        b.category_id,
+        c.name AS category,
+        b.limit_amount,
+        COALESCE(r.total, 0) AS spent
+    {_BUDGET_USAGE_FROM}
+    {_BUDGET_USAGE_WHERE};
+    """,
+)
+
+# Budgets of one user for every month from $2 through $3 (first days of
+# months), whose YYYY-MM labels are $4; the rollup rows of the range are
+# read once and hash-joined. budgets.month_year is free text, so it is
+# matched exactly rather than compared as a range.
+BUDGET_HISTORY = _statement(
+    "budget_history",
+    """
+    WITH spent AS (
+        SELECT TO_CHAR(month_start, 'YYYY-MM') AS month_year, category_id, total
+        FROM user_month_category_totals
+        WHERE user_id = $1 AND month_start BETWEEN $2::date AND $3::date
+    )
+    SELECT
+        b.month_year,
+        b.category_id,
+        c.name AS category,
+        b.limit_amount,
+        COALESCE(s.total, 0) AS spent
+    FROM budgets b
+    LEFT JOIN spent s
+        ON s.month_year = b.month_year
+        AND s.category_id = b.category_id
+    LEFT JOIN categories c ON c.category_id = b.category_id
+    WHERE b.user_id = $1
+        AND b.month_year = ANY($4::text[])
+    ORDER BY b.month_year, b.category_id;
+    """,
+)
+
+MONTHLY_EXPENSE = _statement(
+    "monthly_expense",
+    """
+    SELECT
+        TO_CHAR(r.month_start, 'YYYY-MM') AS month,
+        SUM(r.total) AS total_expense
+    FROM user_month_category_totals r
+    JOIN categories c ON r.category_id = c.category_id
+    WHERE c.type = 'expense' AND r.user_id = $1
+    GROUP BY r.month_start
+    ORDER BY r.month_start;
+    """,
+)
+
+CATEGORY_EXPENSE = _statement(
+    "category_expense",
+    """
+    SELECT
+        c.name AS category,
+        SUM(r.total) AS total_expense
+    FROM user_month_category_totals r
+    JOIN categories c ON r.category_id = c.category_id
+    WHERE c.type = 'expense' AND r.user_id = $1
+    GROUP BY c.name
+    ORDER BY total_expense DESC;
+    """,
+)
+
+# Cashflow of one user in one pass: $2 is the DATE_TRUNC unit, $3/$4 the
+# inclusive date range (NULL for open-ended) and $5 whether to break groups
+# down by category or only by income/expense type. The grouping sets return
+# the (period, group) cells, the period totals, the group totals and the
+# grand total together; rows from uncategorised transactions are left out,
+# as in the other reports.
+_ANALYTICS = """
+    WITH source AS ({source})
+    SELECT
+        period,
+        category_id,
+        category,
+        type,
+        COALESCE(SUM(amount) FILTER (WHERE type = 'income'), 0) AS income,
+        COALESCE(SUM(amount) FILTER (WHERE type = 'expense'), 0) AS expense,
+        GROUPING(period) AS all_periods,
+        GROUPING(type) AS all_groups
+    FROM source
+    GROUP BY GROUPING SETS (
+        (period, category_id, category, type),
+        (period),
+        (category_id, category, type),
+        ()
+    )
+    ORDER BY all_periods, all_groups, period, type, category_id;
+"""
+
+ANALYTICS_ROLLUP = _statement(
+    "analytics_rollup",
+    _ANALYTICS.format(
+        source="""
+        SELECT
+            DATE_TRUNC($2::text, r.month_start)::date AS period,
+            CASE WHEN $5::boolean THEN r.category_id END AS category_id,
+            CASE WHEN $5::boolean THEN c.name END AS category,
+            c.type,
+            r.total AS amount
+        FROM user_month_category_totals r
+        JOIN categories c ON c.category_id = r.category_id
+        WHERE r.user_id = $1
+            AND r.month_start >= COALESCE($3::date, '-infinity')
+            AND r.month_start <= COALESCE($4::date, 'infinity')
+        """
+    ),
+)
+
+ANALYTICS_TRANSACTIONS = _statement(
+    "analytics_transactions",
+    _ANALYTICS.format(
+        source="""
+        SELECT
+            DATE_TRUNC($2::text, t.tx_date)::date AS period,
+            CASE WHEN $5::boolean THEN t.category_id END AS category_id,
+            CASE WHEN $5::boolean THEN c.name END AS category,
+            c.type,
+            t.amount
+        FROM transactions t
+        JOIN categories c ON c.category_id = t.category_id
+        WHERE t.user_id = $1
+            AND t.tx_date >= COALESCE($3::date, '-infinity')
+            AND t.tx_date <= COALESCE($4::date, 'infinity')
+        """
+    ),
+)
+
+DASHBOARD = _statement(
+    "dashboard",
+    """
+    WITH totals AS (
+        SELECT r.month_start, r.category_id, r.total, c.name, c.type
+        FROM user_month_category_totals r
+        LEFT JOIN categories c ON c.category_id = r.category_id
+        WHERE r.user_id = $1
+    ),
+    monthly AS (
+        SELECT month_start, SUM(total) AS total
+        FROM totals
+        WHERE type = 'expense'
+        GROUP BY month_start
+    ),
+    by_category AS (
+        SELECT name, SUM(total) AS total
+        FROM totals
+        WHERE type = 'expense'
+        GROUP BY name
+    ),
+    budget AS (
+        SELECT b.category_id, c.name, b.limit_amount, COALESCE(t.total, 0) AS spent
+        FROM budgets b
+        LEFT JOIN totals t
+            ON t.category_id = b.category_id
+            AND t.month_start = $2::date
+        LEFT JOIN categories c ON c.category_id = b.category_id
+        WHERE b.user_id = $1 AND b.month_year = TO_CHAR($2::date, 'YYYY-MM')
+    ),
+    recent AS (
+        SELECT month_start, SUM(total) AS total
+        FROM totals
+        WHERE month_start > (SELECT MAX(month_start) FROM totals)
+            - make_interval(months => $3)
+        GROUP BY month_start
+    )
+    SELECT
+        (SELECT COALESCE(json_agg(json_build_array(
+             TO_CHAR(month_start, 'YYYY-MM'), total) ORDER BY month_start), '[]')
+         FROM monthly),
+        (SELECT COALESCE(json_agg(json_build_array(name, total) ORDER BY total DESC), '[]')
+         FROM by_category),
+        (SELECT COALESCE(json_agg(json_build_array(
+             category_id, name, limit_amount, spent) ORDER BY category_id), '[]')
+         FROM budget),
+        (SELECT COALESCE(json_agg(json_build_array(
+             TO_CHAR(month_start, 'YYYY-MM'), total) ORDER BY month_start), '[]')
+         FROM recent),
+        (SELECT MIN(month_start) FROM totals);
+    """,
+)
+
+FORECAST_HISTORY = _statement(
+    "forecast_history",
+    """
+    WITH bounds AS (
+        SELECT MIN(month_start) AS first_month, MAX(month_start) AS last_month
+        FROM user_month_category_totals
+        WHERE user_id = $1
+    )
+    SELECT r.month_start, r.category_id, c.name, r.total, b.first_month
+    FROM bounds b
+    JOIN user_month_category_totals r
+        ON r.user_id = $1
+        AND r.month_start > b.last_month - make_interval(months => $2)
+    LEFT JOIN categories c ON c.category_id = r.category_id;
+    """,
+)
+
+# A batch forecast is current while the user's rollup rows still have the
+# newest update, row count and transaction count it was computed from. The
+# counts catch deletes, which remove rows without touching the others.
+STORED_FORECAST = _statement(
+    "stored_forecast",
+    """
+    SELECT
+        f.first_month,
+        f.n_months,
+        f.point[1:$4],
+        f.lower_bound[1:$4],
+        f.upper_bound[1:$4]
+    FROM forecasts f
+    WHERE f.user_id = $1
+      AND f.model = $2
+      AND f.coverage = $3
+      AND cardinality(f.point) >= $4
+      AND (f.source_updated_at, f.source_rows, f.source_tx_count) = (
+          SELECT MAX(updated_at), COUNT(*), SUM(tx_count)
+          FROM user_month_category_totals
+          WHERE user_id = $1
+      );
+    """,
+)
+
+
+def upsert_budget(
+    user_id: int, category_id: int, limit_amount: Any, month_year: str, cur: Optional[PGCursor] = None
+) -> Optional[Row]:
+    """Create or update a budget; returns ``(budget_id,)``."""
+
+    return _run(UPSERT_BUDGET, (user_id, category_id, limit_amount, month_year), cur, _one)
+
+
+def budget_usage(user_id: int, month_start: date, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return ``(category_id, category, limit_amount, spent)`` per budget of a month."""
+
+    return _run(BUDGET_USAGE, (user_id, month_start), cur, _all)
+
+
+def budget_history(
+    user_id: int, first_month: date, last_month: date, cur: Optional[PGCursor] = None
+) -> list[Row]:
+    """Return ``(YYYY-MM, category_id, category, limit_amount, spent)`` per budget.
+
+    Covers every month from ``first_month`` through ``last_month``, oldest
+    first.
+    """
+
+    return _run(
+        BUDGET_HISTORY,
+        (user_id, first_month, last_month, month_labels(first_month, last_month)),
+        cur,
+        _all,
+    )
+
+
+def monthly_expense(user_id: int, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return ``(YYYY-MM, total)`` expense per month, oldest first."""
+
+    return _run(MONTHLY_EXPENSE, (user_id,), cur, _all)
+
+
+def category_expense(user_id: int, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return ``(category, total)`` expense per category, largest first."""
+
+    return _run(CATEGORY_EXPENSE, (user_id,), cur, _all)
+
+
+def analytics_statement(
+    granularity: str, date_from: Optional[date], date_to: Optional[date]
+) -> Statement:
+    """Pick the cheapest source for a ``/report/analytics`` request.
+
+    Monthly and yearly buckets over whole months come from the rollup;
+    anything finer, or a range that starts or ends mid-month, scans the
+    transactions themselves.
+    """
+
+    whole_months = (date_from is None or date_from.day == 1) and (
+        date_to is None or (date_to + timedelta(days=1)).day == 1
+    )
+    if granularity in ("month", "year") and whole_months:
+        return ANALYTICS_ROLLUP
+    return ANALYTICS_TRANSACTIONS
+
+
+def analytics(
+    user_id: int,
+    granularity: str,
+    group_by: str,
+    date_from: Optional[date],
+    date_to: Optional[date],
+    cur: Optional[PGCursor] = None,
+) -> list[Row]:
+    """Return income and expense per period and group, with subtotals.
+
+    Rows are ``(period, category_id, category, type, income, expense,
+    all_periods, all_groups)``; see :func:`payloads.analytics_payload`.
+    """
+
+    return _run(
+        analytics_statement(granularity, date_from, date_to),
+        (user_id, granularity, date_from, date_to, group_by == "category"),
+        cur,
+        _all,
+    )
+
+
+def dashboard(
+    user_id: int, month_start: date, window: int, cur: Optional[PGCursor] = None
+) -> Optional[Row]:
+    """Return the dashboard's monthly, category, budget and recent-month data in one row."""
+
+    return _run(DASHBOARD, (user_id, month_start, window), cur, _one)
+
+
+def forecast_history(user_id: int, months: int, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return the rollup rows of a user's last ``months`` months, for forecasting."""
+
+    return _run(FORECAST_HISTORY, (user_id, months), cur, _all)
+
+
+def stored_forecast(
+    user_id: int, model: str, coverage: float, horizon: int, cur: Optional[PGCursor] = None
+) -> Optional[Row]:
+    """Return the current batch forecast row covering ``horizon`` months, if any."""
+
+    return _run(STORED_FORECAST, (user_id, model, coverage, horizon), cur, _one)
+
+
+# Budget alerts
+
+ALERT_SETTINGS = _statement(
+    "alert_settings",
+    """
+    SELECT email_enabled, alert_threshold, last_alert_sent
+    FROM email_settings
+    WHERE user_id = $1;
+    """,
+)
+
+UPSERT_ALERT_SETTINGS = _statement(
+    "upsert_alert_settings",
+    """
+    INSERT INTO email_settings (user_id, email_enabled, alert_threshold)
+    VALUES ($1, COALESCE($2::boolean, TRUE), COALESCE($3::numeric, $4::numeric))
+    ON CONFLICT (user_id) DO UPDATE SET
+        email_enabled = COALESCE($2::boolean, email_settings.email_enabled),
+        alert_threshold = COALESCE($3::numeric, email_settings.alert_threshold)
+    RETURNING email_enabled, alert_threshold;
+    """,
+)
+
+BUDGET_ALERT_CANDIDATES = _statement(
+    "budget_alert_candidates",
+    f"""
+    SELECT
+        b.category_id,
+        c.name AS category,
+        b.limit_amount,
+        COALESCE(r.total, 0) AS spent,
+        u.email,
+        COALESCE(s.email_enabled, TRUE) AS email_enabled,
+        COALESCE(s.alert_threshold, $3::numeric) AS alert_threshold,
+        a.user_id IS NOT NULL AS alerted
+    {_BUDGET_USAGE_FROM}
+    JOIN users u ON u.user_id = b.user_id
+    LEFT JOIN email_settings s ON s.user_id = b.user_id
+    LEFT JOIN budget_alert_state a
+        ON a.user_id = b.user_id
+        AND a.category_id = b.category_id
+        AND a.month_year = b.month_year
+    {_BUDGET_USAGE_WHERE};
+    """,
+)
+
+CLEAR_ALERT_STATE = _statement(
+    "clear_alert_state",
+    """
+    DELETE FROM budget_alert_state
+    WHERE user_id = $1 AND month_year = $2 AND category_id = ANY($3::int[]);
+    """,
+)
+
+CLAIM_ALERTS = _statement(
+    "claim_alerts",
+    """
+    INSERT INTO budget_alert_state (user_id, category_id, month_year, used_percent)
+    SELECT $1, category_id, $2, used_percent
+    FROM UNNEST($3::int[], $4::numeric[]) AS c(category_id, used_percent)
+    ON CONFLICT DO NOTHING
+    RETURNING category_id;
+    """,
+)
+
+MARK_ALERT_SENT = _statement(
+    "mark_alert_sent",
+    """
+    INSERT INTO email_settings (user_id, last_alert_sent)
+    VALUES ($1, NOW())
+    ON CONFLICT (user_id) DO UPDATE SET last_alert_sent = EXCLUDED.last_alert_sent;
+    """,
+)
+
+ENQUEUE_ALERT_JOBS = _statement(
+    "enqueue_alert_jobs",
+    """
+    INSERT INTO alert_jobs (user_id, month_year)
+    SELECT $1, month_year FROM UNNEST($2::text[]) AS m(month_year);
+    """,
+)
+
+# Claimed jobs are leased by pushing run_after past the lease rather than
+# kept locked, so no transaction stays open while the emails are sent. A
+# worker that dies mid-batch leaves its jobs to be picked up when the lease
+# runs out.
+CLAIM_ALERT_JOBS = _statement(
+    "claim_alert_jobs",
+    """
+    UPDATE alert_jobs j
+    SET run_after = NOW() + $2::float8 * INTERVAL '1 second'
+    FROM (
+        SELECT job_id
+        FROM alert_jobs
+        WHERE run_after <= NOW()
+        ORDER BY run_after
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE j.job_id = due.job_id
+    RETURNING j.job_id, j.user_id, j.month_year, j.attempts;
+    """,
+)
+
+RETRY_ALERT_JOBS = _statement(
+    "retry_alert_jobs",
+    """
+    UPDATE alert_jobs
+    SET attempts = $1,
+        run_after = NOW() + $2::float8 * INTERVAL '1 second',
+        last_error = $3
+    WHERE job_id = ANY($4::int[]);
+    """,
+)
+
+DELETE_ALERT_JOBS = _statement(
+    "delete_alert_jobs", "DELETE FROM alert_jobs WHERE job_id = ANY($1::int[]);"
+)
+
+
+def alert_settings(user_id: int, cur: Optional[PGCursor] = None) -> Optional[Row]:
+    """Return ``(email_enabled, alert_threshold, last_alert_sent)``, if stored."""
+
+    return _run(ALERT_SETTINGS, (user_id,), cur, _one)
+
+
+def upsert_alert_settings(
+    user_id: int,
+    enabled: Optional[bool],
+    threshold: Optional[Decimal],
+    default_threshold: float,
+    cur: Optional[PGCursor] = None,
+) -> Optional[Row]:
+    """Update the given settings (None keeps the current value); returns the new ones."""
+
+    return _run(UPSERT_ALERT_SETTINGS, (user_id, enabled, threshold, default_threshold), cur, _one)
+
+
+def budget_alert_candidates(
+    user_id: int, month_start: date, default_threshold: float, cur: Optional[PGCursor] = None
+) -> list[Row]:
+    """Return budget usage with the alert settings and state of each budget.
+
+    Rows are ``(category_id, category, limit_amount, spent, email,
+    email_enabled, alert_threshold, alerted)``.
+    """
+
+    return _run(BUDGET_ALERT_CANDIDATES, (user_id, month_start, default_threshold), cur, _all)
+
+
+def clear_alert_state(
+    user_id: int, month_year: str, category_ids: Sequence[int], cur: Optional[PGCursor] = None
+) -> None:
+    """Re-arm alerts for the given categories."""
+
+    _run(CLEAR_ALERT_STATE, (user_id, month_year, list(category_ids)), cur, _none)
+
+
+def claim_alerts(
+    user_id: int,
+    month_year: str,
+    category_ids: Sequence[int],
+    used_percents: Sequence[float],
+    cur: Optional[PGCursor] = None,
+) -> list[int]:
+    """Record alerts as sent; returns the categories not already claimed."""
+
+    rows = _run(
+        CLAIM_ALERTS, (user_id, month_year, list(category_ids), list(used_percents)), cur, _all
+    )
+    return [row[0] for row in rows]
+
+
+def mark_alert_sent(user_id: int, cur: Optional[PGCursor] = None) -> None:
+    """Set the user's ``last_alert_sent`` to now."""
+
+    _run(MARK_ALERT_SENT, (user_id,), cur, _none)
+
+
+def enqueue_alert_jobs(user_id: int, months: Sequence[str], cur: Optional[PGCursor] = None) -> None:
+    """Queue alert evaluations for ``alert_jobs`` workers."""
+
+    _run(ENQUEUE_ALERT_JOBS, (user_id, list(months)), cur, _none)
+
+
+def claim_alert_jobs(limit: int, lease: float, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Lease up to ``limit`` due jobs for ``lease`` seconds.
+
+    Returns ``(job_id, user_id, month_year, attempts)`` rows. Commit before
+    processing them; other workers skip the jobs until the lease runs out.
+    """
+
+    return _run(CLAIM_ALERT_JOBS, (limit, lease), cur, _all)
+
+
+def retry_alert_jobs(
+    job_ids: Sequence[int], attempts: int, delay: float, error: str, cur: Optional[PGCursor] = None
+) -> None:
+    """Reschedule failed jobs ``delay`` seconds from now."""
+
+    _run(RETRY_ALERT_JOBS, (attempts, delay, error, list(job_ids)), cur, _none)
+
+
+def delete_alert_jobs(job_ids: Sequence[int], cur: Optional[PGCursor] = None) -> None:
+    """Remove finished jobs."""
+
+    _run(DELETE_ALERT_JOBS, (list(job_ids),), cur, _none)
+
+
+# Classifier training
+
+USER_TRAINING_NOTES = _statement(
+    "user_training_notes",
+    """
+    SELECT t.note, t.category_id, COUNT(*) OVER () AS labelled
+    FROM transactions t
+    WHERE t.user_id = $1 AND t.note IS NOT NULL AND t.note != ''
+        AND t.category_id IS NOT NULL
+    ORDER BY t.tx_date DESC
+    LIMIT $2;
+    """,
+)
+
+LABELLED_NOTES = _statement(
+    "labelled_notes",
+    """
+    SELECT t.note, t.category_id
+    FROM transactions t
+    WHERE t.note IS NOT NULL AND t.note != '' AND t.category_id IS NOT NULL
+    ORDER BY t.tx_date DESC
+    LIMIT $1;
+    """,
+)
+
+
+def user_training_notes(user_id: int, limit: int, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return a user's latest ``(note, category_id, labelled_total)`` rows."""
+
+    return _run(USER_TRAINING_NOTES, (user_id, limit), cur, _all)
+
+
+def labelled_notes(limit: int, cur: Optional[PGCursor] = None) -> list[Row]:
+    """Return the latest ``(note, category_id)`` rows across all users."""
+
+    return _run(LABELLED_NOTES, (limit,), cur, _all)
+
+
+def explain(
+    statement: Statement, args: Sequence[Any], settings: Sequence[tuple[str, str]] = ()
+) -> list[str]:
+    """Return the generic plan of ``statement`` for ``args``, one line per row.
+
+    The generic plan is the one reused once a statement has run a few times,
+    so partitions are pruned at executor startup ("Subplans Removed") rather
+    than at planning. ``settings`` are applied with ``SET LOCAL`` first.
+    """
+
+    name = f"explain_{statement.name}"
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+            for setting, value in settings:
+                cur.execute("SELECT set_config(%s, %s, true)", (setting, value))
+            cur.execute(f"PREPARE {name} AS {statement.sql}")
+            try:
+                markers = ", ".join(["%s"] * len(args))
+                cur.execute(f"EXPLAIN EXECUTE {name}" + (f" ({markers})" if args else ""), args)
+                return [row[0] for row in cur.fetchall()]
+            finally:
+                cur.execute(f"DEALLOCATE {name}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point for inspecting statements."""
+
+    parser = argparse.ArgumentParser(description="Inspect the API's named statements.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="print statement names and SQL")
+    explain_cmd = commands.add_parser("explain", help="print a statement's generic plan")
+    explain_cmd.add_argument(
+        "name", help="statement name, or transactions_page with USER_ID and a query string"
+    )
+    explain_cmd.add_argument("params", nargs="*", help="parameters as SQL literals, - for NULL")
+    explain_cmd.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="planner setting for the session, e.g. enable_seqscan=off",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for statement in STATEMENTS.values():
+            print(f"-- {statement.name}\n{statement.sql}\n")
+        return 0
+
+    settings = [tuple(item.split("=", 1)) for item in args.set]
+    if args.name in ("transactions_page", "transactions_export"):
+        if len(args.params) != 2:
+            parser.error(f"{args.name} takes USER_ID and a query string")
+        filters, user_id = dict(parse_qsl(args.params[1])), int(args.params[0])
+        if args.name == "transactions_page":
+            statement, params, _ = transaction_page_statement(filters, user_id)
+        else:
+            statement, params = transaction_export_statement(filters, user_id)
+    elif args.name in STATEMENTS:
+        statement = STATEMENTS[args.name]
+        params = [None if value == "-" else value for value in args.params]
+    else:
+        parser.error(f"unknown statement {args.name!r}; see 'python queries.py list'")
+    print("\n".join(explain(statement, params, settings)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
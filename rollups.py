@@ -0,0 +1,130 @@
+"""Reconcile the monthly rollup table against raw transactions.
+
+``user_month_category_totals`` is maintained by triggers on ``transactions``
+(see schema.sql / migrations/005_monthly_rollups.sql). This module checks it
+against a full re-aggregation and rebuilds it when they disagree::
+
+    python rollups.py verify [--user-id N]
+    python rollups.py rebuild [--user-id N]
+"""
+
+import argparse
+import sys
+
+from db import connection
+
+_ACTUAL_TOTALS = """
+    SELECT
+        user_id,
+        DATE_TRUNC('month', tx_date)::date AS month_start,
+        COALESCE(category_id, 0) AS category_id,
+        SUM(amount) AS total,
+        COUNT(*) AS tx_count
+    FROM transactions
+    WHERE user_id IS NOT NULL AND tx_date IS NOT NULL {user_filter}
+    GROUP BY 1, 2, 3
+"""
+
+
+def _user_filter(user_id: int | None, column: str = "user_id") -> str:
+    return f"AND {column} = %(user_id)s" if user_id is not None else ""
+
+
+def find_mismatches(user_id: int | None = None) -> list[tuple]:
+    """Return rollup rows that disagree with the raw transactions.
+
+    Args:
+        user_id: Restrict the check to one user; all users when None.
+
+    Returns:
+        ``(user_id, month_start, category_id, expected_total, rollup_total,
+        expected_count, rollup_count)`` tuples; missing sides are None.
+    """
+
+    actual = _ACTUAL_TOTALS.format(user_filter=_user_filter(user_id))
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT
+                user_id, month_start, category_id,
+                a.total, r.total, a.tx_count, r.tx_count
+            FROM ({actual}) AS a
+            FULL JOIN (
+                SELECT user_id, month_start, category_id, total, tx_count
+                FROM user_month_category_totals
+                WHERE TRUE {_user_filter(user_id)}
+            ) AS r USING (user_id, month_start, category_id)
+            WHERE a.total IS DISTINCT FROM r.total
+               OR a.tx_count IS DISTINCT FROM r.tx_count
+            ORDER BY user_id, month_start, category_id;
+            """,
+            {"user_id": user_id},
+        )
+        return cur.fetchall()
+
+
+def rebuild(user_id: int | None = None) -> int:
+    """Recompute rollups from ``transactions``.
+
+    Writes to ``transactions`` are blocked (reads are not) for the duration so
+    none can land between the re-aggregation and the triggers.
+
+    Args:
+        user_id: Rebuild only this user's rows; all users when None.
+
+    Returns:
+        Number of rollup rows written.
+    """
+
+    params = {"user_id": user_id}
+    with connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("LOCK TABLE transactions IN SHARE MODE")
+            cur.execute(
+                f"DELETE FROM user_month_category_totals WHERE TRUE {_user_filter(user_id)}",
+                params,
+            )
+            cur.execute(
+                f"""
+                INSERT INTO user_month_category_totals
+                    (user_id, month_start, category_id, total, tx_count)
+                {_ACTUAL_TOTALS.format(user_filter=_user_filter(user_id))}
+                """,
+                params,
+            )
+            return cur.rowcount
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point."""
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild monthly rollups.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (
+        ("verify", "report rollup rows that differ from raw transactions"),
+        ("rebuild", "recompute rollup rows from raw transactions"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--user-id", type=int, help="limit to one user")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        written = rebuild(args.user_id)
+        print(f"Rebuilt {written} rollup row(s)")
+        return 0
+
+    mismatches = find_mismatches(args.user_id)
+    for user_id, month_start, category_id, expected, actual, expected_n, actual_n in mismatches:
+        print(
+            f"user {user_id} {month_start:%Y-%m} category {category_id}: "
+            f"expected {expected} ({expected_n} tx), rollup has {actual} ({actual_n} tx)"
+        )
+    if mismatches:
+        print(f"❌ {len(mismatches)} rollup row(s) out of date; run: python rollups.py rebuild")
+        return 1
+    print("✅ Rollups match transactions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
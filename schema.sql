@@ -12,14 +12,89 @@ CREATE TABLE IF NOT EXISTS categories (
     type VARCHAR(10) CHECK (type IN ('income', 'expense'))
 );
 
+-- Range-partitioned by month on tx_date; the partition key has to be part
+-- of the primary key. Partitions are created by
+-- ensure_transaction_partitions() (python partitions.py ensure).
+CREATE SEQUENCE IF NOT EXISTS transactions_tx_id_seq AS INT;
+
 CREATE TABLE IF NOT EXISTS transactions (
-    tx_id SERIAL PRIMARY KEY,
+    tx_id INT NOT NULL DEFAULT nextval('transactions_tx_id_seq'),
     user_id INT REFERENCES users(user_id),
     category_id INT REFERENCES categories(category_id),
     amount DECIMAL(10, 2) NOT NULL,
     note TEXT,
-    tx_date DATE DEFAULT CURRENT_DATE
-);
+    tx_date DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (tx_id, tx_date)
+) PARTITION BY RANGE (tx_date);
+
+ALTER SEQUENCE transactions_tx_id_seq OWNED BY transactions.tx_id;
+
+-- Catches rows outside every monthly partition until
+-- ensure_transaction_partitions() moves them into one.
+CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+
+-- Create monthly partitions for every month from from_month (default: the
+-- current month) through months_ahead months ahead, and for any month with
+-- rows in the default partition. Those rows are moved into the new
+-- partition; moving them does not touch the rollups, since the rows stay in
+-- transactions. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_transaction_partitions(
+    months_ahead INT DEFAULT 3,
+    from_month DATE DEFAULT NULL
+) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month DATE;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    -- Serialize concurrent callers (e.g. overlapping cron runs).
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_transaction_partitions'));
+
+    FOR month IN
+        SELECT generate_series(
+            DATE_TRUNC('month', COALESCE(from_month, CURRENT_DATE)),
+            DATE_TRUNC('month', CURRENT_DATE) + make_interval(months => months_ahead),
+            INTERVAL '1 month'
+        )::date
+        UNION
+        SELECT DISTINCT DATE_TRUNC('month', tx_date)::date FROM transactions_default
+        ORDER BY 1
+    LOOP
+        partition_name := 'transactions_p' || TO_CHAR(month, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS)', partition_name
+            );
+            EXECUTE format(
+                'WITH moved AS (
+                     DELETE FROM transactions_default
+                     WHERE tx_date >= %L AND tx_date < %L
+                     RETURNING *
+                 )
+                 INSERT INTO %I SELECT * FROM moved',
+                month, (month + INTERVAL '1 month')::date, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month, (month + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT ensure_transaction_partitions(3);
+
+-- Per-user date range scans and (tx_date, tx_id) keyset pagination
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date_id
+    ON transactions (user_id, tx_date, tx_id);
+
+-- Covering index for per-category month sums (budget status and alerts)
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date
+    ON transactions (user_id, category_id, tx_date) INCLUDE (amount);
 
 CREATE TABLE IF NOT EXISTS budgets (
     budget_id SERIAL PRIMARY KEY,
@@ -32,7 +107,131 @@ CREATE TABLE IF NOT EXISTS budgets (
 CREATE UNIQUE INDEX IF NOT EXISTS idx_budget_user_category_month
     ON budgets (user_id, category_id, month_year);
 
--- Email notification settings (optional, for future enhancements)
+-- Per-user monthly totals by category, kept current by statement-level
+-- triggers on transactions. Uncategorised transactions roll up under
+-- category_id 0; rows with a NULL user_id or tx_date are not counted.
+CREATE TABLE IF NOT EXISTS user_month_category_totals (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    month_start DATE NOT NULL,
+    category_id INT NOT NULL,
+    total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, month_start, category_id)
+);
+
+CREATE OR REPLACE FUNCTION apply_transaction_rollup() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    delta TEXT;
+BEGIN
+    -- DELETE rather than TRUNCATE: a TRUNCATE ... CASCADE that reaches the
+    -- rollup through users is still running, and would make it fail.
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM user_month_category_totals;
+        RETURN NULL;
+    END IF;
+
+    -- Only the transition tables of the firing event exist, so pick the
+    -- delta source per operation.
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT user_id, tx_date, category_id, amount, 1 AS n FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT user_id, tx_date, category_id, -amount, -1 AS n FROM old_rows'
+        ELSE
+            'SELECT user_id, tx_date, category_id, amount, 1 AS n FROM new_rows
+             UNION ALL
+             SELECT user_id, tx_date, category_id, -amount, -1 FROM old_rows'
+    END;
+
+    -- Net the statement's changes per (user, month, category) and apply them
+    -- in key order so concurrent writers lock rollup rows consistently.
+    EXECUTE format($sql$
+        INSERT INTO user_month_category_totals AS r
+            (user_id, month_start, category_id, total, tx_count)
+        SELECT
+            user_id,
+            DATE_TRUNC('month', tx_date)::date,
+            COALESCE(category_id, 0),
+            SUM(amount),
+            SUM(n)
+        FROM (%s) AS delta (user_id, tx_date, category_id, amount, n)
+        WHERE user_id IS NOT NULL AND tx_date IS NOT NULL
+        GROUP BY 1, 2, 3
+        HAVING SUM(n) <> 0 OR SUM(amount) <> 0
+        ORDER BY 1, 2, 3
+        ON CONFLICT (user_id, month_start, category_id) DO UPDATE SET
+            total = r.total + EXCLUDED.total,
+            tx_count = r.tx_count + EXCLUDED.tx_count,
+            updated_at = NOW()
+    $sql$, delta);
+
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM user_month_category_totals
+        WHERE tx_count <= 0
+          AND user_id IN (SELECT user_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS transactions_rollup_insert ON transactions;
+CREATE TRIGGER transactions_rollup_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_update ON transactions;
+CREATE TRIGGER transactions_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_delete ON transactions;
+CREATE TRIGGER transactions_rollup_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+DROP TRIGGER IF EXISTS transactions_rollup_truncate ON transactions;
+CREATE TRIGGER transactions_rollup_truncate
+    AFTER TRUNCATE ON transactions
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup();
+
+-- Forecasts precomputed by forecast_batch.py; a row is current while the
+-- user's rollup rows still match its source_* update time and counts
+CREATE TABLE IF NOT EXISTS forecasts (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    model VARCHAR(20) NOT NULL,
+    coverage DECIMAL(4, 3) NOT NULL,
+    first_month DATE NOT NULL,
+    n_months INT NOT NULL,
+    point DECIMAL(14, 2)[] NOT NULL,
+    lower_bound DECIMAL(14, 2)[] NOT NULL,
+    upper_bound DECIMAL(14, 2)[] NOT NULL,
+    source_updated_at TIMESTAMPTZ NOT NULL,
+    source_rows BIGINT NOT NULL,
+    source_tx_count BIGINT NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, model)
+);
+
+-- Budget alert jobs for the PostgreSQL-backed worker (ALERT_BACKEND=db)
+CREATE TABLE IF NOT EXISTS alert_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    month_year VARCHAR(7) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_alert_jobs_run_after
+    ON alert_jobs (run_after);
+
+-- Email notification settings (per-user alert threshold and opt-out)
 CREATE TABLE IF NOT EXISTS email_settings (
     user_id INT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
     email_enabled BOOLEAN DEFAULT true,
@@ -40,6 +239,17 @@ CREATE TABLE IF NOT EXISTS email_settings (
     last_alert_sent TIMESTAMP
 );
 
+-- Budgets already alerted for the month; a row is removed when usage drops
+-- back under the threshold so the next crossing alerts again
+CREATE TABLE IF NOT EXISTS budget_alert_state (
+    user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    category_id INT NOT NULL REFERENCES categories(category_id),
+    month_year VARCHAR(7) NOT NULL,
+    used_percent DECIMAL(8, 2),
+    alerted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, month_year, category_id)
+);
+
 -- Seed default expense categories in English
 INSERT INTO categories (category_id, name, type)
 VALUES
@@ -39,6 +39,15 @@ if [ -z "$TOKEN" ]; then
 fi
 
 echo -e "${GREEN}✅ Login successful${NC}"
+
+REFRESH_TOKEN=$(echo "$LOGIN_BODY" | grep -o '"refresh_token":"[^"]*' | cut -d'"' -f4)
+REFRESH_HTTP_CODE=$(curl -s -o /dev/null -w "%{http_code}" -X POST "$BASE_URL/token/refresh" \
+  -H "Authorization: Bearer $REFRESH_TOKEN")
+if [ "$REFRESH_HTTP_CODE" = "200" ]; then
+  echo -e "${GREEN}✅ Token refresh successful${NC}"
+else
+  echo -e "${RED}❌ Token refresh failed (HTTP $REFRESH_HTTP_CODE)${NC}"
+fi
 echo ""
 
 # Step 2: Test Auto-Category Classification
@@ -110,18 +119,57 @@ else
   echo "$PREDICT"
 fi
 
+echo ""
+echo -e "${YELLOW}  3.4 Dashboard (all reports in one request)${NC}"
+DASHBOARD=$(curl -s "$BASE_URL/report/dashboard?month=$CURRENT_MONTH" -H "Authorization: Bearer $TOKEN")
+if echo "$DASHBOARD" | python3 -c "import sys, json; d = json.load(sys.stdin); assert {'monthly', 'category', 'budget', 'predict'} <= d.keys()" 2>/dev/null; then
+  echo -e "${GREEN}    ✅ Dashboard retrieved${NC}"
+else
+  echo -e "${RED}    ❌ Failed${NC}"
+  echo "$DASHBOARD"
+fi
+
+echo ""
+echo -e "${YELLOW}  3.5 Cashflow Analytics (one GROUPING SETS query)${NC}"
+ANALYTICS=$(curl -s "$BASE_URL/report/analytics?granularity=week&group_by=type" -H "Authorization: Bearer $TOKEN")
+if echo "$ANALYTICS" | python3 -c "import sys, json; d = json.load(sys.stdin); assert {'periods', 'groups', 'total'} <= d.keys() and 'net' in d['total']" 2>/dev/null; then
+  echo -e "${GREEN}    ✅ Analytics retrieved${NC}"
+  echo "$ANALYTICS" | python3 -c "import sys, json; print('    Total:', json.load(sys.stdin)['total'])"
+else
+  echo -e "${RED}    ❌ Failed${NC}"
+  echo "$ANALYTICS"
+fi
+
 echo ""
 
 # Step 4: Test Transaction List
 echo -e "${BLUE}Step 4: Testing Transaction List...${NC}"
 TX_LIST=$(curl -s "$BASE_URL/transactions" -H "Authorization: Bearer $TOKEN")
-TX_COUNT=$(echo "$TX_LIST" | python3 -c "import sys, json; print(len(json.load(sys.stdin)))" 2>/dev/null)
+TX_COUNT=$(echo "$TX_LIST" | python3 -c "import sys, json; print(len(json.load(sys.stdin)['items']))" 2>/dev/null)
+NEXT_CURSOR=$(echo "$TX_LIST" | python3 -c "import sys, json; print(json.load(sys.stdin)['next_cursor'] or '')" 2>/dev/null)
 if [ ! -z "$TX_COUNT" ]; then
-  echo -e "${GREEN}  ✅ Retrieved $TX_COUNT transactions${NC}"
+  echo -e "${GREEN}  ✅ Retrieved $TX_COUNT transactions (first page)${NC}"
 else
   echo -e "${RED}  ❌ Failed${NC}"
 fi
 
+if [ ! -z "$NEXT_CURSOR" ]; then
+  NEXT_PAGE=$(curl -s "$BASE_URL/transactions?after=$NEXT_CURSOR" -H "Authorization: Bearer $TOKEN")
+  NEXT_COUNT=$(echo "$NEXT_PAGE" | python3 -c "import sys, json; print(len(json.load(sys.stdin)['items']))" 2>/dev/null)
+  if [ ! -z "$NEXT_COUNT" ]; then
+    echo -e "${GREEN}  ✅ Retrieved $NEXT_COUNT transactions (next page)${NC}"
+  else
+    echo -e "${RED}  ❌ Next page failed${NC}"
+  fi
+fi
+
+FILTERED=$(curl -s "$BASE_URL/transactions?from=$CURRENT_MONTH-01&category_id=1&limit=5" -H "Authorization: Bearer $TOKEN")
+if echo "$FILTERED" | grep -q "items"; then
+  echo -e "${GREEN}  ✅ Filtered listing (from/category_id/limit) works${NC}"
+else
+  echo -e "${RED}  ❌ Filtered listing failed${NC}"
+fi
+
 echo ""
 
 # Step 5: Test Budget Status
@@ -134,6 +182,15 @@ else
   echo -e "${YELLOW}  ⚠️  No budgets set for current month${NC}"
 fi
 
+BUDGET_HISTORY=$(curl -s "$BASE_URL/budget/status?last=6" -H "Authorization: Bearer $TOKEN")
+MONTHS=$(echo "$BUDGET_HISTORY" | python3 -c "import sys, json; print(len(json.load(sys.stdin)['months']))" 2>/dev/null)
+if [ "$MONTHS" = "6" ]; then
+  echo -e "${GREEN}  ✅ Budget history for the last 6 months retrieved${NC}"
+else
+  echo -e "${RED}  ❌ Budget history failed${NC}"
+  echo "$BUDGET_HISTORY"
+fi
+
 echo ""
 
 # Summary
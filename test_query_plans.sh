@@ -0,0 +1,127 @@
+#!/bin/bash
+
+# Query Plan Checks for Smart Expense Tracker
+# Verifies that the hot per-user queries can be answered from the
+# transaction indexes instead of a full table scan, and that month-bounded
+# queries only touch the matching transactions partition.
+#
+# The plans are those of the statements the app runs: each check prepares a
+# statement from queries.py (python queries.py explain) with sample
+# parameters and inspects its generic plan, so the checks cannot drift from
+# the code.
+#
+# Sequential scans are disabled for the session so the check proves the
+# predicates are sargable (usable by an index) even on a tiny test database,
+# where the planner would otherwise prefer a seq scan on cost alone.
+
+cd "$(dirname "$0")" || exit 1
+
+export POSTGRES_DB="${POSTGRES_DB:-expense_db}"
+export POSTGRES_USER="${POSTGRES_USER:-postgres}"
+export POSTGRES_HOST="${POSTGRES_HOST:-localhost}"
+export POSTGRES_PORT="${POSTGRES_PORT:-5432}"
+export POSTGRES_PASSWORD="${POSTGRES_PASSWORD:-123456}"
+
+read -r MONTH_START MONTH_END YEAR_START YEAR_LABELS CURSOR <<< "$(python3 -c '
+from datetime import date, timedelta
+from forecasting import month_from_number, month_number
+from payloads import encode_cursor, month_labels
+start = date.today().replace(day=1)
+end = month_from_number(month_number(start) + 1) - timedelta(days=1)
+year_start = month_from_number(month_number(start) - 11)
+labels = "{" + ",".join(month_labels(year_start, start)) + "}"
+print(start, end, year_start, labels, encode_cursor(start, 1000))
+')"
+
+echo "🧪 Query Plan Checks - Smart Expense Tracker"
+echo "============================================="
+echo ""
+
+# Colors
+GREEN='\033[0;32m'
+BLUE='\033[0;34m'
+RED='\033[0;31m'
+NC='\033[0m'
+
+FAILED=0
+
+# explain STATEMENT [PARAM ...]
+explain() {
+  python3 queries.py explain "$@" --set enable_seqscan=off 2>&1
+}
+
+# check_plan NAME INDEX LABEL STATEMENT [PARAM ...]
+check_plan() {
+  local name="$1"
+  local index="$2"
+  local label="$3"
+  shift 3
+
+  echo -e "${BLUE}  Checking: $name${NC}"
+  PLAN=$(explain "$@")
+  if echo "$PLAN" | grep -Eq "(Index Only Scan|Index Scan|Bitmap Index Scan).* (using|on) $index"; then
+    echo -e "${GREEN}    ✅ Uses $label${NC}"
+  else
+    echo -e "${RED}    ❌ Expected an index scan on $label${NC}"
+    echo "$PLAN" | sed 's/^/    /'
+    FAILED=1
+  fi
+}
+
+# Indexes on the monthly partitions are named after the partition, e.g.
+# transactions_p2026_10_user_id_tx_date_tx_id_idx.
+PARTITION="transactions_(p[0-9]{4}_[0-9]{2}|default)"
+
+# check_pruning NAME STATEMENT [PARAM ...]
+check_pruning() {
+  local name="$1"
+  shift
+
+  echo -e "${BLUE}  Checking: $name${NC}"
+  PLAN=$(explain "$@")
+  SCANNED=$(echo "$PLAN" | grep -Eo " on $PARTITION( |$)" | sort -u | wc -l)
+  if [ "$SCANNED" -eq 1 ]; then
+    echo -e "${GREEN}    ✅ Touches a single partition${NC}"
+  else
+    echo -e "${RED}    ❌ Expected one partition, plan touches $SCANNED${NC}"
+    echo "$PLAN" | sed 's/^/    /'
+    FAILED=1
+  fi
+}
+
+ROLLUP="user_month_category_totals_pkey"
+
+check_plan "Budget status rollup join" "$ROLLUP" "$ROLLUP" \
+  budget_usage 1 "$MONTH_START"
+
+check_plan "Budget alert candidates (rollup)" "$ROLLUP" "$ROLLUP" \
+  budget_alert_candidates 1 "$MONTH_START" 90
+
+check_plan "Budget history over a month range (rollup)" "$ROLLUP" "$ROLLUP" \
+  budget_history 1 "$YEAR_START" "$MONTH_START" "$YEAR_LABELS"
+
+check_plan "Monthly expense report (rollup)" "$ROLLUP" "$ROLLUP" \
+  monthly_expense 1
+
+check_plan "Monthly analytics (rollup)" "$ROLLUP" "$ROLLUP" \
+  analytics_rollup 1 month "$YEAR_START" "$MONTH_END" true
+
+check_plan "Keyset page of transactions" \
+  "${PARTITION}_user_id_tx_date_tx_id_idx" "the per-partition (user_id, tx_date, tx_id) index" \
+  transactions_page 1 "after=$CURSOR&limit=50"
+
+check_plan "Transactions in a date range" "${PARTITION}_user_id" "a per-partition user index" \
+  transactions_page 1 "from=$MONTH_START&to=$MONTH_END"
+
+check_pruning "Month range is pruned to one partition" \
+  transactions_page 1 "from=$MONTH_START&to=$MONTH_END"
+
+check_pruning "Weekly analytics for one month scans one partition" \
+  analytics_transactions 1 week "$MONTH_START" "$MONTH_END" true
+
+echo ""
+if [ "$FAILED" -ne 0 ]; then
+  echo -e "${RED}❌ Some queries cannot use the transaction and rollup indexes${NC}"
+  exit 1
+fi
+echo -e "${GREEN}✅ All checked queries use the transaction and rollup indexes${NC}"
@@ -0,0 +1,14 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module builds the app and loads the classifier. With
+``preload_app`` gunicorn does that once in the master process, so forked
+workers share the model's memory copy-on-write instead of each loading it.
+"""
+
+from app import create_app
+from nlp_classifier import get_classifier
+
+app = create_app()
+get_classifier()